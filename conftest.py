@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+import sys
+
+# asyncio based modules require Python 3.5, keep pep8 and pyflakes from parsing them
+collect_ignore = ['subliminal/aio.py'] if sys.version_info < (3, 5) else []
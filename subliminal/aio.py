@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""Provider pool based on :mod:`asyncio`, requires Python 3.5 or later."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+from .core import _check_provider, _check_subtitle, _iter_best_subtitles, _ProviderCall
+from .extensions import provider_manager
+from .throttle import CircuitBreaker, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _AioProviderCall(_ProviderCall):
+    timeout_errors = _ProviderCall.timeout_errors + (asyncio.TimeoutError,)
+
+
+class AioProvider(object):
+    """Mixin for :class:`~subliminal.providers.Provider` with native :mod:`asyncio` support.
+
+    :class:`AioProviderPool` awaits the coroutines of providers inheriting from it instead of running their blocking
+    methods in threads. The blocking methods must still be implemented for the other pools.
+
+    """
+    async def initialize_async(self):
+        """Initialize the provider, calls :meth:`~subliminal.providers.Provider.initialize` by default."""
+        self.initialize()
+
+    async def terminate_async(self):
+        """Terminate the provider, calls :meth:`~subliminal.providers.Provider.terminate` by default."""
+        self.terminate()
+
+    async def list_subtitles_async(self, video, languages):
+        """Coroutine version of :meth:`~subliminal.providers.Provider.list_subtitles`."""
+        raise NotImplementedError
+
+    async def download_subtitle_async(self, subtitle):
+        """Coroutine version of :meth:`~subliminal.providers.Provider.download_subtitle`."""
+        raise NotImplementedError
+
+
+class AioProviderPool(object):
+    """A pool of providers with the same API as :class:`~subliminal.core.ProviderPool` as coroutines.
+
+    Providers inheriting from :class:`AioProvider` are awaited, the other ones run in a pool of threads. Calls to each
+    provider are limited by :attr:`provider_max_workers` as providers are not all thread-safe.
+
+    It supports the `async with` statement to :meth:`terminate` the providers on exit.
+
+    :param list providers: name of providers to use, if not all.
+    :param dict provider_configs: provider configuration as keyword arguments per provider name to pass when
+        instanciating the :class:`~subliminal.providers.Provider`.
+    :param int max_workers: maximum number of threads to run blocking providers in. If `None`, :attr:`max_workers`
+        will be set to the number of :attr:`providers`.
+    :param provider_max_workers: maximum number of concurrent calls to a provider, or per provider name.
+    :type provider_max_workers: int or dict
+    :param int max_videos: maximum number of videos processed at once by :meth:`download_best_subtitles_batch`.
+    :param dict rate_limits: rate limit overrides, see :class:`~subliminal.core.ProviderPool`.
+    :param dict breaker_config: circuit breaker configuration, see :class:`~subliminal.core.ProviderPool`.
+
+    """
+    def __init__(self, providers=None, provider_configs=None, max_workers=None, provider_max_workers=1,
+                 max_videos=100, rate_limits=None, breaker_config=None):
+        #: Name of providers to use
+        self.providers = providers or provider_manager.names()
+
+        #: Provider configuration
+        self.provider_configs = provider_configs or {}
+
+        #: Maximum number of threads to run blocking providers in
+        self.max_workers = max_workers or len(self.providers)
+
+        #: Maximum number of concurrent calls per provider
+        self.provider_max_workers = {name: provider_max_workers.get(name, 1) if isinstance(provider_max_workers, dict)
+                                     else provider_max_workers for name in self.providers}
+
+        #: Maximum number of videos processed at once
+        self.max_videos = max_videos
+
+        #: Rate limit overrides
+        self.rate_limits = rate_limits or {}
+
+        #: Token buckets per provider, created lazily
+        self.buckets = {}
+
+        #: Circuit breaker configuration
+        self.breaker_config = breaker_config or {}
+
+        #: Circuit breakers per provider, created lazily
+        self.breakers = {}
+
+        #: Initialized providers
+        self.initialized_providers = {}
+
+        #: Executor for blocking providers, started lazily
+        self.executor = None
+
+        # synchronization primitives, created lazily in the running loop
+        self._locks = {}
+        self._semaphores = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.terminate()
+
+    @property
+    def discarded_providers(self):
+        """Providers currently discarded, i.e. with an open circuit breaker"""
+        return {n for n, b in self.breakers.items() if b.state == CircuitBreaker.OPEN}
+
+    def get_breaker(self, name):
+        """Get the circuit breaker of a provider.
+
+        :param str name: name of the provider.
+        :return: the circuit breaker.
+        :rtype: :class:`~subliminal.throttle.CircuitBreaker`
+
+        """
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(**self.breaker_config)
+
+        return self.breakers[name]
+
+    def discard(self, name, cooldown=float('inf')):
+        """Discard a provider by opening its circuit breaker.
+
+        :param str name: name of the provider.
+        :param float cooldown: time before a trial call, in seconds, by default the provider is discarded for the
+            lifetime of the pool.
+
+        """
+        self.get_breaker(name).open(cooldown)
+
+    def _get_semaphore(self, name):
+        if name not in self._semaphores:
+            self._semaphores[name] = asyncio.Semaphore(self.provider_max_workers[name])
+
+        return self._semaphores[name]
+
+    async def throttle(self, name):
+        """Wait until a call to a provider is allowed by its rate limit.
+
+        :param str name: name of the provider.
+
+        """
+        if name not in self.buckets:
+            rate_limit = self.rate_limits.get(name, provider_manager[name].plugin.rate_limit)
+            self.buckets[name] = TokenBucket(*rate_limit) if rate_limit else None
+
+        if self.buckets[name] is not None:
+            await asyncio.sleep(self.buckets[name].reserve())
+
+    async def _run(self, provider, method, *args):
+        """Await the coroutine version of `method` for :class:`AioProvider`, run `method` in a thread otherwise."""
+        if isinstance(provider, AioProvider):
+            return await getattr(provider, method + '_async')(*args)
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers)
+
+        return await asyncio.get_event_loop().run_in_executor(self.executor, getattr(provider, method), *args)
+
+    async def get_provider(self, name):
+        """Get an initialized provider, initializing it if necessary.
+
+        :param str name: name of the provider.
+        :return: the provider.
+        :rtype: :class:`~subliminal.providers.Provider`
+        :raise: KeyError if the provider is not in :attr:`providers`.
+
+        """
+        if name not in self.providers:
+            raise KeyError(name)
+
+        if name not in self._locks:
+            self._locks[name] = asyncio.Lock()
+        async with self._locks[name]:
+            if name not in self.initialized_providers:
+                logger.info('Initializing provider %s', name)
+                provider = provider_manager[name].plugin(**self.provider_configs.get(name, {}))
+                await self._run(provider, 'initialize')
+                self.initialized_providers[name] = provider
+
+        return self.initialized_providers[name]
+
+    async def list_subtitles_provider(self, provider, video, languages):
+        """List subtitles with a single provider.
+
+        The video and languages are checked against the provider.
+
+        :param str provider: name of the provider.
+        :param video: video to list subtitles for.
+        :type video: :class:`~subliminal.video.Video`
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :return: found subtitles.
+        :rtype: list of :class:`~subliminal.subtitle.Subtitle` or None
+
+        """
+        # check video, languages and discarded provider
+        breaker = self.get_breaker(provider)
+        provider_languages = _check_provider(provider, video, languages, breaker)
+        if not provider_languages:
+            return []
+
+        # list subtitles
+        logger.info('Listing subtitles with provider %r and languages %r', provider, provider_languages)
+        with _AioProviderCall(provider, breaker) as call:
+            async with self._get_semaphore(provider):
+                await self.throttle(provider)
+                subtitles = await self._run(await self.get_provider(provider), 'list_subtitles', video,
+                                            provider_languages)
+
+        return None if call.failed else subtitles
+
+    async def list_subtitles(self, video, languages):
+        """List subtitles with all the providers concurrently.
+
+        :param video: video to list subtitles for.
+        :type video: :class:`~subliminal.video.Video`
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :return: found subtitles.
+        :rtype: list of :class:`~subliminal.subtitle.Subtitle`
+
+        """
+        providers = [p for p in self.providers if p not in self.discarded_providers]
+        results = await asyncio.gather(*[self.list_subtitles_provider(p, video, languages) for p in providers])
+
+        subtitles = []
+        for provider_subtitles in results:
+            # skip provider that failed
+            if provider_subtitles is None:
+                continue
+
+            # add subtitles
+            subtitles.extend(provider_subtitles)
+
+        return subtitles
+
+    async def download_subtitle(self, subtitle):
+        """Download `subtitle`'s :attr:`~subliminal.subtitle.Subtitle.content`.
+
+        :param subtitle: subtitle to download.
+        :type subtitle: :class:`~subliminal.subtitle.Subtitle`
+        :return: `True` if the subtitle has been successfully downloaded, `False` otherwise.
+        :rtype: bool
+
+        """
+        # check discarded providers
+        breaker = self.get_breaker(subtitle.provider_name)
+        if not breaker.allow():
+            logger.warning('Provider %r is discarded', subtitle.provider_name)
+            return False
+
+        logger.info('Downloading subtitle %r', subtitle)
+        with _AioProviderCall(subtitle.provider_name, breaker) as call:
+            async with self._get_semaphore(subtitle.provider_name):
+                await self.throttle(subtitle.provider_name)
+                await self._run(await self.get_provider(subtitle.provider_name), 'download_subtitle', subtitle)
+
+        return not call.failed and _check_subtitle(subtitle)
+
+    async def download_best_subtitles(self, subtitles, video, languages, min_score=0, hearing_impaired=False,
+                                      only_one=False, compute_score=None):
+        """Download the best matching subtitles.
+
+        See :meth:`~subliminal.core.ProviderPool.download_best_subtitles` for the parameters.
+
+        """
+        # download best subtitles, falling back on the next on error
+        downloaded_subtitles = []
+        for subtitle in _iter_best_subtitles(subtitles, video, languages, downloaded_subtitles, min_score,
+                                             hearing_impaired, only_one, compute_score):
+            if await self.download_subtitle(subtitle):
+                downloaded_subtitles.append(subtitle)
+
+        return downloaded_subtitles
+
+    async def download_best_subtitles_batch(self, videos, languages, min_score=0, hearing_impaired=False,
+                                            only_one=False, compute_score=None):
+        """List and download the best matching subtitles of several videos concurrently.
+
+        Up to :attr:`max_videos` videos are processed at once. See
+        :meth:`~subliminal.core.ProviderPool.download_best_subtitles_batch` for the parameters.
+
+        :return: the videos with their downloaded subtitles, in the same order as `videos`.
+        :rtype: list of tuple
+
+        """
+        semaphore = asyncio.Semaphore(self.max_videos)
+
+        async def download(video):
+            async with semaphore:
+                logger.info('Downloading best subtitles for %r', video)
+                subtitles = await self.list_subtitles(video, languages - video.subtitle_languages)
+                subtitles = await self.download_best_subtitles(
+                    subtitles, video, languages, min_score=min_score(video) if callable(min_score) else min_score,
+                    hearing_impaired=hearing_impaired, only_one=only_one, compute_score=compute_score)
+                logger.info('Downloaded %d subtitle(s)', len(subtitles))
+
+                return video, subtitles
+
+        return await asyncio.gather(*[download(v) for v in videos])
+
+    async def terminate(self):
+        """Terminate all the :attr:`initialized_providers` and shut down the :attr:`executor`."""
+        logger.debug('Terminating initialized providers')
+        for name in list(self.initialized_providers):
+            provider = self.initialized_providers.pop(name)
+            with _AioProviderCall(name, timeout_message='Provider %r timed out, improperly terminated',
+                                  error_message='Provider %r terminated unexpectedly'):
+                logger.info('Terminating provider %s', name)
+                await self._run(provider, 'terminate')
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
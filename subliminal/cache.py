@@ -1,7 +1,21 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import datetime
+from functools import wraps
+import logging
+import sqlite3
+import threading
+import time
 
-from dogpile.cache import make_region
+from dogpile.cache.api import CacheBackend, NO_VALUE
+from dogpile.cache.region import CacheRegion, register_backend
+from six.moves import cPickle as pickle
+
+from .throttle import clock
+
+logger = logging.getLogger(__name__)
 
 #: Expiration time for show caching
 SHOW_EXPIRATION_TIME = datetime.timedelta(weeks=3).total_seconds()
@@ -12,5 +26,514 @@ EPISODE_EXPIRATION_TIME = datetime.timedelta(days=3).total_seconds()
 #: Expiration time for scraper searches
 REFINER_EXPIRATION_TIME = datetime.timedelta(weeks=1).total_seconds()
 
+#: Expiration time for scraper searches without results
+REFINER_NEGATIVE_EXPIRATION_TIME = datetime.timedelta(days=1).total_seconds()
+
+#: Expiration time for the in-memory cache
+MEMORY_EXPIRATION_TIME = datetime.timedelta(minutes=10).total_seconds()
+
+#: Maximum time an expired value is served while it is refreshed
+MAX_STALE_TIME = datetime.timedelta(weeks=1).total_seconds()
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache backend storing the values in a SQLite database in WAL mode.
+
+    Unlike ``dogpile.cache.dbm``, several processes can safely share the same database: readers never block and
+    writers wait for each other up to `timeout` seconds. Each thread uses its own connection so reads are concurrent
+    within a process as well.
+
+    The size of the database can be capped: when opening it if no process did it for :attr:`eviction_period` seconds
+    and every `eviction_interval` writes, the entries not accessed for `max_age` seconds are deleted, then the least
+    recently accessed entries until the values fit in `max_size` bytes, and the freed pages are returned to the
+    filesystem. See also :meth:`compact`.
+
+    It is registered as ``subliminal.sqlite``::
+
+        region.configure('subliminal.sqlite', arguments={'filename': 'cache.db', 'max_size': 100 * 1024 * 1024})
+
+    :param dict arguments: the backend arguments: ``filename`` is the path to the database file, ``timeout`` is the
+        maximum time to wait for another writer, in seconds, default is 30. ``max_size`` is the maximum size of the
+        values, in bytes, ``max_age`` is the maximum time since the last access of an entry, in seconds, both default
+        to no limit. ``eviction_interval`` is the number of writes between two evictions, default is 1000.
+
+    """
+    #: Minimum time between two updates of the access time of an entry, in seconds
+    access_resolution = 3600
+
+    #: Ratio of `max_size` to evict down to, so evictions do not happen on every write once full
+    eviction_ratio = 0.9
+
+    #: Minimum time between two evictions when opening the database, in seconds
+    eviction_period = 3600
+
+    def __init__(self, arguments):
+        #: Path to the database file
+        self.filename = arguments['filename']
+
+        #: Maximum time to wait for another writer, in seconds
+        self.timeout = arguments.get('timeout', 30)
+
+        #: Maximum size of the values, in bytes
+        self.max_size = arguments.get('max_size')
+
+        #: Maximum time since the last access of an entry, in seconds
+        self.max_age = arguments.get('max_age')
+
+        #: Number of writes between two evictions
+        self.eviction_interval = arguments.get('eviction_interval', 1000)
+
+        #: Number of writes since the last eviction
+        self.writes = 0
+
+        #: Connections of all the threads
+        self.connections = []
+
+        #: Connection of the current thread
+        self.local = threading.local()
+
+        #: Lock for :attr:`connections` and :attr:`writes`
+        self.lock = threading.Lock()
+
+        connection = self.connection
+        connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                           'accessed REAL NOT NULL DEFAULT 0) WITHOUT ROWID')
+        if 'accessed' not in [row[1] for row in connection.execute('PRAGMA table_info(cache)')]:
+            connection.execute('ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0')
+            connection.execute('UPDATE cache SET accessed = ?', (time.time(),))
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID')
+
+        # evict when opening as short runs never reach the eviction_interval
+        if self.max_size is not None or self.max_age is not None:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'evicted'").fetchone()
+            if row is None or time.time() - row[0] > self.eviction_period:
+                self.evict()
+
+    @property
+    def connection(self):
+        """Connection to the database of the current thread"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            # auto_vacuum must be set before WAL initializes a new database, it is a no-op on existing ones
+            connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self.lock:
+                self.connections.append(connection)
+            self.local.connection = connection
+
+        return connection
+
+    def close(self):
+        """Close the connections of all the threads."""
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            del self.connections[:]
+        self.local = threading.local()
+
+    def get(self, key):
+        row = self.connection.execute('SELECT value, accessed FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return NO_VALUE
+
+        # update the access time, not on every read to keep reads cheap
+        now = time.time()
+        if now - row[1] > self.access_resolution:
+            self.connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+
+        return pickle.loads(bytes(row[0]))
+
+    def get_multi(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, mapping):
+        now = time.time()
+        rows = [(key, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), now)
+                for key, value in mapping.items()]
+        with self.transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows)
+
+        # evict periodically
+        if self.max_size is None and self.max_age is None:
+            return
+        with self.lock:
+            self.writes += len(rows)
+            evict = self.writes >= self.eviction_interval
+            if evict:
+                self.writes = 0
+        if evict:
+            self.evict()
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        with self.transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    @contextmanager
+    def transaction(self):
+        """Context manager for a write transaction, yielding the connection of the current thread."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def evict(self):
+        """Delete the entries exceeding :attr:`max_age` and :attr:`max_size` and free their pages.
+
+        :return: the number of deleted entries.
+        :rtype: int
+
+        """
+        deleted = 0
+        with self.transaction() as connection:
+            # expired entries
+            if self.max_age is not None:
+                deleted += connection.execute('DELETE FROM cache WHERE accessed < ?',
+                                              (time.time() - self.max_age,)).rowcount
+
+            # least recently accessed entries
+            if self.max_size is not None:
+                size = connection.execute('SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache').fetchone()[0]
+                if size > self.max_size:
+                    keys = []
+                    rows = connection.execute('SELECT key, LENGTH(value) FROM cache ORDER BY accessed')
+                    for key, length in rows:
+                        if size <= self.max_size * self.eviction_ratio:
+                            break
+                        keys.append((key,))
+                        size -= length
+                    rows.close()
+                    connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+                    deleted += len(keys)
+
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('evicted', ?)", (time.time(),))
+
+        if deleted:
+            logger.info('Evicted %d cache entries', deleted)
+            self.connection.execute('PRAGMA incremental_vacuum')
+
+        return deleted
+
+    def compact(self):
+        """Evict the entries like :meth:`evict` then rebuild the database to reclaim all the unused space.
+
+        :return: the number of deleted entries.
+        :rtype: int
+
+        """
+        deleted = self.evict()
+        connection = self.connection
+        connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        connection.execute('VACUUM')
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+        return deleted
+
+    def stats(self):
+        """Number of entries and size of the values by namespace.
+
+        The namespace of a key is the part before the first ``|``, i.e. the module and name of the cached function.
+
+        :return: the number of entries and size of the values in bytes, by namespace.
+        :rtype: dict
+
+        """
+        rows = self.connection.execute("SELECT CASE WHEN INSTR(key, '|') THEN SUBSTR(key, 1, INSTR(key, '|') - 1) "
+                                       "ELSE key END AS namespace, COUNT(*), SUM(LENGTH(value)) FROM cache "
+                                       "GROUP BY namespace")
+
+        return {namespace: (count, size) for namespace, count, size in rows}
+
+
+register_backend('subliminal.sqlite', 'subliminal.cache', 'SQLiteBackend')
+
+
+class MemoryCache(object):
+    """Thread-safe in-memory LRU cache with expiration.
+
+    When full, setting a key evicts the least recently used one. Values are stored as is so getting a key costs a dict
+    lookup: they are shared by all the callers and are read-only, callers must copy them before modifying them.
+
+    :param int size: maximum number of keys, 0 disables the cache.
+    :param float expiration_time: default time before a key expires, in seconds.
+
+    """
+    def __init__(self, size=1000, expiration_time=MEMORY_EXPIRATION_TIME):
+        #: Maximum number of keys
+        self.size = size
+
+        #: Default time before a key expires, in seconds
+        self.expiration_time = expiration_time
+
+        #: Expiration time and value per key, least recently used first
+        self.entries = OrderedDict()
+
+        #: Lock for :attr:`entries`
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Get the value of `key`, marking it as the most recently used.
+
+        :param str key: the key.
+        :return: the value or :data:`~dogpile.cache.api.NO_VALUE` if missing or expired.
+
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return NO_VALUE
+            if entry[0] <= clock():
+                return NO_VALUE
+            self.entries[key] = entry
+
+            return entry[1]
+
+    def set(self, key, value, expiration_time=None):
+        """Set the value of `key`, evicting the least recently used keys if full.
+
+        :param str key: the key.
+        :param value: the value.
+        :param float expiration_time: time before the key expires, in seconds, capped to :attr:`expiration_time`.
+
+        """
+        if self.size <= 0:
+            return
+
+        if expiration_time is None or expiration_time < 0:
+            expiration_time = self.expiration_time
+        else:
+            expiration_time = min(expiration_time, self.expiration_time)
+
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (clock() + expiration_time, value)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Delete `key`, if present.
+
+        :param str key: the key.
+
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Delete all the keys."""
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCacheRegion(CacheRegion):
+    """A :class:`~dogpile.cache.region.CacheRegion` with a :class:`MemoryCache` in front of its backend.
+
+    Values found in or written to the backend are kept in :attr:`memory`, so getting a hot key again is a dict lookup
+    instead of a backend lookup and unpickling. Writes and deletions go through to the backend.
+
+    Once :meth:`configure_refresh` is called, the functions decorated by :meth:`cache_on_arguments` with
+    `stale_while_revalidate` return their expired values immediately and refresh them in the background instead of
+    blocking the caller.
+
+    The memory tier and the background refresh are disabled until configured.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(TieredCacheRegion, self).__init__(*args, **kwargs)
+
+        #: In-memory tier
+        self.memory = MemoryCache(size=0)
+
+        #: Executor refreshing the expired values, if enabled
+        self.refresher = None
+
+        #: Keys being refreshed
+        self.refreshing = set()
+
+        #: Lock for :attr:`refreshing`
+        self.refresh_lock = threading.Lock()
+
+    def configure_memory(self, size=1000, expiration_time=MEMORY_EXPIRATION_TIME):
+        """Configure the in-memory tier, replacing the current one.
+
+        :param int size: maximum number of keys, 0 disables the in-memory tier.
+        :param float expiration_time: maximum time before a key expires, in seconds.
+
+        """
+        self.memory = MemoryCache(size=size, expiration_time=expiration_time)
+
+    def configure_refresh(self, max_workers=2):
+        """Configure the background refresh of the expired values of the functions opting in with
+        `stale_while_revalidate`, replacing the current executor.
+
+        :param int max_workers: maximum number of values refreshed at once, 0 disables the background refresh.
+
+        """
+        if self.refresher is not None:
+            self.refresher.shutdown(wait=False)
+        self.refresher = ThreadPoolExecutor(max_workers) if max_workers > 0 else None
+
+    def cache_on_arguments(self, namespace=None, expiration_time=None, should_cache_fn=None,
+                           negative_expiration_time=None, stale_while_revalidate=False, max_stale_time=MAX_STALE_TIME,
+                           **kwargs):
+        """Same as :meth:`CacheRegion.cache_on_arguments() <dogpile.cache.region.CacheRegion.cache_on_arguments>`
+        with a separate expiration time for negative results and an opt-in background refresh.
+
+        When `negative_expiration_time` is given, `None` results are cached under their own keys with that expiration
+        time, so they are checked again sooner than the other results.
+
+        With `stale_while_revalidate`, once :meth:`configure_refresh` is called, values expired for less than
+        `max_stale_time` are returned immediately and the function is called again in the background to refresh them.
+        The function must be safe to call from another thread at any time, which excludes provider methods.
+
+        :param float negative_expiration_time: expiration time of `None` results, in seconds.
+        :param bool stale_while_revalidate: serve expired values while refreshing them, requires `expiration_time`.
+        :param float max_stale_time: maximum time an expired value is served, in seconds.
+
+        """
+        decorator = self._cache_on_arguments(namespace, expiration_time, should_cache_fn, negative_expiration_time,
+                                             **kwargs)
+        if not stale_while_revalidate:
+            return decorator
+
+        if expiration_time is None:
+            raise ValueError('stale_while_revalidate requires an expiration_time')
+
+        def should_cache(value):
+            if negative_expiration_time is not None and value is None:
+                return False
+            return should_cache_fn is None or should_cache_fn(value)
+
+        def swr_decorator(fn):
+            decorated = decorator(fn)
+            key_generator = (kwargs.get('function_key_generator') or self.function_key_generator)(namespace, fn)
+
+            @wraps(fn)
+            def get_or_refresh(*args, **kw):
+                if self.refresher is None:
+                    return decorated(*args, **kw)
+
+                # return the value if not expired
+                key = key_generator(*args, **kw)
+                value = self.memory.get(key)
+                if value is NO_VALUE:
+                    value = self.get(key, expiration_time=expiration_time)
+                if value is not NO_VALUE:
+                    return value
+
+                # serve the expired value while refreshing it
+                value = super(TieredCacheRegion, self).get(key, expiration_time + max_stale_time)
+                if value is not NO_VALUE:
+                    self._schedule_refresh(key, fn, (args, kw), should_cache)
+                    return value
+
+                return decorated(*args, **kw)
+            get_or_refresh.__dict__.update(decorated.__dict__)
+
+            return get_or_refresh
+
+        return swr_decorator
+
+    def _cache_on_arguments(self, namespace, expiration_time, should_cache_fn, negative_expiration_time, **kwargs):
+        if negative_expiration_time is None:
+            return super(TieredCacheRegion, self).cache_on_arguments(namespace, expiration_time, should_cache_fn,
+                                                                     **kwargs)
+
+        positive = super(TieredCacheRegion, self).cache_on_arguments(
+            namespace, expiration_time, lambda v: v is not None and (should_cache_fn is None or should_cache_fn(v)),
+            **kwargs)
+        negative = super(TieredCacheRegion, self).cache_on_arguments(
+            (namespace or '') + '-negative', negative_expiration_time, lambda v: v is None, **kwargs)
+
+        def decorator(fn):
+            negative_fn = negative(fn)
+            negative_invalidate = negative_fn.invalidate
+            decorated = positive(negative_fn)
+            positive_invalidate = decorated.invalidate
+
+            def invalidate(*args, **kwargs):
+                positive_invalidate(*args, **kwargs)
+                negative_invalidate(*args, **kwargs)
+            decorated.invalidate = invalidate
+
+            return decorated
+
+        return decorator
+
+    def get(self, key, expiration_time=None, ignore_expiration=False, **kwargs):
+        if expiration_time is None and not ignore_expiration:
+            value = self.memory.get(key)
+            if value is not NO_VALUE:
+                return value
+
+        value = super(TieredCacheRegion, self).get(key, expiration_time, ignore_expiration, **kwargs)
+        if value is not NO_VALUE and not ignore_expiration:
+            self.memory.set(key, value, expiration_time)
+
+        return value
+
+    def get_or_create(self, key, creator, expiration_time=None, should_cache_fn=None, *args, **kwargs):
+        value = self.memory.get(key)
+        if value is not NO_VALUE:
+            return value
+
+        value = super(TieredCacheRegion, self).get_or_create(key, creator, expiration_time, should_cache_fn, *args,
+                                                             **kwargs)
+        if should_cache_fn is None or should_cache_fn(value):
+            self.memory.set(key, value, expiration_time)
+
+        return value
+
+    def _schedule_refresh(self, key, creator, creator_args, should_cache_fn):
+        with self.refresh_lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        logger.debug('Refreshing expired cache key %r in the background', key)
+        self.refresher.submit(self._refresh, key, creator, creator_args, should_cache_fn)
+
+    def _refresh(self, key, creator, creator_args, should_cache_fn):
+        try:
+            if creator_args:
+                value = creator(*creator_args[0], **creator_args[1])
+            else:
+                value = creator()
+            if should_cache_fn is None or should_cache_fn(value):
+                self.set(key, value)
+        except Exception:
+            logger.exception('Error refreshing cache key %r', key)
+        finally:
+            with self.refresh_lock:
+                self.refreshing.discard(key)
+
+    def set(self, key, value):
+        super(TieredCacheRegion, self).set(key, value)
+        self.memory.set(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        super(TieredCacheRegion, self).delete(key)
+
+    def invalidate(self, *args, **kwargs):
+        self.memory.clear()
+        super(TieredCacheRegion, self).invalidate(*args, **kwargs)
+
 
-region = make_region()
+region = TieredCacheRegion()
@@ -4,7 +4,6 @@ Subliminal uses `click <http://click.pocoo.org>`_ to provide a powerful :abbr:`C
 
 """
 from __future__ import division
-from collections import defaultdict
 from datetime import timedelta
 import glob
 import json
@@ -20,8 +19,12 @@ from dogpile.util.readwrite_lock import ReadWriteMutex
 from six.moves import configparser
 
 from subliminal import (AsyncProviderPool, Episode, Movie, Video, __version__, check_video, compute_score, get_scores,
-                        provider_manager, refine, refiner_manager, region, save_subtitles, scan_video, scan_videos)
-from subliminal.core import ARCHIVE_EXTENSIONS, search_external_subtitles
+                        iter_videos, provider_manager, refine, refiner_manager, region, save_subtitles, scan_video)
+from subliminal.cache import SQLiteBackend
+from subliminal.core import ARCHIVE_EXTENSIONS, DirectoryIndex, scan_archive, search_external_subtitles
+from subliminal.index import ScanJournal, hash_index
+from subliminal.session import session_factory, session_store
+from subliminal.watch import Scheduler, VideoWatcher
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +72,9 @@ class Config(object):
         self.config.set('general', 'age', str(int(timedelta(weeks=2).total_seconds())))
         self.config.set('general', 'hearing_impaired', str(1))
         self.config.set('general', 'min_score', str(0))
+        self.config.add_section('cache')
+        self.config.set('cache', 'backend', 'sqlite')
+        self.config.set('cache', 'max_size', str(200))
 
     def read(self):
         """Read the configuration from :attr:`path`"""
@@ -143,6 +149,22 @@ class Config(object):
     def min_score(self, value):
         self.config.set('general', 'min_score', str(value))
 
+    @property
+    def cache_backend(self):
+        return self.config.get('cache', 'backend')
+
+    @cache_backend.setter
+    def cache_backend(self, value):
+        self.config.set('cache', 'backend', value)
+
+    @property
+    def cache_max_size(self):
+        return self.config.getint('cache', 'max_size')
+
+    @cache_max_size.setter
+    def cache_max_size(self, value):
+        self.config.set('cache', 'max_size', str(value))
+
     @property
     def provider_configs(self):
         rv = {}
@@ -208,8 +230,15 @@ PROVIDER = click.Choice(sorted(provider_manager.names()))
 
 REFINER = click.Choice(sorted(refiner_manager.names()))
 
+CACHE_BACKEND = click.Choice(['dbm', 'sqlite'])
+
 dirs = AppDirs('subliminal')
 cache_file = 'subliminal.dbm'
+sqlite_cache_file = 'subliminal.db'
+sqlite_cache_max_age = timedelta(days=90)
+hash_index_file = 'hashes.db'
+journal_file = 'journal.db'
+session_store_file = 'sessions.db'
 config_file = 'config.ini'
 
 
@@ -222,10 +251,20 @@ config_file = 'config.ini'
 @click.option('--subscenter', type=click.STRING, nargs=2, metavar='USERNAME PASSWORD', help='SubsCenter configuration.')
 @click.option('--cache-dir', type=click.Path(writable=True, file_okay=False), default=dirs.user_cache_dir,
               show_default=True, expose_value=True, help='Path to the cache directory.')
+@click.option('--cache-backend', type=CACHE_BACKEND, help='Cache backend, sqlite can be shared by several processes '
+              'running at once, is capped in size and can be compacted. Default is the backend of the configuration '
+              'file or sqlite.')
+@click.option('--cache-max-size', type=click.IntRange(0), metavar='MB', help='Maximum size of the sqlite cache, 0 '
+              'for no limit. Default is the size of the configuration file or 200. The dbm cache is not limited.')
+@click.option('--config', type=click.Path(dir_okay=False), default=os.path.join(dirs.user_config_dir, config_file),
+              show_default=True, help='Path to the configuration file.')
+@click.option('--persist-sessions', is_flag=True, help='Keep the provider logins in the cache directory to reuse '
+              'them in the next runs.')
 @click.option('--debug', is_flag=True, help='Print useful information for debugging subliminal and for reporting bugs.')
 @click.version_option(__version__)
 @click.pass_context
-def subliminal(ctx, addic7ed, legendastv, opensubtitles, subscenter, cache_dir, debug):
+def subliminal(ctx, addic7ed, legendastv, opensubtitles, subscenter, cache_dir, cache_backend, cache_max_size, config,
+               persist_sessions, debug):
     """Subtitles, faster than your thoughts."""
     # create cache directory
     try:
@@ -234,9 +273,30 @@ def subliminal(ctx, addic7ed, legendastv, opensubtitles, subscenter, cache_dir,
         if not os.path.isdir(cache_dir):
             raise
 
+    # read configuration
+    config = Config(config)
+    config.read()
+
     # configure cache
-    region.configure('dogpile.cache.dbm', expiration_time=timedelta(days=30),
-                     arguments={'filename': os.path.join(cache_dir, cache_file), 'lock_factory': MutexLock})
+    if (cache_backend or config.cache_backend) == 'sqlite':
+        if cache_max_size is None:
+            cache_max_size = config.cache_max_size
+        region.configure('subliminal.sqlite', expiration_time=timedelta(days=30),
+                         arguments={'filename': os.path.join(cache_dir, sqlite_cache_file),
+                                    'max_size': cache_max_size * 1024 * 1024 or None,
+                                    'max_age': sqlite_cache_max_age.total_seconds()})
+    else:
+        region.configure('dogpile.cache.dbm', expiration_time=timedelta(days=30),
+                         arguments={'filename': os.path.join(cache_dir, cache_file), 'lock_factory': MutexLock})
+    region.configure_memory()
+    region.configure_refresh()
+
+    # configure hash index
+    hash_index.configure(os.path.join(cache_dir, hash_index_file))
+
+    # configure session store
+    if persist_sessions:
+        session_store.configure(os.path.join(cache_dir, session_store_file))
 
     # configure logging
     if debug:
@@ -246,7 +306,7 @@ def subliminal(ctx, addic7ed, legendastv, opensubtitles, subscenter, cache_dir,
         logging.getLogger('subliminal').setLevel(logging.DEBUG)
 
     # provider configs
-    ctx.obj = {'provider_configs': {}}
+    ctx.obj = {'provider_configs': {}, 'cache_dir': cache_dir}
     if addic7ed:
         ctx.obj['provider_configs']['addic7ed'] = {'username': addic7ed[0], 'password': addic7ed[1]}
     if legendastv:
@@ -257,20 +317,64 @@ def subliminal(ctx, addic7ed, legendastv, opensubtitles, subscenter, cache_dir,
         ctx.obj['provider_configs']['subscenter'] = {'username': subscenter[0], 'password': subscenter[1]}
 
 
-@subliminal.command()
+@subliminal.group(invoke_without_command=True)
 @click.option('--clear-subliminal', is_flag=True, help='Clear subliminal\'s cache. Use this ONLY if your cache is '
               'corrupted or if you experience issues.')
 @click.pass_context
 def cache(ctx, clear_subliminal):
     """Cache management."""
+    if ctx.invoked_subcommand is not None:
+        return
+
     if clear_subliminal:
-        for file in glob.glob(os.path.join(ctx.parent.params['cache_dir'], cache_file) + '*'):
-            os.remove(file)
+        if isinstance(region.backend, SQLiteBackend):
+            region.backend.close()
+        hash_index.close()
+        session_store.close()
+        for name in (cache_file, sqlite_cache_file, hash_index_file, journal_file, session_store_file):
+            for file in glob.glob(os.path.join(ctx.parent.params['cache_dir'], name) + '*'):
+                os.remove(file)
         click.echo('Subliminal\'s cache cleared.')
     else:
         click.echo('Nothing done.')
 
 
+def get_sqlite_backend():
+    """Get the :class:`~subliminal.cache.SQLiteBackend` of the region or fail."""
+    if not isinstance(region.backend, SQLiteBackend):
+        raise click.UsageError('This command requires the sqlite cache backend, the dbm cache cannot be compacted '
+                               'nor inspected: use --cache-backend sqlite.')
+
+    return region.backend
+
+
+@cache.command()
+def compact():
+    """Evict old entries and reclaim unused space."""
+    backend = get_sqlite_backend()
+    size = sum(os.path.getsize(f) for f in glob.glob(backend.filename + '*'))
+    deleted = backend.compact()
+    compacted_size = sum(os.path.getsize(f) for f in glob.glob(backend.filename + '*'))
+    click.echo('Evicted %s and compacted the cache from %s to %s.' % (
+        click.style('%d entr%s' % (deleted, 'ies' if deleted != 1 else 'y'), fg='red', bold=True),
+        click.style('%.1f MB' % (size / 1024 / 1024), bold=True),
+        click.style('%.1f MB' % (compacted_size / 1024 / 1024), fg='green', bold=True)))
+
+
+@cache.command()
+def stats():
+    """Show the number of entries and size by namespace."""
+    backend = get_sqlite_backend()
+    stats = backend.stats()
+    click.echo('%-70s %8s %10s' % ('Namespace', 'Entries', 'Size (kB)'))
+    for namespace, (count, size) in sorted(stats.items(), key=lambda s: s[1][1], reverse=True):
+        click.echo('%-70s %8d %10.1f' % (namespace, count, size / 1024))
+    click.echo('%-70s %8d %10.1f' % ('Total', sum(s[0] for s in stats.values()),
+                                     sum(s[1] for s in stats.values()) / 1024))
+    file_size = sum(os.path.getsize(f) for f in glob.glob(backend.filename + '*'))
+    click.echo('Cache file size: %.1f MB' % (file_size / 1024 / 1024))
+
+
 @subliminal.command()
 @click.option('-l', '--language', type=LANGUAGE, required=True, multiple=True, help='Language as IETF code, '
               'e.g. en, pt-BR (can be used multiple times).')
@@ -288,13 +392,17 @@ def cache(ctx, clear_subliminal):
 @click.option('-m', '--min-score', type=click.IntRange(0, 100), default=0, help='Minimum score for a subtitle '
               'to be downloaded (0 to 100).')
 @click.option('-w', '--max-workers', type=click.IntRange(1, 50), default=None, help='Maximum number of threads to use.')
+@click.option('--scan-workers', type=click.IntRange(1, 50), default=None, help='Maximum number of threads to use for '
+              'scanning directories.')
 @click.option('-z/-Z', '--archives/--no-archives', default=True, show_default=True, help='Scan archives for videos '
               '(supported extensions: %s).' % ', '.join(ARCHIVE_EXTENSIONS))
+@click.option('-i', '--incremental', is_flag=True, default=False, help='Only scan new or changed videos in '
+              'directories since the previous incremental scan.')
 @click.option('-v', '--verbose', count=True, help='Increase verbosity.')
 @click.argument('path', type=click.Path(), required=True, nargs=-1)
 @click.pass_obj
 def download(obj, provider, refiner, language, age, directory, encoding, single, force, hearing_impaired, min_score,
-             max_workers, archives, verbose, path):
+             max_workers, scan_workers, archives, incremental, verbose, path):
     """Download best subtitles.
 
     PATH can be an directory containing videos, a video file path or a video file name. It can be used multiple times.
@@ -306,12 +414,14 @@ def download(obj, provider, refiner, language, age, directory, encoding, single,
     # process parameters
     language = set(language)
 
-    # scan videos
-    videos = []
+    # collect videos
     ignored_videos = []
     errored_paths = []
-    with click.progressbar(path, label='Collecting videos', item_show_func=lambda p: p or '') as bar:
-        for p in bar:
+    index = DirectoryIndex()
+    journal = ScanJournal(os.path.join(obj['cache_dir'], journal_file), languages=language) if incremental else None
+
+    def collect_videos():
+        for p in path:
             logger.debug('Collecting path %s', p)
 
             # non-existing
@@ -323,28 +433,50 @@ def download(obj, provider, refiner, language, age, directory, encoding, single,
                     errored_paths.append(p)
                     continue
                 if not force:
-                    video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory).values())
+                    video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory,
+                                                                              index=index).values())
                 refine(video, episode_refiners=refiner, movie_refiners=refiner, embedded_subtitles=not force)
-                videos.append(video)
+                yield video
                 continue
 
-            # directories
+            # directories, scanned ahead of the downloads, videos failing to scan are logged and skipped
             if os.path.isdir(p):
-                try:
-                    scanned_videos = scan_videos(p, age=age, archives=archives)
-                except:
-                    logger.exception('Unexpected error while collecting directory path %s', p)
-                    errored_paths.append(p)
-                    continue
-                for video in scanned_videos:
-                    if not force:
-                        video.subtitle_languages |= set(search_external_subtitles(video.name,
-                                                                                  directory=directory).values())
-                    if check_video(video, languages=language, age=age, undefined=single):
-                        refine(video, episode_refiners=refiner, movie_refiners=refiner, embedded_subtitles=not force)
-                        videos.append(video)
+                scanned_videos = iter_videos(p, age=age, archives=archives, max_workers=scan_workers or 1,
+                                             index=index, journal=journal)
+                while True:
+                    try:
+                        video = next(scanned_videos)
+                    except StopIteration:
+                        break
+                    except Exception:
+                        logger.exception('Unexpected error while collecting directory path %s', p)
+                        errored_paths.append(p)
+                        break
+
+                    try:
+                        if not force:
+                            video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory,
+                                                                                      index=index).values())
+                        collected = check_video(video, languages=language, age=age, undefined=single)
+                        if collected:
+                            refine(video, episode_refiners=refiner, movie_refiners=refiner,
+                                   embedded_subtitles=not force)
+                    except Exception:
+                        logger.exception('Unexpected error while collecting video %s', video.name)
+                        errored_paths.append(video.name)
+                        continue
+
+                    if collected:
+                        yield video
                     else:
                         ignored_videos.append(video)
+
+                        # journal the video, complete if it has an undefined subtitle in single mode
+                        if journal is not None:
+                            languages = video.subtitle_languages
+                            if single and Language('und') in languages:
+                                languages = languages | language
+                            journal.set_video(video.name, languages)
                 continue
 
             # other inputs
@@ -355,13 +487,41 @@ def download(obj, provider, refiner, language, age, directory, encoding, single,
                 errored_paths.append(p)
                 continue
             if not force:
-                video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory).values())
+                video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory,
+                                                                          index=index).values())
             if check_video(video, languages=language, age=age, undefined=single):
                 refine(video, episode_refiners=refiner, movie_refiners=refiner, embedded_subtitles=not force)
-                videos.append(video)
+                yield video
             else:
                 ignored_videos.append(video)
 
+    # download and save best subtitles of several videos at once as they are collected
+    videos = []
+    saved_subtitles = {}
+    with AsyncProviderPool(max_workers=max_workers, providers=provider, provider_configs=obj['provider_configs']) as p:
+        # keep a connection alive per thread to each host
+        session_factory.configure(pool_maxsize=max(p.max_workers, 10))
+        results = p.download_best_subtitles_batch(collect_videos(), language,
+                                                  min_score=lambda v: get_scores(v)['hash'] * min_score / 100,
+                                                  hearing_impaired=hearing_impaired, only_one=single)
+        with click.progressbar(results, label='Downloading subtitles',
+                               item_show_func=lambda r: os.path.split(r[0].name)[1] if r is not None else '') as bar:
+            for v, subtitles in bar:
+                videos.append(v)
+                saved_subtitles[v] = save_subtitles(v, subtitles, single=single, directory=directory,
+                                                    encoding=encoding)
+
+                # journal the processed video, it is walked again until it has all the languages
+                if journal is not None:
+                    journal.set_video(v.name, v.subtitle_languages | {s.language for s in saved_subtitles[v]})
+
+        if p.discarded_providers:
+            click.secho('Some providers have been discarded due to unexpected errors: %s' %
+                        ', '.join(p.discarded_providers), fg='yellow')
+
+    if journal is not None:
+        journal.close()
+
     # output errored paths
     if verbose > 0:
         for p in errored_paths:
@@ -387,39 +547,18 @@ def download(obj, provider, refiner, language, age, directory, encoding, single,
         's' if len(errored_paths) > 1 else '',
     ))
 
-    # exit if no video collected
-    if not videos:
-        return
-
-    # download best subtitles
-    downloaded_subtitles = defaultdict(list)
-    with AsyncProviderPool(max_workers=max_workers, providers=provider, provider_configs=obj['provider_configs']) as p:
-        with click.progressbar(videos, label='Downloading subtitles',
-                               item_show_func=lambda v: os.path.split(v.name)[1] if v is not None else '') as bar:
-            for v in bar:
-                scores = get_scores(v)
-                subtitles = p.download_best_subtitles(p.list_subtitles(v, language - v.subtitle_languages),
-                                                      v, language, min_score=scores['hash'] * min_score / 100,
-                                                      hearing_impaired=hearing_impaired, only_one=single)
-                downloaded_subtitles[v] = subtitles
-
-        if p.discarded_providers:
-            click.secho('Some providers have been discarded due to unexpected errors: %s' %
-                        ', '.join(p.discarded_providers), fg='yellow')
-
-    # save subtitles
+    # report saved subtitles
     total_subtitles = 0
-    for v, subtitles in downloaded_subtitles.items():
-        saved_subtitles = save_subtitles(v, subtitles, single=single, directory=directory, encoding=encoding)
-        total_subtitles += len(saved_subtitles)
+    for v in videos:
+        total_subtitles += len(saved_subtitles[v])
 
         if verbose > 0:
-            click.echo('%s subtitle%s downloaded for %s' % (click.style(str(len(saved_subtitles)), bold=True),
-                                                            's' if len(saved_subtitles) > 1 else '',
+            click.echo('%s subtitle%s downloaded for %s' % (click.style(str(len(saved_subtitles[v])), bold=True),
+                                                            's' if len(saved_subtitles[v]) > 1 else '',
                                                             os.path.split(v.name)[1]))
 
         if verbose > 1:
-            for s in saved_subtitles:
+            for s in saved_subtitles[v]:
                 matches = s.get_matches(v)
                 score = compute_score(s, v)
 
@@ -459,3 +598,96 @@ def download(obj, provider, refiner, language, age, directory, encoding, single,
     if verbose == 0:
         click.echo('Downloaded %s subtitle%s' % (click.style(str(total_subtitles), bold=True),
                                                  's' if total_subtitles > 1 else ''))
+
+
+@subliminal.command()
+@click.option('-l', '--language', type=LANGUAGE, required=True, multiple=True, help='Language as IETF code, '
+              'e.g. en, pt-BR (can be used multiple times).')
+@click.option('-p', '--provider', type=PROVIDER, multiple=True, help='Provider to use (can be used multiple times).')
+@click.option('-r', '--refiner', type=REFINER, multiple=True, help='Refiner to use (can be used multiple times).')
+@click.option('-d', '--directory', type=click.STRING, metavar='DIR', help='Directory where to save subtitles, '
+              'default is next to the video file.')
+@click.option('-e', '--encoding', type=click.STRING, metavar='ENC', help='Subtitle file encoding, default is to '
+              'preserve original encoding.')
+@click.option('-s', '--single', is_flag=True, default=False, help='Save subtitle without language code in the file '
+              'name, i.e. use .srt extension. Do not use this unless your media player requires it.')
+@click.option('-f', '--force', is_flag=True, default=False, help='Force download even if a subtitle already exist.')
+@click.option('-hi', '--hearing-impaired', is_flag=True, default=False, help='Prefer hearing impaired subtitles.')
+@click.option('-m', '--min-score', type=click.IntRange(0, 100), default=0, help='Minimum score for a subtitle '
+              'to be downloaded (0 to 100).')
+@click.option('-w', '--max-workers', type=click.IntRange(1, 50), default=None, help='Maximum number of threads to use.')
+@click.option('-z/-Z', '--archives/--no-archives', default=True, show_default=True, help='Watch archives for videos '
+              '(supported extensions: %s).' % ', '.join(ARCHIVE_EXTENSIONS))
+@click.option('--debounce', type=click.IntRange(0), default=10, show_default=True, help='Seconds to wait after the '
+              'last event on a video before processing it.')
+@click.option('--retry-delay', type=AGE, default='1h', show_default=True, help='Delay before searching again for '
+              'missing subtitles, doubled on each retry.')
+@click.option('--max-retries', type=click.IntRange(0), default=10, show_default=True, help='Maximum number of '
+              'searches for missing subtitles.')
+@click.argument('path', type=click.Path(exists=True, file_okay=False), required=True, nargs=-1)
+@click.pass_obj
+def watch(obj, provider, refiner, language, directory, encoding, single, force, hearing_impaired, min_score,
+          max_workers, archives, debounce, retry_delay, max_retries, path):
+    """Watch directories and download best subtitles for new videos.
+
+    PATH is a directory to watch recursively with inotify (Linux only). It can be used multiple times.
+
+    Videos are processed once completely written or moved in. Videos with missing subtitles are searched again later
+    with an exponential backoff.
+
+    """
+    # process parameters
+    language = set(language)
+
+    try:
+        watcher = VideoWatcher(path, archives=archives, debounce=debounce,
+                               scheduler=Scheduler(retry_delay=retry_delay.total_seconds(), max_retries=max_retries))
+    except OSError as e:
+        raise click.ClickException('Cannot watch directories: %s' % e)
+    click.echo('Watching %s' % ', '.join(path))
+
+    def process(p, filepath):
+        """Download and save the best subtitles of a video, return whether to search again later."""
+        # scan the video
+        video = scan_archive(filepath) if filepath.endswith(ARCHIVE_EXTENSIONS) else scan_video(filepath)
+        if not force:
+            video.subtitle_languages |= set(search_external_subtitles(video.name, directory=directory).values())
+        if not check_video(video, languages=language, undefined=single):
+            return False
+        refine(video, episode_refiners=refiner, movie_refiners=refiner, embedded_subtitles=not force)
+
+        # download and save best subtitles
+        scores = get_scores(video)
+        subtitles = p.download_best_subtitles(p.list_subtitles(video, language - video.subtitle_languages), video,
+                                              language, min_score=scores['hash'] * min_score / 100,
+                                              hearing_impaired=hearing_impaired, only_one=single)
+        saved_subtitles = save_subtitles(video, subtitles, single=single, directory=directory, encoding=encoding)
+        click.echo('%s subtitle%s downloaded for %s' % (click.style(str(len(saved_subtitles)), bold=True),
+                                                        's' if len(saved_subtitles) > 1 else '',
+                                                        os.path.split(video.name)[1]))
+
+        # search again later for missing subtitles
+        missing = language - video.subtitle_languages - {s.language for s in saved_subtitles}
+        return bool(missing) and not (single and saved_subtitles)
+
+    with AsyncProviderPool(max_workers=max_workers, providers=provider, provider_configs=obj['provider_configs']) as p:
+        # keep a connection alive per thread to each host
+        session_factory.configure(pool_maxsize=max(p.max_workers, 10))
+        try:
+            for filepath, retries in watcher:
+                # errors are logged and the video is retried later, if it still exists
+                try:
+                    retry = process(p, filepath)
+                except Exception:
+                    logger.exception('Unexpected error while processing %s', filepath)
+                    retry = os.path.exists(filepath)
+                if retry:
+                    watcher.retry(filepath, retries)
+        except KeyboardInterrupt:
+            click.echo('Stopped watching')
+        finally:
+            watcher.close()
+
+        if p.discarded_providers:
+            click.secho('Some providers have been discarded due to unexpected errors: %s' %
+                        ', '.join(p.discarded_providers), fg='yellow')
@@ -1,23 +1,32 @@
 # -*- coding: utf-8 -*-
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
 import io
-import itertools
+from itertools import islice
 import logging
 import operator
 import os.path
 import socket
+import threading
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
 
 from babelfish import Language, LanguageReverseError
 from guessit import guessit
-from rarfile import NotRarFile, RarCannotExec, RarFile
+from rarfile import RAR_M0, Error as RarError, NotRarFile, RarCannotExec, RarFile
 import requests
 
 from .extensions import provider_manager, refiner_manager
+from .index import hash_index
 from .score import compute_score as default_compute_score
 from .subtitle import SUBTITLE_EXTENSIONS, get_subtitle_path
-from .utils import hash_napiprojekt, hash_opensubtitles, hash_shooter, hash_thesubdb
+from .throttle import CircuitBreaker, TokenBucket, clock
+from .utils import compute_file_hashes
 from .video import VIDEO_EXTENSIONS, Episode, Movie, Video
 
 #: Supported archive extensions
@@ -33,25 +42,44 @@ class ProviderPool(object):
 
         * Lazy loads providers when needed and supports the `with` statement to :meth:`terminate`
           the providers on exit.
-        * Automatically discard providers on failure.
+        * Automatically discard failing providers for a while with a circuit breaker per provider.
+        * Pace the calls to each provider under its :attr:`~subliminal.providers.Provider.rate_limit`.
 
     :param list providers: name of providers to use, if not all.
     :param dict provider_configs: provider configuration as keyword arguments per provider name to pass when
         instanciating the :class:`~subliminal.providers.Provider`.
+    :param dict rate_limits: rate limit as ``(rate, burst)`` or `None` for no limit per provider name, overriding the
+        :attr:`~subliminal.providers.Provider.rate_limit` of the provider.
+    :param dict breaker_config: keyword arguments to pass when instanciating the
+        :class:`~subliminal.throttle.CircuitBreaker` of each provider.
 
     """
-    def __init__(self, providers=None, provider_configs=None):
+    def __init__(self, providers=None, provider_configs=None, rate_limits=None, breaker_config=None):
         #: Name of providers to use
         self.providers = providers or provider_manager.names()
 
         #: Provider configuration
         self.provider_configs = provider_configs or {}
 
+        #: Rate limit overrides
+        self.rate_limits = rate_limits or {}
+
+        #: Token buckets per provider, created lazily
+        self.buckets = {}
+
+        #: Circuit breaker configuration
+        self.breaker_config = breaker_config or {}
+
+        #: Circuit breakers per provider, created lazily
+        self.breakers = {}
+
         #: Initialized providers
         self.initialized_providers = {}
 
-        #: Discarded providers
-        self.discarded_providers = set()
+    @property
+    def discarded_providers(self):
+        """Providers currently discarded, i.e. with an open circuit breaker"""
+        return {n for n, b in list(self.breakers.items()) if b.state == CircuitBreaker.OPEN}
 
     def __enter__(self):
         return self
@@ -74,19 +102,63 @@ class ProviderPool(object):
         if name not in self.initialized_providers:
             raise KeyError(name)
 
-        try:
+        with _ProviderCall(name, timeout_message='Provider %r timed out, improperly terminated',
+                           error_message='Provider %r terminated unexpectedly'):
             logger.info('Terminating provider %s', name)
             self.initialized_providers[name].terminate()
-        except (requests.Timeout, socket.timeout):
-            logger.error('Provider %r timed out, improperly terminated', name)
-        except:
-            logger.exception('Provider %r terminated unexpectedly', name)
 
         del self.initialized_providers[name]
 
     def __iter__(self):
         return iter(self.initialized_providers)
 
+    def get_bucket(self, name):
+        """Get the token bucket pacing the calls to a provider.
+
+        :param str name: name of the provider.
+        :return: the token bucket or `None` if the provider has no rate limit.
+        :rtype: :class:`~subliminal.throttle.TokenBucket`
+
+        """
+        if name not in self.buckets:
+            rate_limit = self.rate_limits.get(name, provider_manager[name].plugin.rate_limit)
+            self.buckets.setdefault(name, TokenBucket(*rate_limit) if rate_limit else None)
+
+        return self.buckets[name]
+
+    def get_breaker(self, name):
+        """Get the circuit breaker of a provider.
+
+        :param str name: name of the provider.
+        :return: the circuit breaker.
+        :rtype: :class:`~subliminal.throttle.CircuitBreaker`
+
+        """
+        if name not in self.breakers:
+            self.breakers.setdefault(name, CircuitBreaker(**self.breaker_config))
+
+        return self.breakers[name]
+
+    def discard(self, name, cooldown=float('inf')):
+        """Discard a provider by opening its circuit breaker.
+
+        :param str name: name of the provider.
+        :param float cooldown: time before a trial call, in seconds, by default the provider is discarded for the
+            lifetime of the pool.
+
+        """
+        self.get_breaker(name).open(cooldown)
+
+    def throttle(self, name):
+        """Wait until a call to a provider is allowed by its rate limit.
+
+        :param str name: name of the provider.
+
+        """
+        bucket = self.get_bucket(name)
+        if bucket is not None:
+            bucket.acquire()
+
     def list_subtitles_provider(self, provider, video, languages):
         """List subtitles with a single provider.
 
@@ -101,25 +173,19 @@ class ProviderPool(object):
         :rtype: list of :class:`~subliminal.subtitle.Subtitle` or None
 
         """
-        # check video validity
-        if not provider_manager[provider].plugin.check(video):
-            logger.info('Skipping provider %r: not a valid video', provider)
-            return []
-
-        # check supported languages
-        provider_languages = provider_manager[provider].plugin.languages & languages
+        # check video, languages and discarded provider
+        breaker = self.get_breaker(provider)
+        provider_languages = _check_provider(provider, video, languages, breaker)
         if not provider_languages:
-            logger.info('Skipping provider %r: no language to search for', provider)
             return []
 
         # list subtitles
         logger.info('Listing subtitles with provider %r and languages %r', provider, provider_languages)
-        try:
-            return self[provider].list_subtitles(video, provider_languages)
-        except (requests.Timeout, socket.timeout):
-            logger.error('Provider %r timed out', provider)
-        except:
-            logger.exception('Unexpected error in provider %r', provider)
+        with _ProviderCall(provider, breaker) as call:
+            self.throttle(provider)
+            subtitles = self[provider].list_subtitles(video, provider_languages)
+
+        return None if call.failed else subtitles
 
     def list_subtitles(self, video, languages):
         """List subtitles.
@@ -135,16 +201,9 @@ class ProviderPool(object):
         subtitles = []
 
         for name in self.providers:
-            # check discarded providers
-            if name in self.discarded_providers:
-                logger.debug('Skipping discarded provider %r', name)
-                continue
-
-            # list subtitles
+            # list subtitles, skipping providers that failed
             provider_subtitles = self.list_subtitles_provider(name, video, languages)
             if provider_subtitles is None:
-                logger.info('Discarding provider %s', name)
-                self.discarded_providers.add(name)
                 continue
 
             # add the subtitles
@@ -152,6 +211,78 @@ class ProviderPool(object):
 
         return subtitles
 
+    def list_subtitles_batch_provider(self, provider, videos, languages):
+        """List subtitles of several videos with a single provider, by batches of its
+        :attr:`~subliminal.providers.Provider.batch_size` videos.
+
+        The videos and languages are checked against the provider.
+
+        :param str provider: name of the provider.
+        :param videos: videos to list subtitles for.
+        :type videos: list of :class:`~subliminal.video.Video`
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :return: found subtitles of each video, in the same order as `videos`, `None` for the videos of failed batches.
+        :rtype: list
+
+        """
+        results = [[] for _ in videos]
+
+        # check supported languages
+        provider_languages = provider_manager[provider].plugin.languages & languages
+        if not provider_languages:
+            logger.info('Skipping provider %r: no language to search for', provider)
+            return results
+
+        # check videos validity
+        indexes = [i for i, v in enumerate(videos) if provider_manager[provider].plugin.check(v)]
+
+        breaker = self.get_breaker(provider)
+        batch_size = provider_manager[provider].plugin.batch_size
+        for batch in (indexes[i:i + batch_size] for i in range(0, len(indexes), batch_size)):
+            # check discarded provider
+            if not breaker.allow():
+                logger.debug('Skipping discarded provider %r', provider)
+                break
+
+            # list subtitles
+            logger.info('Listing subtitles of %d video(s) with provider %r and languages %r', len(batch), provider,
+                        provider_languages)
+            try:
+                self.throttle(provider)
+                batch_subtitles = self[provider].list_subtitles_batch([videos[i] for i in batch], provider_languages)
+            except (requests.Timeout, socket.timeout):
+                logger.error('Provider %r timed out', provider)
+            except:
+                logger.exception('Unexpected error in provider %r', provider)
+            else:
+                breaker.record_success()
+                for i, subtitles in zip(batch, batch_subtitles):
+                    results[i] = subtitles
+                continue
+
+            breaker.record_failure()
+            for i in batch:
+                results[i] = None
+
+        return results
+
+    def list_subtitles_batch(self, videos, languages):
+        """List subtitles of several videos, searching for several videos at once with the providers supporting it.
+
+        :param videos: videos to list subtitles for.
+        :type videos: iterable of :class:`~subliminal.video.Video`
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :return: found subtitles of each video, in the same order as `videos`.
+        :rtype: list of list of :class:`~subliminal.subtitle.Subtitle`
+
+        """
+        videos = list(videos)
+
+        return _merge_provider_results(len(videos), [self.list_subtitles_batch_provider(n, videos, languages)
+                                                     for n in self.providers])
+
     def download_subtitle(self, subtitle):
         """Download `subtitle`'s :attr:`~subliminal.subtitle.Subtitle.content`.
 
@@ -162,28 +293,80 @@ class ProviderPool(object):
 
         """
         # check discarded providers
-        if subtitle.provider_name in self.discarded_providers:
+        breaker = self.get_breaker(subtitle.provider_name)
+        if not breaker.allow():
             logger.warning('Provider %r is discarded', subtitle.provider_name)
             return False
 
         logger.info('Downloading subtitle %r', subtitle)
-        try:
+        with _ProviderCall(subtitle.provider_name, breaker) as call:
+            self.throttle(subtitle.provider_name)
             self[subtitle.provider_name].download_subtitle(subtitle)
-        except (requests.Timeout, socket.timeout):
-            logger.error('Provider %r timed out, discarding it', subtitle.provider_name)
-            self.discarded_providers.add(subtitle.provider_name)
-            return False
-        except:
-            logger.exception('Unexpected error in provider %r, discarding it', subtitle.provider_name)
-            self.discarded_providers.add(subtitle.provider_name)
-            return False
 
-        # check subtitle validity
-        if not subtitle.is_valid():
-            logger.error('Invalid subtitle')
-            return False
+        return not call.failed and _check_subtitle(subtitle)
 
-        return True
+    def download_subtitles_batch_provider(self, provider, subtitles):
+        """Download the :attr:`~subliminal.subtitle.Subtitle.content` of several subtitles of a single provider, by
+        batches of its :attr:`~subliminal.providers.Provider.batch_size` subtitles.
+
+        :param str provider: name of the provider.
+        :param subtitles: subtitles to download.
+        :type subtitles: list of :class:`~subliminal.subtitle.Subtitle`
+        :return: for each subtitle, `True` if it has been successfully downloaded, `False` otherwise.
+        :rtype: list of bool
+
+        """
+        results = [False] * len(subtitles)
+        breaker = self.get_breaker(provider)
+        batch_size = provider_manager[provider].plugin.batch_size if provider in self.providers else 1
+        for start in range(0, len(subtitles), batch_size):
+            batch = subtitles[start:start + batch_size]
+
+            # check discarded provider
+            if not breaker.allow():
+                logger.warning('Provider %r is discarded', provider)
+                break
+
+            logger.info('Downloading %d subtitle(s) with provider %r', len(batch), provider)
+            try:
+                self.throttle(provider)
+                self[provider].download_subtitles_batch(batch)
+            except (requests.Timeout, socket.timeout):
+                logger.error('Provider %r timed out', provider)
+                breaker.record_failure()
+                continue
+            except:
+                logger.exception('Unexpected error in provider %r', provider)
+                breaker.record_failure()
+                continue
+            breaker.record_success()
+
+            # check subtitles validity
+            for i, subtitle in enumerate(batch, start):
+                if not subtitle.is_valid():
+                    logger.error('Invalid subtitle %r', subtitle)
+                    continue
+                results[i] = True
+
+        return results
+
+    def download_subtitles_batch(self, subtitles):
+        """Download the :attr:`~subliminal.subtitle.Subtitle.content` of several subtitles, downloading several
+        subtitles at once with the providers supporting it.
+
+        :param subtitles: subtitles to download.
+        :type subtitles: list of :class:`~subliminal.subtitle.Subtitle`
+        :return: for each subtitle, `True` if it has been successfully downloaded, `False` otherwise.
+        :rtype: list of bool
+
+        """
+        results = [False] * len(subtitles)
+        for provider, indexes in _group_by_provider(subtitles).items():
+            provider_results = self.download_subtitles_batch_provider(provider, [subtitles[i] for i in indexes])
+            for i, result in zip(indexes, provider_results):
+                results[i] = result
+
+        return results
 
     def download_best_subtitles(self, subtitles, video, languages, min_score=0, hearing_impaired=False, only_one=False,
                                 compute_score=None):
@@ -204,40 +387,95 @@ class ProviderPool(object):
         :rtype: list of :class:`~subliminal.subtitle.Subtitle`
 
         """
-        compute_score = compute_score or default_compute_score
-
-        # sort subtitles by score
-        scored_subtitles = sorted([(s, compute_score(s, video, hearing_impaired=hearing_impaired))
-                                  for s in subtitles], key=operator.itemgetter(1), reverse=True)
-
         # download best subtitles, falling back on the next on error
         downloaded_subtitles = []
-        for subtitle, score in scored_subtitles:
-            # check score
-            if score < min_score:
-                logger.info('Score %d is below min_score (%d)', score, min_score)
-                break
-
-            # check downloaded languages
-            if subtitle.language in set(s.language for s in downloaded_subtitles):
-                logger.debug('Skipping subtitle: %r already downloaded', subtitle.language)
-                continue
-
-            # download
+        for subtitle in _iter_best_subtitles(subtitles, video, languages, downloaded_subtitles, min_score,
+                                             hearing_impaired, only_one, compute_score):
             if self.download_subtitle(subtitle):
                 downloaded_subtitles.append(subtitle)
 
-            # stop when all languages are downloaded
-            if set(s.language for s in downloaded_subtitles) == languages:
-                logger.debug('All languages downloaded')
-                break
+        return downloaded_subtitles
+
+    def download_best_subtitles_batch(self, videos, languages, min_score=0, hearing_impaired=False, only_one=False,
+                                      compute_score=None):
+        """List and download the best matching subtitles of several videos.
+
+        Subtitles are listed for the `languages` missing from each video's
+        :attr:`~subliminal.video.Video.subtitle_languages`. The `videos` are processed by chunks of the largest
+        :attr:`~subliminal.providers.Provider.batch_size` of the :attr:`providers`: the best subtitle of each video of
+        a chunk is downloaded with :meth:`download_subtitles_batch`, falling back on the next ones one video at a time.
 
-            # stop if only one subtitle is requested
-            if only_one:
-                logger.debug('Only one subtitle downloaded')
+        :param videos: videos to download subtitles for.
+        :type videos: iterable of :class:`~subliminal.video.Video`
+        :param languages: languages to download.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :param min_score: minimum score for a subtitle to be downloaded or a function that takes the `video` and
+            returns it.
+        :type min_score: int or callable
+        :param bool hearing_impaired: hearing impaired preference.
+        :param bool only_one: download only one subtitle, not one per language.
+        :param compute_score: function that takes `subtitle` and `video` as positional arguments,
+            `hearing_impaired` as keyword argument and returns the score.
+        :return: the videos with their downloaded subtitles, in the same order as `videos`.
+        :rtype: generator of tuple
+
+        """
+        listed_videos = ((v, self._list_subtitles_video(v, languages - v.subtitle_languages)) for v in videos)
+        for item in self._download_best_subtitles_listed(listed_videos, languages, min_score, hearing_impaired,
+                                                         only_one, compute_score):
+            yield item
+
+    def _list_subtitles_video(self, video, languages):
+        return self.list_subtitles(video, languages)
+
+    def _map(self, func, *iterables):
+        """Call `func` with the items of `iterables` one after the other, see :func:`map`."""
+        return [func(*args) for args in zip(*iterables)]
+
+    def _download_best_subtitles_listed(self, listed_videos, languages, min_score, hearing_impaired, only_one,
+                                        compute_score):
+        """Download the best subtitles of videos with their listed subtitles, by chunks of the largest
+        :attr:`~subliminal.providers.Provider.batch_size` of the :attr:`providers`."""
+        chunk_size = max([1] + [provider_manager[n].plugin.batch_size for n in self.providers])
+        listed_videos = iter(listed_videos)
+        while True:
+            chunk = list(islice(listed_videos, chunk_size))
+            if not chunk:
                 break
 
-        return downloaded_subtitles
+            for item in zip([v for v, _ in chunk], self._download_best_subtitles_chunk(
+                    chunk, languages, min_score, hearing_impaired, only_one, compute_score)):
+                yield item
+
+    def _download_best_subtitles_chunk(self, chunk, languages, min_score, hearing_impaired, only_one, compute_score):
+        """Download the best subtitles of a chunk of videos with their listed subtitles."""
+        logger.info('Downloading best subtitles for %d video(s)', len(chunk))
+        min_scores = [min_score(v) if callable(min_score) else min_score for v, _ in chunk]
+
+        # download the best subtitle of each video at once
+        best_subtitles = [next(_iter_best_subtitles(s, v, languages, [], m, hearing_impaired, only_one, compute_score),
+                               None) for (v, s), m in zip(chunk, min_scores)]
+        results = iter(self.download_subtitles_batch([s for s in best_subtitles if s is not None]))
+        downloaded = [s is not None and next(results) for s in best_subtitles]
+
+        # fall back on the next best subtitles of each video
+        def download(video, subtitles, best_subtitle, best_downloaded, video_min_score):
+            if best_subtitle is None:
+                return []
+
+            downloaded_subtitles = [best_subtitle] if best_downloaded else []
+            if not (only_one and best_downloaded):
+                remaining_languages = languages - {best_subtitle.language} if best_downloaded else languages
+                downloaded_subtitles.extend(self.download_best_subtitles(
+                    [s for s in subtitles if s is not best_subtitle and s.language in remaining_languages], video,
+                    remaining_languages, min_score=video_min_score, hearing_impaired=hearing_impaired,
+                    only_one=only_one, compute_score=compute_score))
+            logger.info('Downloaded %d subtitle(s) for %r', len(downloaded_subtitles), video)
+
+            return downloaded_subtitles
+
+        return self._map(download, [v for v, _ in chunk], [s for _, s in chunk], best_subtitles, downloaded,
+                         min_scores)
 
     def terminate(self):
         """Terminate all the :attr:`initialized_providers`."""
@@ -247,38 +485,364 @@ class ProviderPool(object):
 
 
 class AsyncProviderPool(ProviderPool):
-    """Subclass of :class:`ProviderPool` with asynchronous support for :meth:`~ProviderPool.list_subtitles`.
+    """Subclass of :class:`ProviderPool` with asynchronous support for :meth:`~ProviderPool.list_subtitles` and
+    :meth:`~ProviderPool.download_best_subtitles_batch`.
+
+    Calls to each provider are limited by :attr:`provider_max_workers` as providers are not all thread-safe.
+
+    Threads are reused across calls: the :attr:`executor` is started lazily and shut down on :meth:`terminate`.
+
+    Listing the subtitles of a video can be bounded by a `deadline`: the calls to the providers that did not reply in
+    time are cancelled if not started yet, their results are dropped or merged in the next listing of the same video
+    and languages with `merge_late`. Providers still running a late call are skipped until it returns so they do not
+    hold more threads. With `early_exit`, the listing stops as soon as a subtitle matching the video hash is found for
+    every language.
+
+    With `speculative_downloads`, :meth:`~ProviderPool.download_best_subtitles` downloads the best candidates of
+    each language concurrently and keeps the best valid one instead of trying them one after the other. Up to
+    :attr:`provider_max_workers` candidates of the same provider are downloaded together, and a candidate is skipped
+    if a better one was downloaded before it started. They run in a separate :attr:`download_executor` so downloads
+    started from :meth:`download_best_subtitles_batch` cannot wait on a busy :attr:`executor`.
 
     :param int max_workers: maximum number of threads to use. If `None`, :attr:`max_workers` will be set
         to the number of :attr:`~ProviderPool.providers`.
+    :param list providers: name of providers to use, if not all.
+    :param dict provider_configs: provider configuration as keyword arguments per provider name to pass when
+        instanciating the :class:`~subliminal.providers.Provider`.
+    :param provider_max_workers: maximum number of concurrent calls to a provider, or per provider name.
+    :type provider_max_workers: int or dict
+    :param dict rate_limits: rate limit overrides, see :class:`ProviderPool`.
+    :param dict breaker_config: circuit breaker configuration, see :class:`ProviderPool`.
+    :param float deadline: maximum time to list the subtitles of a video, in seconds.
+    :param bool early_exit: stop listing once a hash match is found for every language.
+    :param bool merge_late: merge the results of the providers that missed the `deadline` in the next listing of the
+        same video instead of dropping them.
+    :param int speculative_downloads: maximum number of the best candidates per language to download concurrently.
 
     """
-    def __init__(self, max_workers=None, *args, **kwargs):
-        super(AsyncProviderPool, self).__init__(*args, **kwargs)
+    #: Maximum number of videos to keep the late calls of
+    max_late_videos = 100
+
+    def __init__(self, max_workers=None, providers=None, provider_configs=None, provider_max_workers=1,
+                 rate_limits=None, breaker_config=None, deadline=None, early_exit=False, merge_late=False,
+                 speculative_downloads=1):
+        super(AsyncProviderPool, self).__init__(providers=providers, provider_configs=provider_configs,
+                                                rate_limits=rate_limits, breaker_config=breaker_config)
 
         #: Maximum number of threads to use
         self.max_workers = max_workers or len(self.providers)
 
+        #: Maximum number of concurrent calls per provider
+        self.provider_max_workers = {name: provider_max_workers.get(name, 1) if isinstance(provider_max_workers, dict)
+                                     else provider_max_workers for name in self.providers}
+
+        #: Semaphores limiting the concurrent calls per provider
+        self.provider_semaphores = {n: threading.BoundedSemaphore(w) for n, w in self.provider_max_workers.items()}
+
+        #: Lock for the initialization of the providers and of the executor
+        self.lock = threading.Lock()
+
+        #: Executor shared by all the calls, started lazily
+        self.executor = None
+
+        #: Maximum time to list the subtitles of a video, in seconds
+        self.deadline = deadline
+
+        #: Stop listing once a hash match is found for every language
+        self.early_exit = early_exit
+
+        #: Merge late results in the next listing of the same video
+        self.merge_late = merge_late
+
+        #: Languages and pending calls to providers that missed the deadline per provider name, per video name
+        self.late_futures = OrderedDict()
+
+        #: Last call that missed the deadline, per provider name
+        self.late_calls = {}
+
+        #: Number of the best candidates per language to download concurrently
+        self.speculative_downloads = speculative_downloads
+
+        #: Executor for the speculative downloads, started lazily with a thread per call allowed to the providers
+        self.download_executor = None
+
+    def __getitem__(self, name):
+        if name in self.initialized_providers:
+            return self.initialized_providers[name]
+
+        with self.lock:
+            return super(AsyncProviderPool, self).__getitem__(name)
+
     def list_subtitles_provider(self, provider, video, languages):
-        return provider, super(AsyncProviderPool, self).list_subtitles_provider(provider, video, languages)
+        with self.provider_semaphores[provider]:
+            return provider, super(AsyncProviderPool, self).list_subtitles_provider(provider, video, languages)
+
+    def get_executor(self):
+        """Get the :attr:`executor`, starting it if necessary.
+
+        :return: the executor.
+        :rtype: :class:`~concurrent.futures.ThreadPoolExecutor`
+
+        """
+        with self.lock:
+            if self.executor is None:
+                logger.debug('Starting executor with %d workers', self.max_workers)
+                self.executor = ThreadPoolExecutor(self.max_workers)
+
+            return self.executor
+
+    def get_download_executor(self):
+        """Get the :attr:`download_executor`, starting it if necessary.
+
+        :return: the executor.
+        :rtype: :class:`~concurrent.futures.ThreadPoolExecutor`
+
+        """
+        with self.lock:
+            if self.download_executor is None:
+                max_workers = max(self.max_workers, sum(self.provider_max_workers.values()))
+                logger.debug('Starting download executor with %d workers', max_workers)
+                self.download_executor = ThreadPoolExecutor(max_workers)
+
+            return self.download_executor
 
     def list_subtitles(self, video, languages):
-        subtitles = []
+        deadline = clock() + self.deadline if self.deadline is not None else None
 
-        with ThreadPoolExecutor(self.max_workers) as executor:
-            for provider, provider_subtitles in executor.map(self.list_subtitles_provider, self.providers,
-                                                             itertools.repeat(video, len(self.providers)),
-                                                             itertools.repeat(languages, len(self.providers))):
-                # discard provider that failed
-                if provider_subtitles is None:
-                    logger.info('Discarding provider %s', provider)
-                    self.discarded_providers.add(provider)
-                    continue
+        # call the providers, reusing the late calls of a previous listing with the same languages
+        late_languages, futures = self.late_futures.pop(video.name, (None, {}))
+        if late_languages != languages:
+            futures = {}
+        for name in self.providers:
+            if name in futures:
+                continue
 
-                # add subtitles
-                subtitles.extend(provider_subtitles)
+            # skip providers busy with a late call
+            late_call = self.late_calls.get(name)
+            if late_call is not None and not late_call.done():
+                logger.info('Skipping provider %r: a previous call is late', name)
+                continue
 
-        return subtitles
+            futures[name] = self.get_executor().submit(self.list_subtitles_provider, name, video, languages)
+
+        # collect the results as they come
+        provider_subtitles = {}
+        pending = set(futures.values())
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - clock()) if deadline is not None else None,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info('Deadline reached with %d provider(s) pending', len(pending))
+                break
+
+            for future in done:
+                provider, subtitles = future.result()
+                provider_subtitles[provider] = subtitles
+
+            if self.early_exit and _hash_matched(provider_subtitles, video, languages):
+                logger.info('Hash match found for all languages')
+                break
+
+        # cancel the late calls not started yet, keep the others for the next listing
+        late_futures = {n: f for n, f in futures.items() if f in pending and not f.cancel()}
+        self.late_calls.update(late_futures)
+        if late_futures and self.merge_late:
+            self.late_futures[video.name] = (languages, late_futures)
+            while len(self.late_futures) > self.max_late_videos:
+                self.late_futures.popitem(last=False)
+
+        # skip providers that failed or are late
+        return [s for n in self.providers if provider_subtitles.get(n) for s in provider_subtitles[n]]
+
+    def list_subtitles_batch_provider(self, provider, videos, languages):
+        with self.provider_semaphores[provider]:
+            return super(AsyncProviderPool, self).list_subtitles_batch_provider(provider, videos, languages)
+
+    def list_subtitles_batch(self, videos, languages):
+        videos = list(videos)
+        results = self.get_executor().map(self.list_subtitles_batch_provider, self.providers,
+                                          [videos] * len(self.providers), [languages] * len(self.providers))
+
+        return _merge_provider_results(len(videos), results)
+
+    def download_subtitles_batch_provider(self, provider, subtitles):
+        if provider not in self.provider_semaphores:
+            return super(AsyncProviderPool, self).download_subtitles_batch_provider(provider, subtitles)
+
+        with self.provider_semaphores[provider]:
+            return super(AsyncProviderPool, self).download_subtitles_batch_provider(provider, subtitles)
+
+    def download_subtitles_batch(self, subtitles):
+        grouped_indexes = _group_by_provider(subtitles)
+        batches = [[subtitles[i] for i in indexes] for indexes in grouped_indexes.values()]
+        results = [False] * len(subtitles)
+        for indexes, provider_results in zip(grouped_indexes.values(),
+                                             self.get_executor().map(self.download_subtitles_batch_provider,
+                                                                     grouped_indexes, batches)):
+            for i, result in zip(indexes, provider_results):
+                results[i] = result
+
+        return results
+
+    def download_subtitle(self, subtitle):
+        if subtitle.provider_name not in self.provider_semaphores:
+            return super(AsyncProviderPool, self).download_subtitle(subtitle)
+
+        with self.provider_semaphores[subtitle.provider_name]:
+            return super(AsyncProviderPool, self).download_subtitle(subtitle)
+
+    def download_best_subtitles(self, subtitles, video, languages, min_score=0, hearing_impaired=False, only_one=False,
+                                compute_score=None):
+        if self.speculative_downloads <= 1:
+            return super(AsyncProviderPool, self).download_best_subtitles(subtitles, video, languages,
+                                                                          min_score=min_score,
+                                                                          hearing_impaired=hearing_impaired,
+                                                                          only_one=only_one,
+                                                                          compute_score=compute_score)
+
+        compute_score = compute_score or default_compute_score
+
+        # group the candidates per language by descending score, all together if only one subtitle is requested
+        candidates = OrderedDict()
+        for subtitle, score in sorted([(s, compute_score(s, video, hearing_impaired=hearing_impaired))
+                                       for s in subtitles], key=operator.itemgetter(1), reverse=True):
+            if score < min_score:
+                logger.info('Score %d is below min_score (%d)', score, min_score)
+                break
+            candidates.setdefault(None if only_one else subtitle.language, []).append(subtitle)
+
+        # download the best candidates concurrently, as many per provider as it allows calls at once, falling back on
+        # the next ones if none is valid
+        downloaded_subtitles = []
+        executor = self.get_download_executor()
+        while candidates:
+            futures = OrderedDict()
+            for key, key_candidates in list(candidates.items()):
+                speculated = []
+                provider_counts = defaultdict(int)
+                for subtitle in key_candidates[:self.speculative_downloads]:
+                    max_workers = self.provider_max_workers.get(subtitle.provider_name)
+                    if max_workers is not None and provider_counts[subtitle.provider_name] >= max_workers:
+                        break
+                    provider_counts[subtitle.provider_name] += 1
+                    speculated.append(subtitle)
+
+                done = [threading.Event() for _ in speculated]
+                futures[key] = [(s, executor.submit(self._download_speculative, s, done, i))
+                                for i, s in enumerate(speculated)]
+                candidates[key] = key_candidates[len(speculated):]
+
+            for key, key_futures in futures.items():
+                # keep the first valid subtitle by score, discarding the others
+                for i, (subtitle, future) in enumerate(key_futures):
+                    if future.result():
+                        downloaded_subtitles.append(subtitle)
+                        for _, other_future in key_futures[i + 1:]:
+                            other_future.cancel()
+                        del candidates[key]
+                        break
+                else:
+                    if not candidates[key]:
+                        del candidates[key]
+
+        return downloaded_subtitles
+
+    def _download_speculative(self, subtitle, done, index):
+        """Download a speculative candidate unless a better one was already downloaded.
+
+        :param subtitle: subtitle to download.
+        :type subtitle: :class:`~subliminal.subtitle.Subtitle`
+        :param done: flags of the downloaded candidates, by descending score.
+        :type done: list of :class:`threading.Event`
+        :param int index: index of the `subtitle` in the candidates.
+        :return: `True` if the subtitle has been successfully downloaded, `False` otherwise.
+        :rtype: bool
+
+        """
+        semaphore = self.provider_semaphores.get(subtitle.provider_name)
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            if any(d.is_set() for d in done[:index]):
+                logger.debug('Skipping subtitle %r: a better one was downloaded', subtitle)
+                return False
+
+            if not ProviderPool.download_subtitle(self, subtitle):
+                return False
+            done[index].set()
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+        return True
+
+    def download_best_subtitles_batch(self, videos, languages, min_score=0, hearing_impaired=False, only_one=False,
+                                      compute_score=None):
+        """List and download the best matching subtitles of several videos concurrently.
+
+        Up to :attr:`max_workers` videos are listed at once, each querying the providers one at a time in the
+        first available order so no thread waits on a busy provider while another one is free. The subtitles of
+        each video are aggregated in the order of the :attr:`~ProviderPool.providers` so the results do not depend
+        on scheduling. The downloads of a chunk of videos are made concurrently as well.
+
+        See :meth:`ProviderPool.download_best_subtitles_batch` for the parameters.
+
+        """
+        def list_subtitles(video):
+            return video, self._list_subtitles_video(video, languages - video.subtitle_languages)
+
+        listed_videos = _imap(self.get_executor(), list_subtitles, videos, self.max_workers * 2)
+        for item in self._download_best_subtitles_listed(listed_videos, languages, min_score, hearing_impaired,
+                                                         only_one, compute_score):
+            yield item
+
+    def _map(self, func, *iterables):
+        return list(self.get_executor().map(func, *iterables))
+
+    def _list_subtitles_video(self, video, languages):
+        """List subtitles of a single video with each provider in turn, first available provider first."""
+        remaining = [n for n in self.providers if n not in self.discarded_providers and
+                     provider_manager[n].plugin.check(video) and provider_manager[n].plugin.languages & languages]
+        deadline = clock() + self.deadline if self.deadline is not None else None
+        provider_subtitles = {}
+        while remaining:
+            # stop at the deadline or on early exit
+            if deadline is not None and clock() >= deadline:
+                logger.info('Deadline reached with %d provider(s) remaining', len(remaining))
+                break
+            if self.early_exit and _hash_matched(provider_subtitles, video, languages):
+                logger.info('Hash match found for all languages')
+                break
+
+            # pick the first available provider, waiting for the first one if they are all busy
+            name = next((n for n in remaining if self.provider_semaphores[n].acquire(False)), None)
+            if name is None:
+                name = remaining[0]
+                self.provider_semaphores[name].acquire()
+            remaining.remove(name)
+
+            # list subtitles
+            try:
+                provider_subtitles[name] = ProviderPool.list_subtitles_provider(self, name, video, languages)
+            finally:
+                self.provider_semaphores[name].release()
+
+        return [s for n in self.providers if provider_subtitles.get(n) for s in provider_subtitles[n]]
+
+    def terminate(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+            download_executor, self.download_executor = self.download_executor, None
+        self.late_futures.clear()
+        self.late_calls.clear()
+        if executor is not None:
+            logger.debug('Shutting down executor')
+            executor.shutdown()
+        if download_executor is not None:
+            logger.debug('Shutting down download executor')
+            download_executor.shutdown()
+
+        super(AsyncProviderPool, self).terminate()
 
 
 def check_video(video, languages=None, age=None, undefined=False):
@@ -318,13 +882,61 @@ def check_video(video, languages=None, age=None, undefined=False):
     return True
 
 
-def search_external_subtitles(path, directory=None):
+class DirectoryIndex(object):
+    """Index of subtitle filenames per directory for :func:`search_external_subtitles`.
+
+    Each directory is listed at most once and its subtitle filenames are kept sorted so the subtitles of a video are
+    found with a binary search on its filename root rather than by comparing every entry of the directory.
+
+    Directories can be indexed from a listing made elsewhere with :meth:`add`, as :func:`walk_videos` does.
+
+    """
+    def __init__(self):
+        #: Sorted subtitle filenames per directory
+        self.directories = {}
+
+    def add(self, directory, filenames):
+        """Index the `filenames` of a `directory`.
+
+        :param str directory: path to the directory.
+        :param list filenames: all the filenames in the directory.
+
+        """
+        self.directories[os.path.normpath(directory)] = sorted(f for f in filenames
+                                                               if f.endswith(SUBTITLE_EXTENSIONS))
+
+    def search(self, directory, fileroot):
+        """Search subtitle filenames starting with `fileroot` in a `directory`, listing it if not indexed yet.
+
+        :param str directory: path to the directory.
+        :param str fileroot: start of the filenames.
+        :return: the matching subtitle filenames.
+        :rtype: list of str
+
+        """
+        directory = os.path.normpath(directory)
+        if directory not in self.directories:
+            self.add(directory, os.listdir(directory))
+
+        filenames = self.directories[directory]
+        matches = []
+        for i in range(bisect_left(filenames, fileroot), len(filenames)):
+            if not filenames[i].startswith(fileroot):
+                break
+            matches.append(filenames[i])
+
+        return matches
+
+
+def search_external_subtitles(path, directory=None, index=None):
     """Search for external subtitles from a video `path` and their associated language.
 
     Unless `directory` is provided, search will be made in the same directory as the video file.
 
     :param str path: path to the video.
     :param str directory: directory to search for subtitles.
+    :param index: index to use, sharing it avoids listing the same directory for every video.
+    :type index: :class:`DirectoryIndex`
     :return: found subtitles with their languages.
     :rtype: dict
 
@@ -335,12 +947,10 @@ def search_external_subtitles(path, directory=None):
     fileroot, fileext = os.path.splitext(filename)
 
     # search for subtitles
+    if index is None:
+        index = DirectoryIndex()
     subtitles = {}
-    for p in os.listdir(directory or dirpath):
-        # keep only valid subtitle filenames
-        if not p.startswith(fileroot) or not p.endswith(SUBTITLE_EXTENSIONS):
-            continue
-
+    for p in index.search(directory or dirpath, fileroot):
         # extract the potential language code
         language = Language('und')
         language_code = p[len(fileroot):-len(os.path.splitext(p)[1])].replace(fileext, '').replace('_', '-')[1:]
@@ -360,6 +970,8 @@ def search_external_subtitles(path, directory=None):
 def scan_video(path):
     """Scan a video from a `path`.
 
+    Hashes are looked up in the :data:`~subliminal.index.hash_index` first, if it is configured.
+
     :param str path: existing path to the video.
     :return: the scanned video.
     :rtype: :class:`~subliminal.video.Video`
@@ -380,23 +992,36 @@ def scan_video(path):
     video = Video.fromguess(path, guessit(path))
 
     # size and hashes
-    video.size = os.path.getsize(path)
+    hash_video(video)
+
+    return video
+
+
+def hash_video(video):
+    """Set the :attr:`~subliminal.video.Video.size` and the :attr:`~subliminal.video.Video.hashes` of an existing
+    `video`.
+
+    Hashes are not computed for videos smaller than 10MB.
+
+    :param video: the video to hash.
+    :type video: :class:`~subliminal.video.Video`
+
+    """
+    stat = os.stat(video.name)
+    video.size = stat.st_size
     if video.size > 10485760:
         logger.debug('Size is %d', video.size)
-        video.hashes['opensubtitles'] = hash_opensubtitles(path)
-        video.hashes['shooter'] = hash_shooter(path)
-        video.hashes['thesubdb'] = hash_thesubdb(path)
-        video.hashes['napiprojekt'] = hash_napiprojekt(path)
+        video.hashes.update(hash_index.compute_hashes(video.name, stat))
         logger.debug('Computed hashes %r', video.hashes)
     else:
         logger.warning('Size is lower than 10MB: hashes not computed')
 
-    return video
-
 
 def scan_archive(path):
     """Scan an archive from a `path`.
 
+    Hashes are computed for videos stored uncompressed by reading only the byte ranges they need from the archive.
+
     :param str path: existing path to the archive.
     :return: the scanned video.
     :rtype: :class:`~subliminal.video.Video`
@@ -434,23 +1059,60 @@ def scan_archive(path):
         video = Video.fromguess(rar_filepath, guessit(rar_filepath))
 
         # size
-        video.size = rar.getinfo(rar_filename).file_size
+        rar_info = rar.getinfo(rar_filename)
+        video.size = rar_info.file_size
+
+        # hashes, only stored videos can be read without extracting them
+        if video.size > 10485760 and rar_info.compress_type == RAR_M0 and not rar_info.needs_password():
+            logger.debug('Size is %d', video.size)
+            try:
+                f = rar.open(rar_info)
+                try:
+                    video.hashes.update(compute_file_hashes(f, video.size))
+                finally:
+                    f.close()
+            except (RarError, IOError):
+                logger.exception('Error hashing video %r in archive %r', rar_filename, filename)
+            logger.debug('Computed hashes %r', video.hashes)
     else:
         raise ValueError('Unsupported extension %r' % os.path.splitext(path)[1])
 
     return video
 
 
-def scan_videos(path, age=None, archives=True):
+def scan_videos(path, age=None, archives=True, max_workers=None, max_processes=None, index=None, journal=None):
     """Scan `path` for videos and their subtitles.
 
-    See :func:`refine` to find additional information for the video.
+    See :func:`refine` to find additional information for the video and :func:`iter_videos` for the parameters.
+
+    :return: the scanned videos.
+    :rtype: list of :class:`~subliminal.video.Video`
+
+    """
+    return list(iter_videos(path, age=age, archives=archives, max_workers=max_workers, max_processes=max_processes,
+                            index=index, journal=journal))
+
+
+def iter_videos(path, age=None, archives=True, max_workers=None, max_processes=None, index=None, journal=None):
+    """Scan `path` for videos and their subtitles, yielding each video as soon as it is scanned.
+
+    With `max_workers`, videos are scanned by a pool of threads ahead of the consumer while the directory is still
+    being walked. With `max_processes`, guessing is offloaded to a pool of processes as it is CPU-bound. In all cases,
+    videos are yielded in the same order.
 
     :param str path: existing directory path to scan.
     :param datetime.timedelta age: maximum age of the video or archive.
     :param bool archives: scan videos in archives.
+    :param int max_workers: maximum number of threads to use for scanning, default is to scan in the consumer
+        thread.
+    :param int max_processes: maximum number of processes to use for guessing, default is to guess in the scanning
+        thread.
+    :param index: index to populate with the directory listings of the walk.
+    :type index: :class:`DirectoryIndex`
+    :param journal: journal to rescan incrementally with, only pending videos are scanned and tracked in the journal.
+    :type journal: :class:`~subliminal.index.ScanJournal`
     :return: the scanned videos.
-    :rtype: list of :class:`~subliminal.video.Video`
+    :rtype: generator of :class:`~subliminal.video.Video`
 
     """
     # check for non-existing path
@@ -461,60 +1123,413 @@ def scan_videos(path, age=None, archives=True):
     if not os.path.isdir(path):
         raise ValueError('Path is not a directory')
 
-    # walk the path
-    videos = []
-    for dirpath, dirnames, filenames in os.walk(path):
-        logger.debug('Walking directory %r', dirpath)
-
-        # remove badly encoded and hidden dirnames
-        for dirname in list(dirnames):
-            if dirname.startswith('.'):
-                logger.debug('Skipping hidden dirname %r in %r', dirname, dirpath)
-                dirnames.remove(dirname)
-
-        # scan for videos
-        for filename in filenames:
-            # filter on videos and archives
-            if not (filename.endswith(VIDEO_EXTENSIONS) or archives and filename.endswith(ARCHIVE_EXTENSIONS)):
-                continue
+    return _iter_videos(path, age, archives, max_workers, max_processes, index, journal)
 
-            # skip hidden files
-            if filename.startswith('.'):
-                logger.debug('Skipping hidden filename %r in %r', filename, dirpath)
-                continue
 
-            # reconstruct the file path
-            filepath = os.path.join(dirpath, filename)
+def _iter_videos(path, age, archives, max_workers, max_processes, index, journal):
+    filepaths = walk_videos(path, age=age, archives=archives, index=index, journal=journal)
 
-            # skip links
-            if os.path.islink(filepath):
-                logger.debug('Skipping link %r in %r', filename, dirpath)
-                continue
+    def scan(filepath, guess_executor=None):
+        video = _scan_file(filepath, archives, guess_executor)
+        if video is not None and journal is not None:
+            journal.track(filepath, video.name)
+        return video
+
+    # scan in the consumer thread
+    if not max_workers and not max_processes:
+        for filepath in filepaths:
+            video = scan(filepath)
+            if video is not None:
+                yield video
+        return
+
+    # scan with pools
+    guess_executor = ProcessPoolExecutor(max_processes) if max_processes else None
+    try:
+        with ThreadPoolExecutor(max_workers or 1) as executor:
+            for video in _imap(executor, lambda p: scan(p, guess_executor), filepaths,
+                               (max_workers or 1) * 2):
+                if video is not None:
+                    yield video
+    finally:
+        if guess_executor is not None:
+            guess_executor.shutdown()
+
+
+def walk_videos(path, age=None, archives=True, index=None, journal=None):
+    """Walk `path` for videos and archives.
 
-            # skip old files
-            if age and datetime.utcnow() - datetime.utcfromtimestamp(os.path.getmtime(filepath)) > age:
-                logger.debug('Skipping old file %r in %r', filename, dirpath)
+    Directories are listed with :func:`os.scandir` and their entries are sorted by name so the walk is
+    deterministic. Hidden files and directories as well as links are skipped.
+
+    With a `journal`, directories whose modification time did not change since the previous walk are not listed
+    again, only their journaled videos and sub-directories are walked, and only pending videos and archives are
+    yielded, see :meth:`~subliminal.index.ScanJournal.is_pending`.
+
+    :param str path: existing directory path to walk.
+    :param datetime.timedelta age: maximum age of the video or archive.
+    :param bool archives: include archives.
+    :param index: index to populate with the directory listings.
+    :type index: :class:`DirectoryIndex`
+    :param journal: journal of the previous walks.
+    :type journal: :class:`~subliminal.index.ScanJournal`
+    :return: the paths of the videos and archives.
+    :rtype: generator of str
+
+    """
+    logger.debug('Walking directory %r', path)
+    try:
+        mtime = os.stat(path).st_mtime if journal is not None else None
+        entries = None
+
+        # reuse the journaled sub-directories of unchanged directories
+        journaled = journal.get_directory(path) if journal is not None else None
+        if journaled is None or journaled[0] != mtime:
+            entries = sorted(scandir(path), key=operator.attrgetter('name'))
+    except OSError:
+        logger.exception('Error walking directory %r', path)
+        return
+
+    if entries is None:
+        logger.debug('Skipping listing of unchanged directory %r', path)
+        for filename in journaled[2]:
+            filepath = os.path.join(path, filename)
+            try:
+                stat = os.stat(filepath)
+            except OSError:
                 continue
+            if _is_walked(filepath, stat, age, journal):
+                yield filepath
+        for dirname in journaled[1]:
+            for filepath in walk_videos(os.path.join(path, dirname), age=age, archives=archives, index=index,
+                                        journal=journal):
+                yield filepath
+        return
+
+    # index the listing
+    if index is not None:
+        index.add(path, [e.name for e in entries if not e.is_dir(follow_symlinks=False)])
+
+    dirpaths = []
+    filenames = []
+    for entry in entries:
+        # remove hidden dirnames
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name.startswith('.'):
+                logger.debug('Skipping hidden dirname %r in %r', entry.name, path)
+                continue
+            dirpaths.append(entry.path)
+            continue
 
-            # scan
-            if filename.endswith(VIDEO_EXTENSIONS):  # video
-                try:
-                    video = scan_video(filepath)
-                except ValueError:  # pragma: no cover
-                    logger.exception('Error scanning video')
-                    continue
-            elif archives and filename.endswith(ARCHIVE_EXTENSIONS):  # archive
-                try:
-                    video = scan_archive(filepath)
-                except (NotRarFile, RarCannotExec, ValueError):  # pragma: no cover
-                    logger.exception('Error scanning archive')
-                    continue
-            else:  # pragma: no cover
-                raise ValueError('Unsupported file %r' % filename)
+        # filter on videos and archives
+        if not (entry.name.endswith(VIDEO_EXTENSIONS) or archives and entry.name.endswith(ARCHIVE_EXTENSIONS)):
+            continue
+
+        # skip hidden files
+        if entry.name.startswith('.'):
+            logger.debug('Skipping hidden filename %r in %r', entry.name, path)
+            continue
+
+        # skip links
+        if entry.is_symlink():
+            logger.debug('Skipping link %r in %r', entry.name, path)
+            continue
+
+        filenames.append(entry.name)
+        if _is_walked(entry.path, entry.stat(), age, journal):
+            yield entry.path
+
+    # journal the directory once its files are walked
+    if journal is not None:
+        journal.set_directory(path, mtime, [os.path.basename(p) for p in dirpaths], filenames)
+
+    # walk sub-directories
+    for dirpath in dirpaths:
+        for filepath in walk_videos(dirpath, age=age, archives=archives, index=index, journal=journal):
+            yield filepath
+
+
+def _is_walked(filepath, stat, age, journal):
+    """Whether :func:`walk_videos` yields a video or an archive, based on its age and the journal."""
+    # skip old files
+    if age and datetime.utcnow() - datetime.utcfromtimestamp(stat.st_mtime) > age:
+        logger.debug('Skipping old file %r', filepath)
+        return False
+
+    # skip processed files
+    if journal is not None and not journal.is_pending(filepath, stat.st_size, stat.st_mtime):
+        logger.debug('Skipping processed file %r', filepath)
+        return False
+
+    return True
+
+
+def _scan_file(filepath, archives, guess_executor=None):
+    """Scan a video or an archive found by :func:`walk_videos`, logging errors.
+
+    Errors are logged and the file is skipped so a single unreadable file does not stop the scan of the others.
+
+    :param str filepath: path to the video or archive.
+    :param bool archives: scan videos in archives.
+    :param guess_executor: executor to guess the video in, if any.
+    :type guess_executor: :class:`~concurrent.futures.Executor`
+    :return: the scanned video or `None` on error.
+    :rtype: :class:`~subliminal.video.Video`
+
+    """
+    if filepath.endswith(VIDEO_EXTENSIONS):  # video
+        try:
+            if guess_executor is None:
+                return scan_video(filepath)
+
+            video = Video.fromguess(filepath, guess_executor.submit(_guess, filepath).result())
+            hash_video(video)
+            return video
+        except ValueError:  # pragma: no cover
+            logger.exception('Error scanning video')
+        except Exception:
+            logger.exception('Unexpected error scanning video %r', filepath)
+    elif archives and filepath.endswith(ARCHIVE_EXTENSIONS):  # archive
+        try:
+            return scan_archive(filepath)
+        except (NotRarFile, RarCannotExec, ValueError):  # pragma: no cover
+            logger.exception('Error scanning archive')
+        except Exception:  # pragma: no cover
+            logger.exception('Unexpected error scanning archive %r', filepath)
+    else:  # pragma: no cover
+        raise ValueError('Unsupported file %r' % filepath)
+
+
+def _guess(path):
+    """Picklable :func:`~guessit.guessit` for process pools."""
+    return dict(guessit(path))
+
+
+def _group_by_provider(subtitles):
+    """Group the indexes of `subtitles` by provider.
+
+    :param subtitles: the subtitles.
+    :type subtitles: list of :class:`~subliminal.subtitle.Subtitle`
+    :return: indexes of the subtitles per provider name.
+    :rtype: :class:`~collections.OrderedDict`
+
+    """
+    grouped_indexes = OrderedDict()
+    for i, subtitle in enumerate(subtitles):
+        grouped_indexes.setdefault(subtitle.provider_name, []).append(i)
+
+    return grouped_indexes
+
+
+def _merge_provider_results(count, results):
+    """Merge the subtitles found by each provider for several videos.
+
+    :param int count: number of videos.
+    :param results: found subtitles of each video per provider, `None` for the videos a provider failed on.
+    :type results: iterable of list
+    :return: found subtitles of each video.
+    :rtype: list of list of :class:`~subliminal.subtitle.Subtitle`
+
+    """
+    subtitles = [[] for _ in range(count)]
+    for provider_results in results:
+        for video_subtitles, provider_subtitles in zip(subtitles, provider_results):
+            if provider_subtitles:
+                video_subtitles.extend(provider_subtitles)
+
+    return subtitles
+
+
+def _hash_matched(provider_subtitles, video, languages):
+    """Whether a subtitle matching the hash of `video` was found for every language.
+
+    :param dict provider_subtitles: found subtitles per provider name, `None` for failed providers.
+    :param video: video the subtitles were listed for.
+    :type video: :class:`~subliminal.video.Video`
+    :param languages: searched languages.
+    :type languages: set of :class:`~babelfish.language.Language`
+    :rtype: bool
+
+    """
+    matched = {s.language for subtitles in provider_subtitles.values() if subtitles for s in subtitles
+               if s.language in languages and 'hash' in s.get_matches(video)}
+
+    return matched == languages
+
+
+def _check_provider(provider, video, languages, breaker):
+    """Check `video` and `languages` against a provider before calling it.
+
+    :param str provider: name of the provider.
+    :param video: the video.
+    :type video: :class:`~subliminal.video.Video`
+    :param languages: languages to search for.
+    :type languages: set of :class:`~babelfish.language.Language`
+    :param breaker: circuit breaker of the provider.
+    :type breaker: :class:`~subliminal.throttle.CircuitBreaker`
+    :return: the languages to search for with the provider, empty if it must be skipped.
+    :rtype: set of :class:`~babelfish.language.Language`
+
+    """
+    # check video validity
+    if not provider_manager[provider].plugin.check(video):
+        logger.info('Skipping provider %r: not a valid video', provider)
+        return set()
+
+    # check supported languages
+    provider_languages = provider_manager[provider].plugin.languages & languages
+    if not provider_languages:
+        logger.info('Skipping provider %r: no language to search for', provider)
+        return set()
+
+    # check discarded provider
+    if not breaker.allow():
+        logger.debug('Skipping discarded provider %r', provider)
+        return set()
+
+    return provider_languages
+
+
+def _check_subtitle(subtitle):
+    """Check the validity of a downloaded subtitle, logging invalid ones.
+
+    :param subtitle: the downloaded subtitle.
+    :type subtitle: :class:`~subliminal.subtitle.Subtitle`
+    :rtype: bool
+
+    """
+    if not subtitle.is_valid():
+        logger.error('Invalid subtitle')
+        return False
+
+    return True
+
+
+def _iter_best_subtitles(subtitles, video, languages, downloaded_subtitles, min_score=0, hearing_impaired=False,
+                         only_one=False, compute_score=None):
+    """Iterate over the subtitles to download, best first.
+
+    The caller downloads each yielded subtitle and appends it to `downloaded_subtitles` on success, which drives the
+    selection of the next ones.
+
+    :param subtitles: the subtitles to use.
+    :type subtitles: list of :class:`~subliminal.subtitle.Subtitle`
+    :param video: video to download subtitles for.
+    :type video: :class:`~subliminal.video.Video`
+    :param languages: languages to download.
+    :type languages: set of :class:`~babelfish.language.Language`
+    :param list downloaded_subtitles: successfully downloaded subtitles.
+    :param int min_score: minimum score for a subtitle to be downloaded.
+    :param bool hearing_impaired: hearing impaired preference.
+    :param bool only_one: download only one subtitle, not one per language.
+    :param compute_score: function that takes `subtitle` and `video` as positional arguments,
+        `hearing_impaired` as keyword argument and returns the score.
+    :return: the subtitles to download.
+    :rtype: generator of :class:`~subliminal.subtitle.Subtitle`
 
-            videos.append(video)
+    """
+    compute_score = compute_score or default_compute_score
+
+    # sort subtitles by score
+    scored_subtitles = sorted([(s, compute_score(s, video, hearing_impaired=hearing_impaired))
+                              for s in subtitles], key=operator.itemgetter(1), reverse=True)
+
+    for subtitle, score in scored_subtitles:
+        # check score
+        if score < min_score:
+            logger.info('Score %d is below min_score (%d)', score, min_score)
+            break
+
+        # check downloaded languages
+        if subtitle.language in set(s.language for s in downloaded_subtitles):
+            logger.debug('Skipping subtitle: %r already downloaded', subtitle.language)
+            continue
+
+        yield subtitle
+
+        # stop when all languages are downloaded
+        if set(s.language for s in downloaded_subtitles) == languages:
+            logger.debug('All languages downloaded')
+            break
+
+        # stop if only one subtitle is requested
+        if only_one:
+            logger.debug('Only one subtitle downloaded')
+            break
+
+
+class _ProviderCall(object):
+    """Context manager logging and swallowing the errors of a call to a provider.
 
-    return videos
+    The outcome of the call is recorded in the `breaker` of the provider, if any.
+
+    :param str name: name of the provider.
+    :param breaker: circuit breaker of the provider.
+    :type breaker: :class:`~subliminal.throttle.CircuitBreaker`
+    :param str timeout_message: message logged on timeout.
+    :param str error_message: message logged on other errors.
+
+    """
+    #: Errors logged as timeouts
+    timeout_errors = (requests.Timeout, socket.timeout)
+
+    def __init__(self, name, breaker=None, timeout_message='Provider %r timed out',
+                 error_message='Unexpected error in provider %r'):
+        self.name = name
+        self.breaker = breaker
+        self.timeout_message = timeout_message
+        self.error_message = error_message
+
+        #: Whether the call failed
+        self.failed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return False
+
+        if not issubclass(exc_type, Exception):
+            return False
+
+        if issubclass(exc_type, self.timeout_errors):
+            logger.error(self.timeout_message, self.name)
+        else:
+            logger.error(self.error_message, self.name, exc_info=(exc_type, exc_value, traceback))
+
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        self.failed = True
+
+        return True
+
+
+def _imap(executor, func, iterable, buffersize):
+    """Lazy and ordered :meth:`~concurrent.futures.Executor.map`.
+
+    At most `buffersize` calls are submitted ahead of the consumer so the `iterable` is consumed as results are
+    yielded rather than upfront.
+
+    :param executor: the executor to submit calls to.
+    :type executor: :class:`~concurrent.futures.Executor`
+    :param func: the function to call.
+    :param iterable: the arguments to call `func` with.
+    :param int buffersize: maximum number of pending calls.
+    :return: the results, in the same order as `iterable`.
+    :rtype: generator
+
+    """
+    futures = deque()
+    for item in iterable:
+        futures.append(executor.submit(func, item))
+        if len(futures) >= buffersize:
+            yield futures.popleft().result()
+
+    while futures:
+        yield futures.popleft().result()
 
 
 def refine(video, episode_refiners=None, movie_refiners=None, **kwargs):
@@ -574,13 +1589,19 @@ def list_subtitles(videos, languages, pool_class=ProviderPool, **kwargs):
     if not checked_videos:
         return listed_subtitles
 
-    # list subtitles
+    # group the videos missing the same languages
+    grouped_videos = OrderedDict()
+    for video in checked_videos:
+        grouped_videos.setdefault(frozenset(languages - video.subtitle_languages), []).append(video)
+
+    # list subtitles, by batches of videos
     with pool_class(**kwargs) as pool:
-        for video in checked_videos:
-            logger.info('Listing subtitles for %r', video)
-            subtitles = pool.list_subtitles(video, languages - video.subtitle_languages)
-            listed_subtitles[video].extend(subtitles)
-            logger.info('Found %d subtitle(s)', len(subtitles))
+        for missing_languages, missing_videos in grouped_videos.items():
+            logger.info('Listing subtitles for %d video(s)', len(missing_videos))
+            for video, subtitles in zip(missing_videos, pool.list_subtitles_batch(missing_videos,
+                                                                                  set(missing_languages))):
+                listed_subtitles[video].extend(subtitles)
+                logger.info('Found %d subtitle(s) for %r', len(subtitles), video)
 
     return listed_subtitles
 
@@ -595,10 +1616,10 @@ def download_subtitles(subtitles, pool_class=ProviderPool, **kwargs):
     :param \*\*kwargs: additional parameters for the provided `pool_class` constructor.
 
     """
+    subtitles = list(subtitles)
     with pool_class(**kwargs) as pool:
-        for subtitle in subtitles:
-            logger.info('Downloading subtitle %r', subtitle)
-            pool.download_subtitle(subtitle)
+        logger.info('Downloading %d subtitle(s)', len(subtitles))
+        pool.download_subtitles_batch(subtitles)
 
 
 def download_best_subtitles(videos, languages, min_score=0, hearing_impaired=False, only_one=False, compute_score=None,
@@ -607,8 +1628,11 @@ def download_best_subtitles(videos, languages, min_score=0, hearing_impaired=Fal
 
     The `videos` must pass the `languages` and `undefined` (`only_one`) checks of :func:`check_video`.
 
+    The `videos` are consumed lazily so they can be streamed, from :func:`iter_videos` for example: subtitles of the
+    first videos are downloaded while the next ones are still being scanned.
+
     :param videos: videos to download subtitles for.
-    :type videos: set of :class:`~subliminal.video.Video`
+    :type videos: iterable of :class:`~subliminal.video.Video`
     :param languages: languages to download.
     :type languages: set of :class:`~babelfish.language.Language`
     :param int min_score: minimum score for a subtitle to be downloaded.
@@ -626,26 +1650,18 @@ def download_best_subtitles(videos, languages, min_score=0, hearing_impaired=Fal
     downloaded_subtitles = defaultdict(list)
 
     # check videos
-    checked_videos = []
-    for video in videos:
-        if not check_video(video, languages=languages, undefined=only_one):
-            logger.info('Skipping video %r', video)
-            continue
-        checked_videos.append(video)
-
-    # return immediately if no video passed the checks
-    if not checked_videos:
-        return downloaded_subtitles
+    def checked_videos():
+        for video in videos:
+            if not check_video(video, languages=languages, undefined=only_one):
+                logger.info('Skipping video %r', video)
+                continue
+            yield video
 
-    # download best subtitles
+    # download best subtitles as videos come
     with pool_class(**kwargs) as pool:
-        for video in checked_videos:
-            logger.info('Downloading best subtitles for %r', video)
-            subtitles = pool.download_best_subtitles(pool.list_subtitles(video, languages - video.subtitle_languages),
-                                                     video, languages, min_score=min_score,
-                                                     hearing_impaired=hearing_impaired, only_one=only_one,
-                                                     compute_score=compute_score)
-            logger.info('Downloaded %d subtitle(s)', len(subtitles))
+        for video, subtitles in pool.download_best_subtitles_batch(checked_videos(), languages, min_score=min_score,
+                                                                   hearing_impaired=hearing_impaired,
+                                                                   only_one=only_one, compute_score=compute_score):
             downloaded_subtitles[video].extend(subtitles)
 
     return downloaded_subtitles
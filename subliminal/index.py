@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .utils import compute_hashes, video_hashes
+
+logger = logging.getLogger(__name__)
+
+
+class HashIndex(object):
+    """Persistent index of video hashes.
+
+    Hashes are stored in a SQLite database keyed by the device and inode of the video file, along with its size and
+    modification time. An entry is only used if the size and modification time still match, any change to the file
+    invalidates it.
+
+    The database is opened in WAL mode so several processes can read and write it concurrently. It is compacted when
+    it grows over :attr:`max_entries`, the least recently seen entries are dropped first.
+
+    Until :meth:`configure` is called, the index is disabled and :meth:`compute_hashes` always computes the hashes.
+
+    """
+    def __init__(self):
+        #: Path to the database file
+        self.filename = None
+
+        #: Maximum number of entries before compaction
+        self.max_entries = None
+
+        #: Connection to the database
+        self.connection = None
+
+        #: Lock for the connection
+        self.lock = threading.Lock()
+
+    @property
+    def is_configured(self):
+        """Whether the index is configured"""
+        return self.connection is not None
+
+    def configure(self, filename, max_entries=100000):
+        """Open the database, creating it if necessary.
+
+        :param str filename: path to the database file.
+        :param int max_entries: maximum number of entries before compaction.
+
+        """
+        self.close()
+
+        connection = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS hashes (device INTEGER NOT NULL, inode INTEGER NOT NULL, '
+                           'size INTEGER NOT NULL, mtime REAL NOT NULL, hashes TEXT NOT NULL, '
+                           'last_seen INTEGER NOT NULL, PRIMARY KEY (device, inode))')
+        connection.execute('CREATE INDEX IF NOT EXISTS hashes_last_seen ON hashes (last_seen)')
+
+        self.filename = filename
+        self.max_entries = max_entries
+        self.connection = connection
+
+        # compact if necessary
+        if len(self) > self.max_entries:
+            self.compact()
+
+    def close(self):
+        """Close the database."""
+        if self.connection is None:
+            return
+
+        with self.lock:
+            self.connection.close()
+            self.connection = None
+            self.filename = None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+
+    def get(self, stat):
+        """Get the indexed hashes of a file.
+
+        :param stat: result of :func:`os.stat` on the file.
+        :return: the hashes or `None` if the file is not indexed or has changed.
+        :rtype: dict
+
+        """
+        now = int(time.time())
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, hashes, last_seen FROM hashes '
+                                          'WHERE device = ? AND inode = ?', (stat.st_dev, stat.st_ino)).fetchone()
+            if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime:
+                return None
+
+            # refresh the last seen date, at most once a day to save writes
+            if now - row[3] > 86400:
+                self.connection.execute('UPDATE hashes SET last_seen = ? WHERE device = ? AND inode = ?',
+                                        (now, stat.st_dev, stat.st_ino))
+
+        return json.loads(row[2])
+
+    def set(self, stat, hashes):
+        """Index the hashes of a file, replacing any previous entry.
+
+        :param stat: result of :func:`os.stat` on the file.
+        :param dict hashes: the hashes.
+
+        """
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+                                    (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime, json.dumps(hashes),
+                                     int(time.time())))
+
+    def compact(self):
+        """Drop the least recently seen entries over 90% of :attr:`max_entries` and reclaim the free space."""
+        logger.info('Compacting hash index %r', self.filename)
+        with self.lock:
+            self.connection.execute('DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM hashes '
+                                    'ORDER BY last_seen DESC LIMIT -1 OFFSET ?)', (self.max_entries * 9 // 10,))
+            self.connection.execute('VACUUM')
+
+    def compute_hashes(self, path, stat):
+        """Get the hashes of a video from the index, computing and indexing the missing ones.
+
+        :param str path: path of the video.
+        :param stat: result of :func:`os.stat` on the video.
+        :return: the hashes per name.
+        :rtype: dict
+
+        """
+        # not configured or no inode support
+        if self.connection is None or not stat.st_ino:
+            return compute_hashes(path)
+
+        # compute the hashes that are not indexed yet, remembering those that cannot be computed
+        hashes = self.get(stat)
+        if hashes is None:
+            hashes = dict.fromkeys(video_hashes)
+            hashes.update(compute_hashes(path))
+            self.set(stat, hashes)
+        elif not set(video_hashes).issubset(hashes):
+            missing = [n for n in video_hashes if n not in hashes]
+            hashes.update(dict.fromkeys(missing))
+            hashes.update(compute_hashes(path, missing))
+            self.set(stat, hashes)
+        else:
+            logger.debug('Hashes found in index')
+
+        return {k: v for k, v in hashes.items() if v is not None}
+
+
+#: The default :class:`HashIndex`
+hash_index = HashIndex()
+
+
+class ScanJournal(object):
+    """Journal of a directory scan for incremental rescans.
+
+    It records the modification time, sub-directories and videos of every walked directory. On the next walk,
+    directories whose modification time did not change are not listed again: only their journaled videos and
+    sub-directories are walked, see :func:`~subliminal.core.walk_videos`.
+
+    A video is journaled with :meth:`set_video` once it was processed, along with its size, modification time and the
+    subtitle languages it has. Until then, or if it changed since, it is pending and walked again. Videos that already
+    have all the `languages` are not walked again, so they are not scanned at all.
+
+    Paths are stored as absolute paths.
+
+    :param str filename: path to the database file.
+    :param languages: subtitle languages wanted for the videos.
+    :type languages: set of :class:`~babelfish.language.Language`
+
+    """
+    #: Version of the database schema, older databases are reset
+    version = 1
+
+    def __init__(self, filename, languages=None):
+        #: Path to the database file
+        self.filename = filename
+
+        #: Subtitle languages wanted for the videos
+        self.languages = {str(language) for language in languages or ()}
+
+        #: Path, size and modification time of the walked pending videos, per video name
+        self.pending = {}
+
+        #: Connection to the database
+        self.connection = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] < self.version:
+            self.connection.execute('DROP TABLE IF EXISTS directories')
+            self.connection.execute('DROP TABLE IF EXISTS videos')
+            self.connection.execute('PRAGMA user_version=%d' % self.version)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime REAL NOT NULL, '
+                                'dirnames TEXT NOT NULL, filenames TEXT NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS videos (path TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+                                'mtime REAL NOT NULL, languages TEXT NOT NULL)')
+
+        #: Lock for the connection and :attr:`pending`
+        self.lock = threading.Lock()
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+    def get_directory(self, path):
+        """Get the journaled state of a directory.
+
+        :param str path: path to the directory.
+        :return: the modification time, sub-directory names and video names or `None` if not journaled.
+        :rtype: tuple
+
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT mtime, dirnames, filenames FROM directories WHERE path = ?',
+                                          (os.path.abspath(path),)).fetchone()
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def set_directory(self, path, mtime, dirnames, filenames):
+        """Journal the state of a directory.
+
+        :param str path: path to the directory.
+        :param float mtime: modification time of the directory before it was listed.
+        :param list dirnames: names of the sub-directories to walk.
+        :param list filenames: names of the videos and archives to walk.
+
+        """
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                                    (os.path.abspath(path), mtime, json.dumps(dirnames), json.dumps(filenames)))
+
+    def is_pending(self, path, size, mtime):
+        """Whether a video needs to be processed, remembering its size and modification time for :meth:`set_video`.
+
+        A video is pending unless it was journaled with the same size and modification time and all the
+        :attr:`languages`.
+
+        :param str path: path to the video.
+        :param int size: size of the video.
+        :param float mtime: modification time of the video.
+        :rtype: bool
+
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, languages FROM videos WHERE path = ?',
+                                          (path,)).fetchone()
+            if row is not None and row[0] == size and row[1] == mtime and \
+                    not self.languages - set(json.loads(row[2])):
+                return False
+            self.pending[path] = (path, size, mtime)
+
+        return True
+
+    def track(self, path, name):
+        """Track a pending video under the name of the scanned video, e.g. the video in an archive.
+
+        :param str path: path to the pending video or archive.
+        :param str name: name of the scanned video.
+
+        """
+        with self.lock:
+            if os.path.abspath(path) in self.pending:
+                self.pending[os.path.abspath(name)] = self.pending.pop(os.path.abspath(path))
+
+    def set_video(self, name, languages):
+        """Journal a processed pending video with the subtitle languages it has.
+
+        Videos that were not walked as pending in this scan, e.g. because they errored, are not journaled.
+
+        :param str name: name of the video.
+        :param languages: the subtitle languages of the video.
+        :type languages: set of :class:`~babelfish.language.Language`
+
+        """
+        with self.lock:
+            entry = self.pending.pop(os.path.abspath(name), None)
+            if entry is None:
+                return
+            self.connection.execute('INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?)',
+                                    entry + (json.dumps(sorted(str(language) for language in languages)),))
@@ -68,6 +68,14 @@ class Provider(object):
     #: Required hash, if any
     required_hash = None
 
+    #: Rate limit as ``(rate, burst)``, the number of requests per second and the maximum number of requests at once,
+    #: if any. See :class:`~subliminal.throttle.TokenBucket`
+    rate_limit = None
+
+    #: Maximum number of videos per call to :meth:`list_subtitles_batch` and of subtitles per call to
+    #: :meth:`download_subtitles_batch`
+    batch_size = 1
+
     def __enter__(self):
         self.initialize()
         return self
@@ -147,6 +155,23 @@ class Provider(object):
         """
         raise NotImplementedError
 
+    def list_subtitles_batch(self, videos, languages):
+        """List subtitles for several `videos` with the given `languages`.
+
+        Providers able to search for several videos at once override this method and :attr:`batch_size`, the default
+        is to call :meth:`list_subtitles` for each video.
+
+        :param videos: videos to list subtitles for, at most :attr:`batch_size`.
+        :type videos: list of :class:`~subliminal.video.Video`
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :return: found subtitles of each video, in the same order as `videos`.
+        :rtype: list of list of :class:`~subliminal.subtitle.Subtitle`
+        :raise: :class:`~subliminal.exceptions.ProviderError`
+
+        """
+        return [self.list_subtitles(video, languages) for video in videos]
+
     def download_subtitle(self, subtitle):
         """Download `subtitle`'s :attr:`~subliminal.subtitle.Subtitle.content`.
 
@@ -157,5 +182,28 @@ class Provider(object):
         """
         raise NotImplementedError
 
+    def download_subtitles_batch(self, subtitles):
+        """Download the :attr:`~subliminal.subtitle.Subtitle.content` of several `subtitles`.
+
+        Providers able to download several subtitles at once override this method and :attr:`batch_size`, the default
+        is to call :meth:`download_subtitle` for each subtitle, logging the errors and raising the first one only if
+        no subtitle could be downloaded.
+
+        :param subtitles: subtitles to download, at most :attr:`batch_size`.
+        :type subtitles: list of :class:`~subliminal.subtitle.Subtitle`
+        :raise: :class:`~subliminal.exceptions.ProviderError`
+
+        """
+        errors = []
+        for subtitle in subtitles:
+            try:
+                self.download_subtitle(subtitle)
+            except Exception as error:
+                logger.exception('Error downloading subtitle %r', subtitle)
+                errors.append(error)
+
+        if errors and len(errors) == len(subtitles):
+            raise errors[0]
+
     def __repr__(self):
         return '<%s [%r]>' % (self.__class__.__name__, self.video_types)
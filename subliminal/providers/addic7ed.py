@@ -4,13 +4,13 @@ import re
 
 from babelfish import Language, language_converters
 from guessit import guessit
-from requests import Session
 
 from . import ParserBeautifulSoup, Provider
 from .. import __short_version__
 from ..cache import SHOW_EXPIRATION_TIME, region
 from ..exceptions import AuthenticationError, ConfigurationError, DownloadLimitExceeded, TooManyRequests
 from ..score import get_equivalent_release_groups
+from ..session import session_factory, session_store
 from ..subtitle import Subtitle, fix_line_ending, guess_matches
 from ..utils import sanitize, sanitize_release_group
 from ..video import Episode
@@ -87,6 +87,12 @@ class Addic7edProvider(Provider):
     video_types = (Episode,)
     server_url = 'http://www.addic7ed.com/'
 
+    # keep the login of a stored session for a day
+    session_lifetime = 86400
+
+    # the website replies with 304 when scraped too fast
+    rate_limit = (1, 3)
+
     def __init__(self, username=None, password=None):
         if username is not None and password is None or username is None and password is not None:
             raise ConfigurationError('Username and password must be specified')
@@ -94,26 +100,31 @@ class Addic7edProvider(Provider):
         self.username = username
         self.password = password
         self.logged_in = False
+        self.session_restored = False
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
         # login
         if self.username is not None and self.password is not None:
-            logger.info('Logging in')
-            data = {'username': self.username, 'password': self.password, 'Submit': 'Log in'}
-            r = self.session.post(self.server_url + 'dologin.php', data, allow_redirects=False, timeout=10)
-
-            if r.status_code != 302:
-                raise AuthenticationError(self.username)
+            # restore the stored session
+            if session_store.restore_cookies('addic7ed', self.username, self.session):
+                logger.debug('Restored session')
+                self.logged_in = True
+                self.session_restored = True
+                return
 
-            logger.debug('Logged in')
-            self.logged_in = True
+            self.log_in()
 
     def terminate(self):
-        # logout
-        if self.logged_in:
+        # keep the session for the next run, until it expires, or logout
+        if self.logged_in and session_store.is_configured:
+            lifetime = None if self.session_restored else self.session_lifetime
+            session_store.save_cookies('addic7ed', self.username, self.session, lifetime)
+            self.logged_in = False
+            self.session_restored = False
+        elif self.logged_in:
             logger.info('Logging out')
             r = self.session.get(self.server_url + 'logout.php', timeout=10)
             r.raise_for_status()
@@ -122,6 +133,25 @@ class Addic7edProvider(Provider):
 
         self.session.close()
 
+    def log_in(self):
+        logger.info('Logging in')
+        data = {'username': self.username, 'password': self.password, 'Submit': 'Log in'}
+        r = self.session.post(self.server_url + 'dologin.php', data, allow_redirects=False, timeout=10)
+
+        if r.status_code != 302:
+            raise AuthenticationError(self.username)
+
+        logger.debug('Logged in')
+        self.logged_in = True
+        self.session_restored = False
+
+    def renew_session(self):
+        """Log in again after the website logged out a restored session, deleting it from the store."""
+        logger.info('Session expired')
+        session_store.delete('addic7ed', self.username)
+        self.session.cookies.clear()
+        self.log_in()
+
     @region.cache_on_arguments(expiration_time=SHOW_EXPIRATION_TIME)
     def _get_show_ids(self):
         """Get the ``dict`` of show ids per series by querying the `shows.php` page.
@@ -280,6 +310,13 @@ class Addic7edProvider(Provider):
                              timeout=10)
         r.raise_for_status()
 
+        # a restored session logged out by the website gets the anonymous download limit
+        if r.headers['Content-Type'] == 'text/html' and self.session_restored:
+            self.renew_session()
+            r = self.session.get(self.server_url + subtitle.download_link, headers={'Referer': subtitle.page_link},
+                                 timeout=10)
+            r.raise_for_status()
+
         # detect download limit exceeded
         if r.headers['Content-Type'] == 'text/html':
             raise DownloadLimitExceeded
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from copy import copy
 import io
 import json
 import logging
@@ -12,13 +13,13 @@ from guessit import guessit
 import pytz
 import rarfile
 from rarfile import RarFile, is_rarfile
-from requests import Session
 from zipfile import ZipFile, is_zipfile
 
 from . import ParserBeautifulSoup, Provider
 from .. import __short_version__
 from ..cache import SHOW_EXPIRATION_TIME, region
 from ..exceptions import AuthenticationError, ConfigurationError, ProviderError
+from ..session import session_factory, session_store
 from ..subtitle import SUBTITLE_EXTENSIONS, Subtitle, fix_line_ending, guess_matches, sanitize
 from ..video import Episode, Movie
 
@@ -162,6 +163,9 @@ class LegendasTVProvider(Provider):
     languages = {Language.fromlegendastv(l) for l in language_converters['legendastv'].codes}
     server_url = 'http://legendas.tv/'
 
+    # keep the login of a stored session for a day
+    session_lifetime = 86400
+
     def __init__(self, username=None, password=None):
         if username and not password or not username and password:
             raise ConfigurationError('Username and password must be specified')
@@ -169,28 +173,31 @@ class LegendasTVProvider(Provider):
         self.username = username
         self.password = password
         self.logged_in = False
+        self.session_restored = False
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
         # login
         if self.username is not None and self.password is not None:
-            logger.info('Logging in')
-            data = {'_method': 'POST', 'data[User][username]': self.username, 'data[User][password]': self.password}
-            r = self.session.post(self.server_url + 'login', data, allow_redirects=False, timeout=10)
-            r.raise_for_status()
+            # restore the stored session
+            if session_store.restore_cookies('legendastv', self.username, self.session):
+                logger.debug('Restored session')
+                self.logged_in = True
+                self.session_restored = True
+                return
 
-            soup = ParserBeautifulSoup(r.content, ['html.parser'])
-            if soup.find('div', {'class': 'alert-error'}, string=re.compile(u'Usuário ou senha inválidos')):
-                raise AuthenticationError(self.username)
-
-            logger.debug('Logged in')
-            self.logged_in = True
+            self.log_in()
 
     def terminate(self):
-        # logout
-        if self.logged_in:
+        # keep the session for the next run, until it expires, or logout
+        if self.logged_in and session_store.is_configured:
+            lifetime = None if self.session_restored else self.session_lifetime
+            session_store.save_cookies('legendastv', self.username, self.session, lifetime)
+            self.logged_in = False
+            self.session_restored = False
+        elif self.logged_in:
             logger.info('Logging out')
             r = self.session.get(self.server_url + 'users/logout', allow_redirects=False, timeout=10)
             r.raise_for_status()
@@ -199,6 +206,27 @@ class LegendasTVProvider(Provider):
 
         self.session.close()
 
+    def log_in(self):
+        logger.info('Logging in')
+        data = {'_method': 'POST', 'data[User][username]': self.username, 'data[User][password]': self.password}
+        r = self.session.post(self.server_url + 'login', data, allow_redirects=False, timeout=10)
+        r.raise_for_status()
+
+        soup = ParserBeautifulSoup(r.content, ['html.parser'])
+        if soup.find('div', {'class': 'alert-error'}, string=re.compile(u'Usuário ou senha inválidos')):
+            raise AuthenticationError(self.username)
+
+        logger.debug('Logged in')
+        self.logged_in = True
+        self.session_restored = False
+
+    def renew_session(self):
+        """Log in again after the website logged out a restored session, deleting it from the store."""
+        logger.info('Session expired')
+        session_store.delete('legendastv', self.username)
+        self.session.cookies.clear()
+        self.log_in()
+
     @region.cache_on_arguments(expiration_time=SHOW_EXPIRATION_TIME)
     def search_titles(self, title):
         """Search for titles matching the `title`.
@@ -323,9 +351,16 @@ class LegendasTVProvider(Provider):
         logger.info('Downloading archive %s', archive.id)
         r = self.session.get(self.server_url + 'downloadarquivo/{}'.format(archive.id))
         r.raise_for_status()
+        archive_stream = io.BytesIO(r.content)
+
+        # a restored session logged out by the website is redirected to the login page
+        if self.session_restored and not is_rarfile(archive_stream) and not is_zipfile(archive_stream):
+            self.renew_session()
+            r = self.session.get(self.server_url + 'downloadarquivo/{}'.format(archive.id))
+            r.raise_for_status()
+            archive_stream = io.BytesIO(r.content)
 
         # open the archive
-        archive_stream = io.BytesIO(r.content)
         if is_rarfile(archive_stream):
             logger.debug('Identified rar archive')
             archive.content = RarFile(archive_stream)
@@ -336,8 +371,8 @@ class LegendasTVProvider(Provider):
             raise ValueError('Not a valid archive')
 
     def query(self, language, title, season=None, episode=None, year=None):
-        # search for titles
-        titles = self.search_titles(sanitize(title))
+        # search for titles, copied as they are updated below
+        titles = dict(self.search_titles(sanitize(title)))
 
         # search for titles with the quote or dot character
         ignore_characters = {'\'', '.'}
@@ -371,7 +406,8 @@ class LegendasTVProvider(Provider):
                     continue
 
             # iterate over title's archives
-            for a in self.get_archives(title_id, language.legendastv):
+            # copy the cached archives as their content is set on download
+            for a in [copy(a) for a in self.get_archives(title_id, language.legendastv)]:
                 # clean name of path separators and pack flags
                 clean_name = a.name.replace('/', '-')
                 if a.pack and clean_name.startswith('(p)'):
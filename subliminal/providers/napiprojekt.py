@@ -2,10 +2,10 @@
 import logging
 
 from babelfish import Language
-from requests import Session
 
 from . import Provider
 from .. import __short_version__
+from ..session import session_factory
 from ..subtitle import Subtitle
 
 logger = logging.getLogger(__name__)
@@ -64,7 +64,7 @@ class NapiProjektProvider(Provider):
     server_url = 'http://napiprojekt.pl/unit_napisy/dl.php'
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
     def terminate(self):
@@ -12,6 +12,7 @@ from six.moves.xmlrpc_client import ServerProxy
 from . import Provider, TimeoutSafeTransport
 from .. import __short_version__
 from ..exceptions import AuthenticationError, ConfigurationError, DownloadLimitExceeded, ProviderError
+from ..session import session_store
 from ..subtitle import Subtitle, fix_line_ending, guess_matches
 from ..utils import sanitize
 from ..video import Episode, Movie
@@ -123,6 +124,16 @@ class OpenSubtitlesProvider(Provider):
     """
     languages = {Language.fromopensubtitles(l) for l in language_converters['opensubtitles'].codes}
 
+    # just under the limit of 40 requests per 10 seconds
+    rate_limit = (3.5, 5)
+
+    # the server drops a session after 15 minutes of inactivity
+    session_lifetime = 10 * 60
+
+    # number of hashes searched or subtitles downloaded at once, the server returns at most 500 subtitles per search
+    # and 20 subtitles per download
+    batch_size = 20
+
     def __init__(self, username=None, password=None):
         self.server = ServerProxy('https://api.opensubtitles.org/xml-rpc', TimeoutSafeTransport(10))
         if username and not password or not username and password:
@@ -133,25 +144,63 @@ class OpenSubtitlesProvider(Provider):
         self.token = None
 
     def initialize(self):
+        # restore the stored session
+        session = session_store.get('opensubtitles', self.username)
+        if session is not None:
+            self.token = session['token']
+            logger.debug('Restored session with token %r', self.token)
+            return
+
+        self.log_in()
+
+    def terminate(self):
+        # keep the session for the next run
+        if session_store.is_configured:
+            session_store.set('opensubtitles', self.username, {'token': self.token}, self.session_lifetime)
+        else:
+            logger.info('Logging out')
+            checked(self.server.LogOut(self.token))
+            logger.debug('Logged out')
+
+        self.server.close()
+        self.token = None
+
+    def log_in(self):
         logger.info('Logging in')
         response = checked(self.server.LogIn(self.username, self.password, 'eng',
                                              'subliminal v%s' % __short_version__))
         self.token = response['token']
         logger.debug('Logged in with token %r', self.token)
+        session_store.set('opensubtitles', self.username, {'token': self.token}, self.session_lifetime)
 
-    def terminate(self):
-        logger.info('Logging out')
-        checked(self.server.LogOut(self.token))
-        self.server.close()
-        self.token = None
-        logger.debug('Logged out')
+    def call(self, method, *args):
+        """Call a method of the server with the token, logging in again if a stored session expired.
+
+        :param str method: name of the method.
+        :param \*args: arguments of the method, after the token.
+        :return: the checked response.
+        :rtype: dict
+
+        """
+        try:
+            return checked(getattr(self.server, method)(self.token, *args))
+        except (NoSession, Unauthorized):
+            if not session_store.is_configured:
+                raise
+
+        logger.info('Session expired')
+        session_store.delete('opensubtitles', self.username)
+        self.log_in()
+
+        return checked(getattr(self.server, method)(self.token, *args))
 
     def no_operation(self):
         logger.debug('No operation')
-        checked(self.server.NoOperation(self.token))
+        self.call('NoOperation')
 
-    def query(self, languages, hash=None, size=None, imdb_id=None, query=None, season=None, episode=None, tag=None):
-        # fill the search criteria
+    @staticmethod
+    def _get_criteria(languages, hash=None, size=None, imdb_id=None, query=None, season=None, episode=None, tag=None):
+        """Build the search criteria of :meth:`query`."""
         criteria = []
         if hash and size:
             criteria.append({'moviehash': hash, 'moviebytesize': str(size)})
@@ -163,16 +212,37 @@ class OpenSubtitlesProvider(Provider):
             criteria.append({'query': query.replace('\'', ''), 'season': season, 'episode': episode})
         elif query:
             criteria.append({'query': query.replace('\'', '')})
-        if not criteria:
-            raise ValueError('Not enough information')
 
         # add the language
         for criterion in criteria:
             criterion['sublanguageid'] = ','.join(sorted(l.opensubtitles for l in languages))
 
+        return criteria
+
+    @staticmethod
+    def _get_query_params(video):
+        """Get the parameters of :meth:`query` for a `video`."""
+        season = episode = None
+        if isinstance(video, Episode):
+            query = video.series
+            season = video.season
+            episode = video.episode
+        else:
+            query = video.title
+
+        return {'hash': video.hashes.get('opensubtitles'), 'size': video.size, 'imdb_id': video.imdb_id,
+                'query': query, 'season': season, 'episode': episode, 'tag': os.path.basename(video.name)}
+
+    def query(self, languages, hash=None, size=None, imdb_id=None, query=None, season=None, episode=None, tag=None):
+        # fill the search criteria
+        criteria = self._get_criteria(languages, hash=hash, size=size, imdb_id=imdb_id, query=query, season=season,
+                                      episode=episode, tag=tag)
+        if not criteria:
+            raise ValueError('Not enough information')
+
         # query the server
         logger.info('Searching subtitles %r', criteria)
-        response = checked(self.server.SearchSubtitles(self.token, criteria))
+        response = self.call('SearchSubtitles', criteria)
         subtitles = []
 
         # exit if no data
@@ -182,47 +252,122 @@ class OpenSubtitlesProvider(Provider):
 
         # loop over subtitle items
         for subtitle_item in response['data']:
-            # read the item
-            language = Language.fromopensubtitles(subtitle_item['SubLanguageID'])
-            hearing_impaired = bool(int(subtitle_item['SubHearingImpaired']))
-            page_link = subtitle_item['SubtitlesLink']
-            subtitle_id = int(subtitle_item['IDSubtitleFile'])
-            matched_by = subtitle_item['MatchedBy']
-            movie_kind = subtitle_item['MovieKind']
-            hash = subtitle_item['MovieHash']
-            movie_name = subtitle_item['MovieName']
-            movie_release_name = subtitle_item['MovieReleaseName']
-            movie_year = int(subtitle_item['MovieYear']) if subtitle_item['MovieYear'] else None
-            movie_imdb_id = 'tt' + subtitle_item['IDMovieImdb']
-            series_season = int(subtitle_item['SeriesSeason']) if subtitle_item['SeriesSeason'] else None
-            series_episode = int(subtitle_item['SeriesEpisode']) if subtitle_item['SeriesEpisode'] else None
-            filename = subtitle_item['SubFileName']
-            encoding = subtitle_item.get('SubEncoding') or None
-
-            subtitle = OpenSubtitlesSubtitle(language, hearing_impaired, page_link, subtitle_id, matched_by, movie_kind,
-                                             hash, movie_name, movie_release_name, movie_year, movie_imdb_id,
-                                             series_season, series_episode, filename, encoding)
-            logger.debug('Found subtitle %r by %s', subtitle, matched_by)
+            subtitle = self._parse_subtitle(subtitle_item)
+            logger.debug('Found subtitle %r by %s', subtitle, subtitle.matched_by)
             subtitles.append(subtitle)
 
         return subtitles
 
+    def query_hashes(self, languages, hashes):
+        """Search subtitles of several videos by hash, :attr:`batch_size` hashes per search.
+
+        :param languages: languages to search for.
+        :type languages: set of :class:`~babelfish.language.Language`
+        :param list hashes: hash and size of each video.
+        :return: found subtitles per hash.
+        :rtype: dict
+
+        """
+        subtitles = {}
+        for i in range(0, len(hashes), self.batch_size):
+            criteria = [{'moviehash': hash, 'moviebytesize': str(size),
+                         'sublanguageid': ','.join(sorted(l.opensubtitles for l in languages))}
+                        for hash, size in hashes[i:i + self.batch_size]]
+
+            # query the server
+            logger.info('Searching subtitles of %d hashes', len(criteria))
+            response = self.call('SearchSubtitles', criteria)
+
+            # map the subtitles back to the hashes
+            for subtitle_item in response['data'] or []:
+                subtitle = self._parse_subtitle(subtitle_item)
+                logger.debug('Found subtitle %r by %s', subtitle, subtitle.matched_by)
+                subtitles.setdefault(subtitle.hash, []).append(subtitle)
+
+        return subtitles
+
+    def _parse_subtitle(self, subtitle_item):
+        """Parse a subtitle item of a `SearchSubtitles` response."""
+        # read the item
+        language = Language.fromopensubtitles(subtitle_item['SubLanguageID'])
+        hearing_impaired = bool(int(subtitle_item['SubHearingImpaired']))
+        page_link = subtitle_item['SubtitlesLink']
+        subtitle_id = int(subtitle_item['IDSubtitleFile'])
+        matched_by = subtitle_item['MatchedBy']
+        movie_kind = subtitle_item['MovieKind']
+        hash = subtitle_item['MovieHash']
+        movie_name = subtitle_item['MovieName']
+        movie_release_name = subtitle_item['MovieReleaseName']
+        movie_year = int(subtitle_item['MovieYear']) if subtitle_item['MovieYear'] else None
+        movie_imdb_id = 'tt' + subtitle_item['IDMovieImdb']
+        series_season = int(subtitle_item['SeriesSeason']) if subtitle_item['SeriesSeason'] else None
+        series_episode = int(subtitle_item['SeriesEpisode']) if subtitle_item['SeriesEpisode'] else None
+        filename = subtitle_item['SubFileName']
+        encoding = subtitle_item.get('SubEncoding') or None
+
+        return OpenSubtitlesSubtitle(language, hearing_impaired, page_link, subtitle_id, matched_by, movie_kind,
+                                     hash, movie_name, movie_release_name, movie_year, movie_imdb_id,
+                                     series_season, series_episode, filename, encoding)
+
     def list_subtitles(self, video, languages):
-        season = episode = None
-        if isinstance(video, Episode):
-            query = video.series
-            season = video.season
-            episode = video.episode
-        else:
-            query = video.title
+        return self.query(languages, **self._get_query_params(video))
+
+    def list_subtitles_batch(self, videos, languages):
+        # search as usual when a batch does not save searches
+        if len(videos) < 2:
+            return super(OpenSubtitlesProvider, self).list_subtitles_batch(videos, languages)
+
+        # search by hash first
+        hashed_videos = [v for v in videos if 'opensubtitles' in v.hashes and v.size]
+        subtitles = {}
+        if hashed_videos:
+            subtitles = self.query_hashes(languages, [(v.hashes['opensubtitles'], v.size) for v in hashed_videos])
+        results = [list(subtitles.get(v.hashes.get('opensubtitles'), [])) for v in videos]
+
+        # fall back on a full search for the languages without subtitles found by hash, with the other criteria of
+        # all the videos in a single search
+        criteria = []
+        criteria_indexes = []
+        for i, video in enumerate(videos):
+            missing_languages = languages - {s.language for s in results[i]}
+            if not missing_languages:
+                continue
+
+            params = dict(self._get_query_params(video), hash=None)
+            video_criteria = self._get_criteria(missing_languages, **params)
+            criteria.extend(video_criteria)
+            criteria_indexes.extend([i] * len(video_criteria))
+        if not criteria:
+            return results
+
+        # query the server
+        logger.info('Searching subtitles of %d videos with %d criteria', len(set(criteria_indexes)), len(criteria))
+        response = self.call('SearchSubtitles', criteria)
 
-        return self.query(languages, hash=video.hashes.get('opensubtitles'), size=video.size, imdb_id=video.imdb_id,
-                          query=query, season=season, episode=episode, tag=os.path.basename(video.name))
+        # map the subtitles back to the videos by the index of the criterion they matched
+        for subtitle_item in response['data'] or []:
+            subtitle = self._parse_subtitle(subtitle_item)
+            logger.debug('Found subtitle %r by %s', subtitle, subtitle.matched_by)
+            results[criteria_indexes[int(subtitle_item['QueryNumber'])]].append(subtitle)
+
+        return results
 
     def download_subtitle(self, subtitle):
         logger.info('Downloading subtitle %r', subtitle)
-        response = checked(self.server.DownloadSubtitles(self.token, [str(subtitle.subtitle_id)]))
-        subtitle.content = fix_line_ending(zlib.decompress(base64.b64decode(response['data'][0]['data']), 47))
+        response = self.call('DownloadSubtitles', [str(subtitle.subtitle_id)])
+        subtitle.content = decode(response['data'][0]['data'])
+
+    def download_subtitles_batch(self, subtitles):
+        logger.info('Downloading %d subtitles', len(subtitles))
+        response = self.call('DownloadSubtitles', [str(s.subtitle_id) for s in subtitles])
+
+        # map the contents back to the subtitles
+        contents = {int(item['idsubtitlefile']): item['data'] for item in response['data'] or []}
+        for subtitle in subtitles:
+            if subtitle.subtitle_id not in contents:
+                logger.error('Subtitle %r not downloaded', subtitle)
+                continue
+            subtitle.content = decode(contents[subtitle.subtitle_id])
 
 
 class OpenSubtitlesError(ProviderError):
@@ -265,6 +410,17 @@ class ServiceUnavailable(OpenSubtitlesError):
     pass
 
 
+def decode(data):
+    """Decode the content of a subtitle from a `DownloadSubtitles` response.
+
+    :param str data: the base64 encoded and gzipped content.
+    :return: the content.
+    :rtype: bytes
+
+    """
+    return fix_line_ending(zlib.decompress(base64.b64decode(data), 47))
+
+
 def checked(response):
     """Check a response status before returning it.
 
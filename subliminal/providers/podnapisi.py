@@ -12,12 +12,12 @@ except ImportError:
         import xml.etree.cElementTree as etree
     except ImportError:
         import xml.etree.ElementTree as etree
-from requests import Session
 from zipfile import ZipFile
 
 from . import Provider
 from .. import __short_version__
 from ..exceptions import ProviderError
+from ..session import session_factory
 from ..subtitle import Subtitle, fix_line_ending, guess_matches
 from ..utils import sanitize
 from ..video import Episode, Movie
@@ -85,7 +85,7 @@ class PodnapisiProvider(Provider):
     server_url = 'http://podnapisi.net/subtitles/'
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
     def terminate(self):
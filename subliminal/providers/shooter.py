@@ -4,10 +4,10 @@ import logging
 import os
 
 from babelfish import Language, language_converters
-from requests import Session
 
 from . import Provider
 from .. import __short_version__
+from ..session import session_factory
 from ..subtitle import Subtitle, fix_line_ending
 
 logger = logging.getLogger(__name__)
@@ -44,7 +44,7 @@ class ShooterProvider(Provider):
     server_url = 'https://www.shooter.cn/api/subapi.php'
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
     def terminate(self):
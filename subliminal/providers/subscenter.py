@@ -8,12 +8,12 @@ import zipfile
 
 from babelfish import Language
 from guessit import guessit
-from requests import Session
 
 from . import ParserBeautifulSoup, Provider
 from .. import __short_version__
 from ..cache import SHOW_EXPIRATION_TIME, region
 from ..exceptions import AuthenticationError, ConfigurationError, ProviderError
+from ..session import session_factory, session_store
 from ..subtitle import Subtitle, fix_line_ending, guess_matches
 from ..utils import sanitize
 from ..video import Episode, Movie
@@ -76,6 +76,9 @@ class SubsCenterProvider(Provider):
     languages = {Language.fromalpha2(l) for l in ['he']}
     server_url = 'http://www.subscenter.co/he/'
 
+    # keep the login of a stored session for a day
+    session_lifetime = 86400
+
     def __init__(self, username=None, password=None):
         if username is not None and password is None or username is None and password is not None:
             raise ConfigurationError('Username and password must be specified')
@@ -84,33 +87,31 @@ class SubsCenterProvider(Provider):
         self.username = username
         self.password = password
         self.logged_in = False
+        self.session_restored = False
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/{}'.format(__short_version__)
 
         # login
         if self.username is not None and self.password is not None:
-            logger.debug('Logging in')
-            url = self.server_url + 'subscenter/accounts/login/'
-
-            # retrieve CSRF token
-            self.session.get(url)
-            csrf_token = self.session.cookies['csrftoken']
-
-            # actual login
-            data = {'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': csrf_token}
-            r = self.session.post(url, data, allow_redirects=False, timeout=10)
-
-            if r.status_code != 302:
-                raise AuthenticationError(self.username)
+            # restore the stored session
+            if session_store.restore_cookies('subscenter', self.username, self.session):
+                logger.debug('Restored session')
+                self.logged_in = True
+                self.session_restored = True
+                return
 
-            logger.info('Logged in')
-            self.logged_in = True
+            self.log_in()
 
     def terminate(self):
-        # logout
-        if self.logged_in:
+        # keep the session for the next run, until it expires, or logout
+        if self.logged_in and session_store.is_configured:
+            lifetime = None if self.session_restored else self.session_lifetime
+            session_store.save_cookies('subscenter', self.username, self.session, lifetime)
+            self.logged_in = False
+            self.session_restored = False
+        elif self.logged_in:
             logger.info('Logging out')
             r = self.session.get(self.server_url + 'subscenter/accounts/logout/', timeout=10)
             r.raise_for_status()
@@ -119,6 +120,32 @@ class SubsCenterProvider(Provider):
 
         self.session.close()
 
+    def log_in(self):
+        logger.debug('Logging in')
+        url = self.server_url + 'subscenter/accounts/login/'
+
+        # retrieve CSRF token
+        self.session.get(url)
+        csrf_token = self.session.cookies['csrftoken']
+
+        # actual login
+        data = {'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': csrf_token}
+        r = self.session.post(url, data, allow_redirects=False, timeout=10)
+
+        if r.status_code != 302:
+            raise AuthenticationError(self.username)
+
+        logger.info('Logged in')
+        self.logged_in = True
+        self.session_restored = False
+
+    def renew_session(self):
+        """Log in again after the website logged out a restored session, deleting it from the store."""
+        logger.info('Session expired')
+        session_store.delete('subscenter', self.username)
+        self.session.cookies.clear()
+        self.log_in()
+
     @region.cache_on_arguments(expiration_time=SHOW_EXPIRATION_TIME)
     def _search_url_titles(self, title):
         """Search the URL titles by kind for the given `title`.
@@ -225,6 +252,12 @@ class SubsCenterProvider(Provider):
         r = self.session.get(url, params=params, headers={'Referer': subtitle.page_link}, timeout=10)
         r.raise_for_status()
 
+        # a restored session logged out by the website gets a page instead of the zip
+        if not zipfile.is_zipfile(io.BytesIO(r.content)) and self.session_restored:
+            self.renew_session()
+            r = self.session.get(url, params=params, headers={'Referer': subtitle.page_link}, timeout=10)
+            r.raise_for_status()
+
         # open the zip
         with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
             # remove some filenames from the namelist
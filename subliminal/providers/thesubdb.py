@@ -2,10 +2,10 @@
 import logging
 
 from babelfish import Language, language_converters
-from requests import Session
 
 from . import Provider
 from .. import __short_version__
+from ..session import session_factory
 from ..subtitle import Subtitle, fix_line_ending
 
 logger = logging.getLogger(__name__)
@@ -42,7 +42,7 @@ class TheSubDBProvider(Provider):
     server_url = 'http://api.thesubdb.com/'
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = ('SubDB/1.0 (subliminal/%s; https://github.com/Diaoul/subliminal)' %
                                               __short_version__)
 
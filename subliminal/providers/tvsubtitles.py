@@ -6,13 +6,13 @@ from zipfile import ZipFile
 
 from babelfish import Language, language_converters
 from guessit import guessit
-from requests import Session
 
 from . import ParserBeautifulSoup, Provider
 from .. import __short_version__
 from ..cache import EPISODE_EXPIRATION_TIME, SHOW_EXPIRATION_TIME, region
 from ..exceptions import ProviderError
 from ..score import get_equivalent_release_groups
+from ..session import session_factory
 from ..subtitle import Subtitle, fix_line_ending, guess_matches
 from ..utils import sanitize, sanitize_release_group
 from ..video import Episode
@@ -82,7 +82,7 @@ class TVsubtitlesProvider(Provider):
     server_url = 'http://www.tvsubtitles.net/'
 
     def initialize(self):
-        self.session = Session()
+        self.session = session_factory.create()
         self.session.headers['User-Agent'] = 'Subliminal/%s' % __short_version__
 
     def terminate(self):
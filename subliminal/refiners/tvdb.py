@@ -4,10 +4,9 @@ from functools import wraps
 import logging
 import re
 
-import requests
-
 from .. import __short_version__
-from ..cache import REFINER_EXPIRATION_TIME, region
+from ..cache import REFINER_EXPIRATION_TIME, REFINER_NEGATIVE_EXPIRATION_TIME, region
+from ..session import session_factory
 from ..utils import sanitize
 from ..video import Episode
 
@@ -65,7 +64,7 @@ class TVDBClient(object):
         self.token_date = datetime.utcnow() - self.token_lifespan
 
         #: Session for the requests
-        self.session = session or requests.Session()
+        self.session = session or session_factory.create()
         self.session.timeout = timeout
         self.session.headers.update(headers or {})
         self.session.headers['Content-Type'] = 'application/json'
@@ -194,7 +193,8 @@ class TVDBClient(object):
 tvdb_client = TVDBClient('5EC930FB90DA1ADA', headers={'User-Agent': 'Subliminal/%s' % __short_version__})
 
 
-@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME)
+@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME,
+                           negative_expiration_time=REFINER_NEGATIVE_EXPIRATION_TIME, stale_while_revalidate=True)
 def search_series(name):
     """Search series.
 
@@ -206,7 +206,8 @@ def search_series(name):
     return tvdb_client.search_series(name)
 
 
-@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME)
+@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME,
+                           negative_expiration_time=REFINER_NEGATIVE_EXPIRATION_TIME, stale_while_revalidate=True)
 def get_series(id):
     """Get series.
 
@@ -218,7 +219,8 @@ def get_series(id):
     return tvdb_client.get_series(id)
 
 
-@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME)
+@region.cache_on_arguments(expiration_time=REFINER_EXPIRATION_TIME,
+                           negative_expiration_time=REFINER_NEGATIVE_EXPIRATION_TIME, stale_while_revalidate=True)
 def get_series_episode(series_id, season, episode):
     """Get an episode of a series.
 
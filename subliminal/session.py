@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from requests import Session
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from requests.utils import add_dict_to_cookiejar, dict_from_cookiejar
+
+logger = logging.getLogger(__name__)
+
+
+class SharedAdapter(BaseAdapter):
+    """Transport adapter delegating to the :attr:`~SessionFactory.adapter` of a :class:`SessionFactory`.
+
+    Sessions mount it instead of the adapter itself so they keep using the current adapter when the factory is
+    reconfigured, and closing a session does not close the connections of the other sessions.
+
+    :param factory: the session factory.
+    :type factory: :class:`SessionFactory`
+
+    """
+    def __init__(self, factory):
+        super(SharedAdapter, self).__init__()
+
+        #: The session factory
+        self.factory = factory
+
+    def send(self, request, **kwargs):
+        return self.factory.adapter.send(request, **kwargs)
+
+    def close(self):
+        pass
+
+
+class SessionFactory(object):
+    """Factory of :class:`~requests.Session` sharing a single pool of connections.
+
+    All the sessions created by the factory send their requests through the same
+    :class:`~requests.adapters.HTTPAdapter`, so connections to a host are kept alive and reused by all the providers
+    and refiners instead of each session opening its own.
+
+    Until :meth:`configure` is called, the adapter uses the default settings. The pools should be sized for the
+    number of threads making requests, as the command line does from its number of workers.
+
+    """
+    #: Default headers of the sessions
+    headers = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'}
+
+    def __init__(self):
+        #: Shared adapter
+        self.adapter = None
+
+        #: Lock for the adapter
+        self.lock = threading.Lock()
+
+        self.configure()
+
+    def configure(self, pool_connections=20, pool_maxsize=10, pool_block=False, max_retries=2, backoff_factor=0.3,
+                  status_forcelist=(500, 502, 503, 504)):
+        """Configure the shared adapter, replacing the current one.
+
+        :param int pool_connections: number of hosts to keep a pool of connections for, above the number of hosts
+            of the providers and refiners.
+        :param int pool_maxsize: maximum number of connections kept alive per host.
+        :param bool pool_block: wait for a free connection when all the connections to a host are in use instead of
+            opening a new one that will not be kept alive.
+        :param int max_retries: maximum number of retries on connection errors and on `status_forcelist`.
+        :param float backoff_factor: backoff factor between retries, see :class:`~urllib3.util.retry.Retry`.
+        :param tuple status_forcelist: HTTP status codes to retry on.
+
+        """
+        retry = Retry(total=max_retries, read=False, backoff_factor=backoff_factor, status_forcelist=status_forcelist,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+                              max_retries=retry)
+
+        with self.lock:
+            previous_adapter, self.adapter = self.adapter, adapter
+        if previous_adapter is not None:
+            previous_adapter.close()
+
+    def create(self, headers=None):
+        """Create a session using the shared adapter.
+
+        :param dict headers: additional headers of the session.
+        :return: the session.
+        :rtype: :class:`~requests.Session`
+
+        """
+        session = Session()
+        session.headers.update(self.headers)
+        session.headers.update(headers or {})
+        adapter = SharedAdapter(self)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def close(self):
+        """Close the connections of the shared adapter."""
+        with self.lock:
+            self.adapter.close()
+
+
+#: The default :class:`SessionFactory`
+session_factory = SessionFactory()
+
+
+class SessionStore(object):
+    """Persistent store of provider sessions.
+
+    Providers that log in store their authentication token or cookies per username with an expiration time, so the
+    next run reuses the session instead of logging in again and logging out on exit.
+
+    The store is opt-in: until :meth:`configure` is called, :meth:`get` finds nothing and :meth:`set` does nothing so
+    providers log in and out as usual.
+
+    """
+    def __init__(self):
+        #: Path to the database file
+        self.filename = None
+
+        #: Connection to the database
+        self.connection = None
+
+        #: Lock for the connection
+        self.lock = threading.Lock()
+
+    @property
+    def is_configured(self):
+        """Whether the store is configured"""
+        return self.connection is not None
+
+    def configure(self, filename):
+        """Open the database, creating it if necessary, readable by the current user only.
+
+        The write-ahead log and shared memory files hold sessions too and are restricted in the same way.
+
+        :param str filename: path to the database file.
+
+        """
+        self.close()
+
+        os.close(os.open(filename, os.O_CREAT | os.O_WRONLY, 0o600))
+        connection = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS sessions (provider TEXT NOT NULL, username TEXT NOT NULL, '
+                           'data TEXT NOT NULL, expires REAL NOT NULL, PRIMARY KEY (provider, username))')
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(filename + suffix):
+                os.chmod(filename + suffix, 0o600)
+
+        self.filename = filename
+        self.connection = connection
+
+    def close(self):
+        """Close the database."""
+        if self.connection is None:
+            return
+
+        with self.lock:
+            self.connection.close()
+            self.connection = None
+            self.filename = None
+
+    def get(self, provider, username):
+        """Get a stored session.
+
+        :param str provider: name of the provider.
+        :param str username: username of the session.
+        :return: the session data or `None` if not stored or expired.
+        :rtype: dict
+
+        """
+        if self.connection is None:
+            return None
+
+        with self.lock:
+            row = self.connection.execute('SELECT data FROM sessions WHERE provider = ? AND username = ? AND '
+                                          'expires > ?', (provider, username or '', time.time())).fetchone()
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def set(self, provider, username, data, lifetime):
+        """Store a session, replacing any previous one.
+
+        :param str provider: name of the provider.
+        :param str username: username of the session.
+        :param dict data: the session data.
+        :param float lifetime: time before the session expires, in seconds, or `None` to only update the data of the
+            stored session, keeping its expiration time.
+
+        """
+        if self.connection is None:
+            return
+
+        with self.lock:
+            if lifetime is None:
+                self.connection.execute('UPDATE sessions SET data = ? WHERE provider = ? AND username = ?',
+                                        (json.dumps(data), provider, username or ''))
+            else:
+                self.connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)',
+                                        (provider, username or '', json.dumps(data), time.time() + lifetime))
+
+    def delete(self, provider, username):
+        """Delete a stored session, if any.
+
+        :param str provider: name of the provider.
+        :param str username: username of the session.
+
+        """
+        if self.connection is None:
+            return
+
+        with self.lock:
+            self.connection.execute('DELETE FROM sessions WHERE provider = ? AND username = ?',
+                                    (provider, username or ''))
+
+    def restore_cookies(self, provider, username, session):
+        """Restore the stored cookies of a session.
+
+        :param str provider: name of the provider.
+        :param str username: username of the session.
+        :param session: the session to restore the cookies into.
+        :type session: :class:`~requests.Session`
+        :return: `True` if cookies were restored, `False` otherwise.
+        :rtype: bool
+
+        """
+        data = self.get(provider, username)
+        if data is None:
+            return False
+
+        add_dict_to_cookiejar(session.cookies, data['cookies'])
+
+        return True
+
+    def save_cookies(self, provider, username, session, lifetime):
+        """Store the cookies of a session.
+
+        :param str provider: name of the provider.
+        :param str username: username of the session.
+        :param session: the session to store the cookies of.
+        :type session: :class:`~requests.Session`
+        :param float lifetime: time before the cookies expire, in seconds, or `None` to keep the expiration time of
+            the stored cookies.
+
+        """
+        self.set(provider, username, {'cookies': dict_from_cookiejar(session.cookies)}, lifetime)
+
+
+#: The default :class:`SessionStore`
+session_store = SessionStore()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+#: Monotonic clock, if available
+clock = getattr(time, 'monotonic', time.time)
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket to pace requests.
+
+    Tokens are added at `rate` per second up to `burst`, each request takes one. When the bucket is empty, requests
+    are delayed until a token is available so the long-term throughput never exceeds `rate`.
+
+    :param float rate: number of tokens added per second.
+    :param int burst: maximum number of tokens, i.e. requests allowed at once after a pause.
+
+    """
+    def __init__(self, rate, burst=1):
+        #: Number of tokens added per second
+        self.rate = rate
+
+        #: Maximum number of tokens
+        self.burst = burst
+
+        #: Number of tokens available, negative when requests are waiting for tokens
+        self.tokens = burst
+
+        #: Time of the last update of :attr:`tokens`
+        self.updated = clock()
+
+        #: Lock for the tokens
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take `tokens` from the bucket, possibly in advance.
+
+        :param int tokens: number of tokens to take.
+        :return: the time to wait before using the tokens, in seconds.
+        :rtype: float
+
+        """
+        with self.lock:
+            now = clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+
+            return max(0, -self.tokens / self.rate)
+
+    def acquire(self, tokens=1):
+        """Take `tokens` from the bucket, waiting until they are available.
+
+        :param int tokens: number of tokens to take.
+        :return: the time waited, in seconds.
+        :rtype: float
+
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            logger.debug('Waiting %.2fs for a token', delay)
+            time.sleep(delay)
+
+        return delay
+
+
+class CircuitBreaker(object):
+    """Thread-safe circuit breaker to stop calling a failing provider for a while.
+
+    The breaker starts :attr:`CLOSED` and records the outcome of the last `window` calls. When at least `min_calls`
+    were recorded and the rate of failures reaches `failure_rate`, it opens: calls are not allowed until `cooldown`
+    seconds have passed. It is then half-open, a single trial call is allowed: on success the breaker closes, on
+    failure it opens again with a doubled cooldown, up to `max_cooldown`.
+
+    :param float failure_rate: rate of failures opening the breaker.
+    :param int window: number of last calls to compute the rate of failures on.
+    :param int min_calls: minimum number of calls before the breaker can open.
+    :param float cooldown: time before a trial call once opened, in seconds.
+    :param float max_cooldown: maximum time before a trial call, in seconds.
+
+    """
+    #: Calls are allowed
+    CLOSED = 'closed'
+
+    #: Calls are not allowed
+    OPEN = 'open'
+
+    #: A single trial call is allowed
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_rate=0.5, window=10, min_calls=3, cooldown=60, max_cooldown=3600):
+        #: Rate of failures opening the breaker
+        self.failure_rate = failure_rate
+
+        #: Number of last calls to compute the rate of failures on
+        self.window = window
+
+        #: Minimum number of calls before the breaker can open
+        self.min_calls = min_calls
+
+        #: Time before a trial call once opened, in seconds
+        self.cooldown = cooldown
+
+        #: Maximum time before a trial call, in seconds
+        self.max_cooldown = max_cooldown
+
+        #: Outcome of the last calls, `True` for failures
+        self.outcomes = deque(maxlen=window)
+
+        #: Time the breaker opened
+        self.opened = None
+
+        #: Current time before a trial call, in seconds
+        self.current_cooldown = cooldown
+
+        #: Whether the trial call is in progress
+        self.trial = False
+
+        #: Lock for the state
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        """State of the breaker"""
+        with self.lock:
+            if self.opened is None:
+                return self.CLOSED
+            if self.trial or clock() - self.opened >= self.current_cooldown:
+                return self.HALF_OPEN
+
+            return self.OPEN
+
+    def allow(self):
+        """Whether a call is allowed, taking the trial call when half-open.
+
+        The outcome of an allowed call must be recorded with :meth:`record_success` or :meth:`record_failure`.
+
+        :rtype: bool
+
+        """
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.trial or clock() - self.opened < self.current_cooldown:
+                return False
+
+            self.trial = True
+
+            return True
+
+    def open(self, cooldown=None):
+        """Open the breaker regardless of the recorded calls.
+
+        :param float cooldown: time before a trial call, in seconds, if not the current one.
+
+        """
+        with self.lock:
+            if cooldown is not None:
+                self.current_cooldown = cooldown
+            logger.info('Opening circuit breaker for %.0fs', self.current_cooldown)
+            self.opened = clock()
+            self.trial = False
+
+    def record_success(self):
+        """Record a successful call, closing the breaker after a trial call."""
+        with self.lock:
+            if self.trial:
+                logger.info('Closing circuit breaker')
+                self.outcomes.clear()
+                self.opened = None
+                self.current_cooldown = self.cooldown
+                self.trial = False
+            self.outcomes.append(False)
+
+    def record_failure(self):
+        """Record a failed call, opening the breaker if the rate of failures is reached."""
+        with self.lock:
+            # failed trial call
+            if self.trial:
+                self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+                logger.info('Opening circuit breaker again for %ds', self.current_cooldown)
+                self.opened = clock()
+                self.trial = False
+                return
+
+            self.outcomes.append(True)
+            if self.opened is None and len(self.outcomes) >= self.min_calls and \
+                    sum(self.outcomes) >= self.failure_rate * len(self.outcomes):
+                logger.info('Opening circuit breaker for %ds', self.current_cooldown)
+                self.opened = clock()
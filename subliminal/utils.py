@@ -1,10 +1,202 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
 from datetime import datetime
 import hashlib
+import mmap
 import os
 import re
 import struct
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#: Whether the hashes can be fed with views of memory-mapped files, :class:`memoryview` needs to release them
+mmap_views = hasattr(memoryview, 'release')
+
+#: Registered video hashes as ``(ranges, digest)`` tuples per name, see :func:`register_hash`
+video_hashes = OrderedDict()
+
+
+def register_hash(name, ranges, digest):
+    """Register a video hash to be computed by :func:`compute_hashes`.
+
+    All the registered hashes share a single read of the video file: the byte ranges they need are merged and each
+    merged range is read only once.
+
+    :param str name: name of the hash, usually the name of the provider using it.
+    :param ranges: function that takes the file size and returns the byte ranges to read as a list of
+        ``(offset, length)`` tuples or `None` if the hash cannot be computed for that size.
+    :param digest: function that takes the file size and the data of each range, in the same order, as positional
+        arguments and returns the hash.
+    :raise: ValueError if already registered.
+
+    """
+    if name in video_hashes:
+        raise ValueError('Hash already registered')
+
+    video_hashes[name] = (ranges, digest)
+
+
+def unregister_hash(name):
+    """Unregister a video hash.
+
+    :param str name: name of the hash to unregister.
+    :raise: ValueError if not registered.
+
+    """
+    if name not in video_hashes:
+        raise ValueError('Hash not registered')
+
+    del video_hashes[name]
+
+
+def merge_ranges(ranges):
+    """Merge overlapping and contiguous byte ranges.
+
+    :param ranges: byte ranges as ``(offset, length)`` tuples.
+    :return: the merged byte ranges, sorted by offset.
+    :rtype: list of tuple
+
+    """
+    merged = []
+    for offset, length in sorted(ranges):
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            last_offset, last_length = merged[-1]
+            merged[-1] = (last_offset, max(last_length, offset + length - last_offset))
+            continue
+        merged.append((offset, length))
+
+    return merged
+
+
+def sum_uint64(data):
+    """Sum `data` as little-endian 64-bit unsigned integers, modulo 2**64.
+
+    The whole buffer is summed at once with `numpy` if it is installed, with a single bulk unpack otherwise. Trailing
+    bytes that do not fill an integer are ignored.
+
+    :param data: the data to sum.
+    :type data: bytes or memoryview
+    :return: the sum.
+    :rtype: int
+
+    """
+    count = len(data) // 8
+    if numpy is not None:
+        return int(numpy.frombuffer(data, dtype='<u8', count=count).sum(dtype=numpy.uint64))
+
+    return sum(struct.unpack_from('<%dQ' % count, data)) & 0xFFFFFFFFFFFFFFFF
+
+
+def compute_hashes(video_path, names=None):
+    """Compute the registered hashes of a video in a single pass.
+
+    The byte ranges required by every hash are merged so that each part of the file is read at most once.
+
+    The file is memory-mapped so the hashes are fed with zero-copy views of the mapping. Where mapping is not
+    supported, the merged ranges are read into buffers instead.
+
+    :param str video_path: path of the video.
+    :param list names: names of the hashes to compute, if not all the registered ones.
+    :return: the computed hashes per name, hashes that cannot be computed for the file are omitted.
+    :rtype: dict
+
+    """
+    with open(video_path, 'rb') as f:
+        filesize = os.fstat(f.fileno()).st_size
+
+        # map the file
+        mapping = None
+        hash_ranges = _get_hash_ranges(filesize, names)
+        if mmap_views and filesize and hash_ranges:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, OverflowError, ValueError):
+                pass
+        if mapping is not None:
+            try:
+                return _digest_blocks(filesize, hash_ranges, [(0, mapping)])
+            finally:
+                mapping.close()
+
+        return compute_file_hashes(f, filesize, names)
+
+
+def compute_file_hashes(f, filesize, names=None):
+    """Compute the registered hashes of a video from a seekable file object in a single pass.
+
+    Only the merged byte ranges required by the hashes are read, this is suitable for videos that are not regular
+    files such as the ones stored in archives.
+
+    :param f: the video file object, opened in binary mode.
+    :param int filesize: size of the video.
+    :param list names: names of the hashes to compute, if not all the registered ones.
+    :return: the computed hashes per name, hashes that cannot be computed for the file are omitted.
+    :rtype: dict
+
+    """
+    hash_ranges = _get_hash_ranges(filesize, names)
+
+    # read each merged range once
+    blocks = []
+    for offset, length in merge_ranges(r for ranges in hash_ranges.values() for r in ranges):
+        f.seek(offset)
+        blocks.append((offset, f.read(length)))
+
+    return _digest_blocks(filesize, hash_ranges, blocks)
+
+
+def _get_hash_ranges(filesize, names):
+    """Get the byte ranges of each hash, clamped to the file.
+
+    :param int filesize: size of the video.
+    :param list names: names of the hashes, if not all the registered ones.
+    :return: the byte ranges per hash name, hashes that cannot be computed for the file are omitted.
+    :rtype: dict
+
+    """
+    hash_ranges = {}
+    for name in names or video_hashes:
+        ranges = video_hashes[name][0](filesize)
+        if ranges is None:
+            continue
+        hash_ranges[name] = [(o, max(0, min(l, filesize - o))) for o, l in ranges]
+
+    return hash_ranges
+
+
+def _digest_blocks(filesize, hash_ranges, blocks):
+    """Feed the hashes with views over the blocks of data covering their ranges.
+
+    :param int filesize: size of the video.
+    :param dict hash_ranges: the byte ranges per hash name.
+    :param list blocks: the blocks of data as ``(offset, data)`` tuples.
+    :return: the hashes per name.
+    :rtype: dict
+
+    """
+    views = []
+    try:
+        hashes = {}
+        for name, ranges in hash_ranges.items():
+            data = []
+            for offset, length in ranges:
+                block_offset, block = next(b for b in blocks if b[0] <= offset <= b[0] + len(b[1]))
+                views.append(memoryview(block))
+                data.append(views[-1][offset - block_offset:offset - block_offset + length])
+            views.extend(data)
+            hashes[name] = video_hashes[name][1](filesize, *data)
+
+        return hashes
+    finally:
+        # release the views, a mapping cannot be closed while they are alive
+        if mmap_views:
+            for view in views:
+                view.release()
+
 
 def hash_opensubtitles(video_path):
     """Compute a hash using OpenSubtitles' algorithm.
@@ -14,26 +206,7 @@ def hash_opensubtitles(video_path):
     :rtype: str
 
     """
-    bytesize = struct.calcsize(b'<q')
-    with open(video_path, 'rb') as f:
-        filesize = os.path.getsize(video_path)
-        filehash = filesize
-        if filesize < 65536 * 2:
-            return
-        for _ in range(65536 // bytesize):
-            filebuffer = f.read(bytesize)
-            (l_value,) = struct.unpack(b'<q', filebuffer)
-            filehash += l_value
-            filehash &= 0xFFFFFFFFFFFFFFFF  # to remain as 64bit number
-        f.seek(max(0, filesize - 65536), 0)
-        for _ in range(65536 // bytesize):
-            filebuffer = f.read(bytesize)
-            (l_value,) = struct.unpack(b'<q', filebuffer)
-            filehash += l_value
-            filehash &= 0xFFFFFFFFFFFFFFFF
-    returnedhash = '%016x' % filehash
-
-    return returnedhash
+    return compute_hashes(video_path, ['opensubtitles']).get('opensubtitles')
 
 
 def hash_thesubdb(video_path):
@@ -44,15 +217,7 @@ def hash_thesubdb(video_path):
     :rtype: str
 
     """
-    readsize = 64 * 1024
-    if os.path.getsize(video_path) < readsize:
-        return
-    with open(video_path, 'rb') as f:
-        data = f.read(readsize)
-        f.seek(-readsize, os.SEEK_END)
-        data += f.read(readsize)
-
-    return hashlib.md5(data).hexdigest()
+    return compute_hashes(video_path, ['thesubdb']).get('thesubdb')
 
 
 def hash_napiprojekt(video_path):
@@ -63,10 +228,7 @@ def hash_napiprojekt(video_path):
     :rtype: str
 
     """
-    readsize = 1024 * 1024 * 10
-    with open(video_path, 'rb') as f:
-        data = f.read(readsize)
-    return hashlib.md5(data).hexdigest()
+    return compute_hashes(video_path, ['napiprojekt']).get('napiprojekt')
 
 
 def hash_shooter(video_path):
@@ -77,17 +239,58 @@ def hash_shooter(video_path):
     :rtype: string
 
     """
-    filesize = os.path.getsize(video_path)
+    return compute_hashes(video_path, ['shooter']).get('shooter')
+
+
+def _ranges_opensubtitles(filesize):
+    if filesize < 65536 * 2:
+        return
+    return [(0, 65536), (max(0, filesize - 65536), 65536)]
+
+
+def _digest_opensubtitles(filesize, head, tail):
+    filehash = filesize + sum_uint64(head) + sum_uint64(tail)
+
+    return '%016x' % (filehash & 0xFFFFFFFFFFFFFFFF)
+
+
+def _ranges_thesubdb(filesize):
+    readsize = 64 * 1024
+    if filesize < readsize:
+        return
+    return [(0, readsize), (filesize - readsize, readsize)]
+
+
+def _digest_thesubdb(filesize, head, tail):
+    md5 = hashlib.md5(head)
+    md5.update(tail)
+
+    return md5.hexdigest()
+
+
+def _ranges_napiprojekt(filesize):
+    return [(0, 1024 * 1024 * 10)]
+
+
+def _digest_napiprojekt(filesize, head):
+    return hashlib.md5(head).hexdigest()
+
+
+def _ranges_shooter(filesize):
     readsize = 4096
-    if os.path.getsize(video_path) < readsize * 2:
-        return None
-    offsets = (readsize, filesize // 3 * 2, filesize // 3, filesize - readsize * 2)
-    filehash = []
-    with open(video_path, 'rb') as f:
-        for offset in offsets:
-            f.seek(offset)
-            filehash.append(hashlib.md5(f.read(readsize)).hexdigest())
-    return ';'.join(filehash)
+    if filesize < readsize * 2:
+        return
+    return [(offset, readsize) for offset in (readsize, filesize // 3 * 2, filesize // 3, filesize - readsize * 2)]
+
+
+def _digest_shooter(filesize, *data):
+    return ';'.join(hashlib.md5(d).hexdigest() for d in data)
+
+
+register_hash('opensubtitles', _ranges_opensubtitles, _digest_opensubtitles)
+register_hash('shooter', _ranges_shooter, _digest_shooter)
+register_hash('thesubdb', _ranges_thesubdb, _digest_thesubdb)
+register_hash('napiprojekt', _ranges_napiprojekt, _digest_napiprojekt)
 
 
 def sanitize(string, ignore_characters=None):
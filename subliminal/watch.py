@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import logging
+import os
+import select
+import struct
+import time
+
+from .core import ARCHIVE_EXTENSIONS, walk_videos
+from .video import VIDEO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+#: File was opened for writing and closed
+IN_CLOSE_WRITE = 0x00000008
+
+#: File or directory was moved out of a watched directory
+IN_MOVED_FROM = 0x00000040
+
+#: File or directory was moved into a watched directory
+IN_MOVED_TO = 0x00000080
+
+#: File or directory was created in a watched directory
+IN_CREATE = 0x00000100
+
+#: File or directory was deleted from a watched directory
+IN_DELETE = 0x00000200
+
+#: Watched directory was deleted
+IN_DELETE_SELF = 0x00000400
+
+#: Watched directory was moved
+IN_MOVE_SELF = 0x00000800
+
+#: Event queue overflowed
+IN_Q_OVERFLOW = 0x00004000
+
+#: Watch was removed
+IN_IGNORED = 0x00008000
+
+#: Only watch directories
+IN_ONLYDIR = 0x01000000
+
+#: Subject of the event is a directory
+IN_ISDIR = 0x40000000
+
+#: Close the inotify file descriptor on exec
+IN_CLOEXEC = 0o2000000
+
+#: Header of an inotify event: watch descriptor, mask, cookie and length of the name
+EVENT_HEADER = struct.Struct('iIII')
+
+fsencode = getattr(os, 'fsencode', lambda p: p)
+fsdecode = getattr(os, 'fsdecode', lambda p: p)
+
+
+class Inotify(object):
+    """Minimal wrapper around the inotify API of Linux.
+
+    :raise: :class:`OSError` if inotify is not available.
+
+    """
+    def __init__(self):
+        library = ctypes.util.find_library('c')
+        if library is None:
+            raise OSError(errno.ENOSYS, 'C library not found')
+        libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        #: The C library
+        self.libc = libc
+
+        #: File descriptor of the inotify instance
+        self.fd = self._check(libc.inotify_init1(IN_CLOEXEC))
+
+    @staticmethod
+    def _check(result):
+        if result == -1:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        return result
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        """Close the inotify instance."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def add_watch(self, path, mask):
+        """Watch `path` for events.
+
+        :param str path: path to watch.
+        :param int mask: events to watch.
+        :return: the watch descriptor.
+        :rtype: int
+
+        """
+        return self._check(self.libc.inotify_add_watch(self.fd, fsencode(path), ctypes.c_uint32(mask)))
+
+    def read(self, timeout=None):
+        """Read the pending events.
+
+        :param float timeout: maximum time to wait for events, in seconds, default is to wait indefinitely.
+        :return: the watch descriptor, mask, cookie and name of each event.
+        :rtype: list of tuple
+
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        data = os.read(self.fd, 65536)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, cookie, name))
+
+        return events
+
+
+class Scheduler(object):
+    """Schedule of paths to process, with debouncing and exponential backoff.
+
+    Scheduling a path that is already scheduled postpones it, so a burst of events on the same path is processed once.
+    Paths that need to be processed again are retried with an exponentially growing delay.
+
+    :param float retry_delay: delay before the first retry, in seconds.
+    :param float max_retry_delay: maximum delay between two retries, in seconds.
+    :param int max_retries: maximum number of retries before a path is dropped.
+
+    """
+    def __init__(self, retry_delay=3600, max_retry_delay=7 * 86400, max_retries=10):
+        #: Delay before the first retry, in seconds
+        self.retry_delay = retry_delay
+
+        #: Maximum delay between two retries, in seconds
+        self.max_retry_delay = max_retry_delay
+
+        #: Maximum number of retries before a path is dropped
+        self.max_retries = max_retries
+
+        #: Due time and number of retries per scheduled path
+        self.scheduled = {}
+
+        #: Heap of due times and paths, outdated entries are skipped
+        self.heap = []
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def __contains__(self, path):
+        return path in self.scheduled
+
+    def schedule(self, path, delay, now=None, retries=0):
+        """Schedule `path`, postponing it if already scheduled.
+
+        :param str path: path to schedule.
+        :param float delay: delay before the path is due, in seconds.
+        :param float now: current time, default is :func:`time.time`.
+        :param int retries: number of retries so far.
+
+        """
+        due = (now if now is not None else time.time()) + delay
+        self.scheduled[path] = (due, retries)
+        heapq.heappush(self.heap, (due, path))
+
+    def cancel(self, path):
+        """Unschedule `path`, if scheduled.
+
+        :param str path: path to unschedule.
+
+        """
+        self.scheduled.pop(path, None)
+
+    def retry(self, path, retries, now=None):
+        """Schedule `path` again with an exponential backoff.
+
+        :param str path: path to retry.
+        :param int retries: number of retries so far.
+        :param float now: current time, default is :func:`time.time`.
+        :return: `True` if the path was scheduled, `False` if it exceeded :attr:`max_retries`.
+        :rtype: bool
+
+        """
+        if retries >= self.max_retries:
+            logger.info('Giving up on %r after %d retries', path, retries)
+            return False
+
+        delay = min(self.retry_delay * 2 ** retries, self.max_retry_delay)
+        logger.debug('Retrying %r in %ds', path, delay)
+        self.schedule(path, delay, now=now, retries=retries + 1)
+
+        return True
+
+    def timeout(self, now=None):
+        """Time until the next path is due.
+
+        :param float now: current time, default is :func:`time.time`.
+        :return: the time in seconds or `None` if nothing is scheduled.
+        :rtype: float
+
+        """
+        self._skip_outdated()
+        if not self.heap:
+            return None
+
+        return max(0, self.heap[0][0] - (now if now is not None else time.time()))
+
+    def pop_due(self, now=None):
+        """Remove and return the paths that are due.
+
+        :param float now: current time, default is :func:`time.time`.
+        :return: the due paths with their number of retries, in due order.
+        :rtype: list of tuple
+
+        """
+        now = now if now is not None else time.time()
+        due = []
+        self._skip_outdated()
+        while self.heap and self.heap[0][0] <= now:
+            _, path = heapq.heappop(self.heap)
+            due.append((path, self.scheduled.pop(path)[1]))
+            self._skip_outdated()
+
+        return due
+
+    def _skip_outdated(self):
+        while self.heap and self.scheduled.get(self.heap[0][1], (None,))[0] != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+
+class VideoWatcher(object):
+    """Watch directories for new videos with inotify.
+
+    Directories are watched recursively, videos and archives that are completely written or moved in are scheduled
+    after `debounce` seconds. New directories are watched as well and their existing videos are scheduled.
+
+    Iterating over the watcher yields the due paths with their number of retries forever, use :meth:`retry` to
+    process a path again later.
+
+    :param paths: existing directory paths to watch.
+    :type paths: list of str
+    :param bool archives: watch archives.
+    :param float debounce: delay before a path is processed after its last event, in seconds.
+    :param scheduler: scheduler of the paths to process.
+    :type scheduler: :class:`Scheduler`
+
+    """
+    #: Events to watch
+    mask = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF |
+            IN_ONLYDIR)
+
+    def __init__(self, paths, archives=True, debounce=10, scheduler=None):
+        #: Watch videos in archives
+        self.archives = archives
+
+        #: Delay before a path is processed after its last event, in seconds
+        self.debounce = debounce
+
+        #: Scheduler of the paths to process
+        self.scheduler = scheduler or Scheduler()
+
+        #: Inotify instance
+        self.inotify = Inotify()
+
+        #: Watched directories per watch descriptor
+        self.directories = {}
+
+        for path in paths:
+            self.watch(path)
+
+    def close(self):
+        """Stop watching."""
+        self.inotify.close()
+
+    def watch(self, path):
+        """Watch the directory `path` and its sub-directories, skipping hidden directories and links.
+
+        :param str path: directory path to watch.
+
+        """
+        try:
+            wd = self.inotify.add_watch(path, self.mask)
+        except OSError:
+            logger.exception('Error watching directory %r', path)
+            return
+        logger.debug('Watching directory %r', path)
+        self.directories[wd] = path
+
+        try:
+            entries = sorted(os.listdir(path))
+        except OSError:
+            logger.exception('Error listing directory %r', path)
+            return
+        for name in entries:
+            dirpath = os.path.join(path, name)
+            if not name.startswith('.') and os.path.isdir(dirpath) and not os.path.islink(dirpath):
+                self.watch(dirpath)
+
+    def is_candidate(self, name):
+        """Whether `name` is a video or an archive to watch.
+
+        :param str name: name of the file.
+        :rtype: bool
+
+        """
+        if name.startswith('.'):
+            return False
+
+        return name.endswith(VIDEO_EXTENSIONS) or self.archives and name.endswith(ARCHIVE_EXTENSIONS)
+
+    def process_events(self, events, now=None):
+        """Process inotify events, scheduling new videos and watching new directories.
+
+        :param list events: events as returned by :meth:`Inotify.read`.
+        :param float now: current time, default is :func:`time.time`.
+
+        """
+        for wd, mask, _, name in events:
+            # event queue overflow
+            if mask & IN_Q_OVERFLOW:
+                logger.warning('Inotify event queue overflowed, some videos may have been missed')
+                continue
+
+            # removed watches
+            if mask & IN_IGNORED:
+                logger.debug('Stopped watching directory %r', self.directories.pop(wd, None))
+                continue
+
+            # events on the watched directory itself
+            if wd not in self.directories or not name:
+                continue
+
+            path = os.path.join(self.directories[wd], name)
+
+            # new directories
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self.watch(path)
+                    for filepath in walk_videos(path, archives=self.archives):
+                        self.scheduler.schedule(filepath, self.debounce, now=now)
+                continue
+
+            # completely written or moved in videos
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self.is_candidate(name) and not os.path.islink(path):
+                logger.debug('Scheduling %r', path)
+                self.scheduler.schedule(path, self.debounce, now=now)
+
+            # deleted or moved out videos
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.scheduler.cancel(path)
+
+    def poll(self, timeout=None):
+        """Wait for events until a path is due or `timeout` expires.
+
+        :param float timeout: maximum time to wait, in seconds, default is to wait until a path is due.
+        :return: the due paths with their number of retries.
+        :rtype: list of tuple
+
+        """
+        scheduled_timeout = self.scheduler.timeout()
+        if scheduled_timeout is not None:
+            timeout = scheduled_timeout if timeout is None else min(timeout, scheduled_timeout)
+        self.process_events(self.inotify.read(timeout))
+
+        return self.scheduler.pop_due()
+
+    def retry(self, path, retries):
+        """Process `path` again later, with an exponential backoff.
+
+        :param str path: path to retry.
+        :param int retries: number of retries so far.
+        :return: `True` if the path was scheduled, `False` if it exceeded the maximum number of retries.
+        :rtype: bool
+
+        """
+        return self.scheduler.retry(path, retries)
+
+    def __iter__(self):
+        while True:
+            for item in self.poll():
+                yield item
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from io import BytesIO
 import os
+import sys
 from zipfile import ZipFile
 
 import pytest
@@ -12,12 +13,36 @@ except ImportError:
 
 from subliminal import Episode, Movie
 from subliminal.cache import region
+from subliminal.extensions import provider_manager
+from subliminal.session import session_store
+
+# asyncio based modules require Python 3.5
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 5) else []
 
 
 @pytest.fixture(autouse=True, scope='session')
 def configure_region():
     region.configure('dogpile.cache.null')
     region.configure = Mock()
+    region.configure_memory = Mock()
+    region.configure_refresh = Mock()
+
+
+@pytest.fixture
+def store(tmpdir):
+    session_store.configure(str(tmpdir.join('sessions.db')))
+    yield session_store
+    session_store.close()
+
+
+@pytest.fixture
+def mock_providers(monkeypatch):
+    for provider in provider_manager:
+        monkeypatch.setattr(provider.plugin, 'initialize', Mock())
+        monkeypatch.setattr(provider.plugin, 'list_subtitles', Mock(return_value=[provider.name]))
+        monkeypatch.setattr(provider.plugin, 'download_subtitle', Mock())
+        monkeypatch.setattr(provider.plugin, 'terminate', Mock())
+        monkeypatch.setattr(provider.plugin, 'rate_limit', None)
 
 
 @pytest.fixture
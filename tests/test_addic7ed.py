@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 import os
+import time
 
 from babelfish import Language, language_converters
 import pytest
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
 from vcr import VCR
 
 from subliminal.exceptions import AuthenticationError, ConfigurationError
@@ -127,6 +132,56 @@ def test_logout():
     assert r.status_code == 302
 
 
+def test_session_store_restore(store):
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'abc'}}, 60)
+    provider = Addic7edProvider('subliminal', 'subliminal')
+    provider.initialize()
+    assert provider.logged_in is True
+    assert provider.session.cookies['PHPSESSID'] == 'abc'
+    provider.session.cookies.set('PHPSESSID', 'def')
+    provider.terminate()
+    assert store.get('addic7ed', 'subliminal') == {'cookies': {'PHPSESSID': 'def'}}
+
+
+def test_session_store_restore_expiration(store, monkeypatch):
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'abc'}}, 60)
+    provider = Addic7edProvider('subliminal', 'subliminal')
+    provider.initialize()
+    provider.terminate()
+    monkeypatch.setattr('subliminal.session.time.time', Mock(return_value=time.time() + 61))
+    assert store.get('addic7ed', 'subliminal') is None
+
+
+def test_session_store_login_expiration(store, monkeypatch):
+    provider = Addic7edProvider('subliminal', 'subliminal')
+    monkeypatch.setattr(provider, 'log_in', Mock())
+    provider.initialize()
+    provider.logged_in = True
+    provider.session.cookies.set('PHPSESSID', 'abc')
+    provider.terminate()
+    assert provider.log_in.call_count == 1
+    monkeypatch.setattr('subliminal.session.time.time', Mock(return_value=time.time() + 61))
+    assert store.get('addic7ed', 'subliminal') == {'cookies': {'PHPSESSID': 'abc'}}
+
+
+def test_session_store_logged_out(store, monkeypatch):
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'abc'}}, 60)
+    subtitle = Addic7edSubtitle(Language('eng'), True, None, 'The Big Bang Theory', 7, 5, 'The Workplace Proximity',
+                                2007, 'DIMENSION', 'updated/1/85120/1')
+    provider = Addic7edProvider('subliminal', 'subliminal')
+    provider.initialize()
+    monkeypatch.setattr(provider, 'log_in', Mock())
+    monkeypatch.setattr(provider.session, 'get', Mock(side_effect=[
+        Mock(headers={'Content-Type': 'text/html'}),
+        Mock(headers={'Content-Type': 'application/x-subrip'}, content=b'1\r\n00:00:00,000 --> 00:00:01,000\r\n')
+    ]))
+    provider.download_subtitle(subtitle)
+    assert provider.log_in.call_count == 1
+    assert provider.session.get.call_count == 2
+    assert store.get('addic7ed', 'subliminal') is None
+    assert subtitle.content == b'1\n00:00:00,000 --> 00:00:01,000\n'
+
+
 @pytest.mark.integration
 @vcr.use_cassette
 def test_search_show_id():
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from babelfish import Language
+import pytest
+from unittest.mock import Mock
+
+from subliminal.aio import AioProvider, AioProviderPool
+from subliminal.extensions import provider_manager
+from subliminal.providers.tvsubtitles import TVsubtitlesProvider
+
+
+class AioTVsubtitlesProvider(AioProvider, TVsubtitlesProvider):
+    initialize = Mock()
+    list_subtitles = Mock()
+    terminate = Mock()
+
+    async def list_subtitles_async(self, video, languages):
+        await asyncio.sleep(0)
+        return ['aio']
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_aio_provider_pool_get_provider_keyerror():
+    pool = AioProviderPool()
+    with pytest.raises(KeyError):
+        run(pool.get_provider('de7cidda'))
+
+
+def test_aio_provider_pool_list_subtitles(episodes, mock_providers):
+    pool = AioProviderPool()
+    subtitles = run(pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}))
+    assert sorted(subtitles) == ['addic7ed', 'legendastv', 'opensubtitles', 'podnapisi', 'shooter', 'thesubdb',
+                                 'tvsubtitles']
+    for provider in subtitles:
+        assert provider_manager[provider].plugin.initialize.called
+        assert provider_manager[provider].plugin.list_subtitles.called
+    run(pool.terminate())
+    assert not pool.initialized_providers
+    assert pool.executor is None
+
+
+def test_aio_provider_pool_list_subtitles_discard(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'list_subtitles', Mock(side_effect=Exception))
+    pool = AioProviderPool(providers=['addic7ed', 'tvsubtitles'], breaker_config={'min_calls': 1})
+    assert run(pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})) == ['addic7ed']
+    assert pool.discarded_providers == {'tvsubtitles'}
+
+
+def test_aio_provider_pool_discard(episodes, mock_providers):
+    pool = AioProviderPool(providers=['addic7ed', 'tvsubtitles'])
+    pool.discard('tvsubtitles')
+    assert run(pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})) == ['addic7ed']
+    assert not provider_manager['tvsubtitles'].plugin.list_subtitles.called
+
+
+def test_aio_provider_pool_aio_provider(episodes, monkeypatch):
+    monkeypatch.setattr(provider_manager['tvsubtitles'], 'plugin', AioTVsubtitlesProvider)
+    pool = AioProviderPool(providers=['tvsubtitles'])
+    assert run(pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})) == ['aio']
+    assert AioTVsubtitlesProvider.initialize.called
+    assert not AioTVsubtitlesProvider.list_subtitles.called
+    assert pool.executor is None
+
+
+def test_aio_provider_pool_download_best_subtitles_batch(episodes, mock_providers, monkeypatch):
+    async def download_best_subtitles(subtitles, *args, **kwargs):
+        return subtitles
+
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10'], episodes['dallas_s01e03']] * 5
+    pool = AioProviderPool(max_videos=4)
+    monkeypatch.setattr(pool, 'download_best_subtitles', download_best_subtitles)
+    results = run(pool.download_best_subtitles_batch(videos, {Language('eng')}))
+    assert [v for v, _ in results] == videos
+    assert results[0][1] == run(pool.list_subtitles(videos[0], {Language('eng')}))
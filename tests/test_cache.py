@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+from multiprocessing import Pool
+import time
+
+from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
+import pytest
+
+from subliminal import cache
+from subliminal.cache import MemoryCache, SQLiteBackend, TieredCacheRegion
+
+
+@pytest.fixture
+def backend(tmpdir):
+    backend = SQLiteBackend({'filename': str(tmpdir.join('cache.db'))})
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def now(monkeypatch):
+    now = [1000]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def write_keys(args):
+    filename, worker = args
+    backend = SQLiteBackend({'filename': filename})
+    for i in range(50):
+        backend.set('%d-%d' % (worker, i), i)
+        assert backend.get('%d-%d' % (worker, i)) == i
+    backend.close()
+
+
+def test_sqlite_backend(backend):
+    assert backend.get('key') is NO_VALUE
+    backend.set('key', {'value': [1, 2]})
+    assert backend.get('key') == {'value': [1, 2]}
+    backend.set('key', 'other')
+    assert backend.get('key') == 'other'
+    backend.delete('key')
+    assert backend.get('key') is NO_VALUE
+
+
+def test_sqlite_backend_multi(backend):
+    backend.set_multi({'a': 1, 'b': 2, 'c': 3})
+    assert backend.get_multi(['a', 'c', 'd']) == [1, 3, NO_VALUE]
+    backend.delete_multi(['a', 'b'])
+    assert backend.get_multi(['a', 'b', 'c']) == [NO_VALUE, NO_VALUE, 3]
+
+
+def test_sqlite_backend_shared(backend):
+    other = SQLiteBackend({'filename': backend.filename})
+    backend.set('key', 'value')
+    assert other.get('key') == 'value'
+    other.delete('key')
+    assert backend.get('key') is NO_VALUE
+    other.close()
+
+
+def test_sqlite_backend_processes(backend):
+    pool = Pool(4)
+    try:
+        pool.map(write_keys, [(backend.filename, worker) for worker in range(4)])
+    finally:
+        pool.close()
+        pool.join()
+    assert backend.get_multi(['%d-49' % worker for worker in range(4)]) == [49] * 4
+
+
+def test_sqlite_backend_region(tmpdir):
+    region = make_region()
+    region.configure('subliminal.sqlite', arguments={'filename': str(tmpdir.join('cache.db'))})
+    calls = []
+
+    @region.cache_on_arguments()
+    def compute(value):
+        calls.append(value)
+        return value * 2
+
+    assert compute(2) == 4
+    assert compute(2) == 4
+    assert calls == [2]
+    region.backend.close()
+
+
+def test_sqlite_backend_evict_max_age(tmpdir, now):
+    backend = SQLiteBackend({'filename': str(tmpdir.join('cache.db')), 'max_age': 100, 'eviction_interval': 3})
+    backend.set('a', 1)
+    now[0] += 60
+    backend.set('b', 2)
+    now[0] += 60
+    backend.set('c', 3)
+    assert backend.get_multi(['a', 'b', 'c']) == [NO_VALUE, 2, 3]
+    backend.close()
+
+
+def test_sqlite_backend_evict_max_size(tmpdir, now):
+    backend = SQLiteBackend({'filename': str(tmpdir.join('cache.db')), 'max_size': 3000})
+    for key in 'abcd':
+        backend.set(key, b'x' * 900)
+        now[0] += backend.access_resolution + 1
+    assert backend.get('a') is not NO_VALUE
+    assert backend.evict() == 2
+    assert backend.get_multi(['a', 'b', 'c', 'd'])[:3] == [b'x' * 900, NO_VALUE, NO_VALUE]
+    assert backend.evict() == 0
+    backend.close()
+
+
+def test_sqlite_backend_auto_vacuum(backend):
+    assert backend.connection.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+
+def test_sqlite_backend_evict_open(tmpdir, now):
+    filename = str(tmpdir.join('cache.db'))
+    backend = SQLiteBackend({'filename': filename, 'max_age': 100})
+    backend.set('a', 1)
+    backend.close()
+    now[0] += SQLiteBackend.eviction_period + 1
+    backend = SQLiteBackend({'filename': filename, 'max_age': 100})
+    assert backend.get('a') is NO_VALUE
+    backend.set('b', 2)
+    backend.close()
+    now[0] += 200
+    backend = SQLiteBackend({'filename': filename, 'max_age': 100})
+    assert backend.get('b') == 2
+    backend.close()
+
+
+def test_sqlite_backend_stats(backend):
+    backend.set_multi({'module:function|1': 1, 'module:function|2': 2, 'module:other|1': [1] * 100, 'key': None})
+    stats = backend.stats()
+    assert sorted(stats) == ['key', 'module:function', 'module:other']
+    assert stats['module:function'][0] == 2
+    assert stats['module:other'][1] > stats['module:function'][1]
+
+
+def test_sqlite_backend_compact(tmpdir):
+    backend = SQLiteBackend({'filename': str(tmpdir.join('cache.db')), 'max_size': 100000})
+    backend.set_multi({str(i): b'x' * 10000 for i in range(50)})
+    size = tmpdir.join('cache.db').size() + tmpdir.join('cache.db-wal').size()
+    assert backend.compact() == 42
+    assert backend.connection.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert tmpdir.join('cache.db').size() + tmpdir.join('cache.db-wal').size() < size
+    backend.close()
+
+
+def test_memory_cache_lru(monkeypatch):
+    monkeypatch.setattr(cache, 'clock', lambda: 0)
+    memory = MemoryCache(size=2)
+    memory.set('a', 1)
+    memory.set('b', 2)
+    assert memory.get('a') == 1
+    memory.set('c', 3)
+    assert len(memory) == 2
+    assert memory.get('b') is NO_VALUE
+    assert memory.get('a') == 1
+    assert memory.get('c') == 3
+
+
+def test_memory_cache_expiration(monkeypatch):
+    monkeypatch.setattr(cache, 'clock', lambda: 0)
+    memory = MemoryCache(expiration_time=10)
+    memory.set('a', 1)
+    memory.set('b', 2, expiration_time=5)
+    memory.set('c', 3, expiration_time=3600)
+    monkeypatch.setattr(cache, 'clock', lambda: 5)
+    assert memory.get('a') == 1
+    assert memory.get('b') is NO_VALUE
+    assert memory.get('c') == 3
+    monkeypatch.setattr(cache, 'clock', lambda: 10)
+    assert memory.get('a') is NO_VALUE
+    assert memory.get('c') is NO_VALUE
+    assert len(memory) == 0
+
+
+def test_memory_cache_shared():
+    memory = MemoryCache()
+    value = {'a': [1]}
+    memory.set('key', value)
+    assert memory.get('key') is value
+
+
+def test_memory_cache_disabled():
+    memory = MemoryCache(size=0)
+    memory.set('a', 1)
+    assert memory.get('a') is NO_VALUE
+
+
+def test_tiered_cache_region(tmpdir):
+    region = TieredCacheRegion()
+    region.configure('subliminal.sqlite', arguments={'filename': str(tmpdir.join('cache.db'))})
+    region.configure_memory(size=10)
+    backend = SQLiteBackend({'filename': region.backend.filename})
+    calls = []
+
+    @region.cache_on_arguments()
+    def compute(value):
+        calls.append(value)
+        return [value]
+
+    assert compute(2) == [2]
+    backend.delete_multi([key for key in region.memory.entries])
+    assert compute(2) == [2]
+    assert compute(2) is compute(2)
+    assert calls == [2]
+
+    region.set('key', 'value')
+    assert region.memory.get('key') == 'value'
+    assert backend.get('key').payload == 'value'
+    region.delete('key')
+    assert region.get('key') is NO_VALUE
+
+    region.invalidate()
+    assert len(region.memory) == 0
+    backend.close()
+    region.backend.close()
+
+
+def test_tiered_cache_region_negative_expiration(now):
+    region = TieredCacheRegion()
+    region.configure('dogpile.cache.memory')
+    results = {'a': [None, None, 'found'], 'b': ['found', None]}
+
+    @region.cache_on_arguments(expiration_time=100, negative_expiration_time=10)
+    def search(name):
+        return results[name].pop(0)
+
+    assert search('a') is None
+    now[0] += 5
+    assert search('a') is None
+    now[0] += 10
+    assert search('a') is None
+    now[0] += 11
+    assert search('a') == 'found'
+    assert search('b') == 'found'
+    now[0] += 50
+    assert search('a') == 'found'
+    assert search('b') == 'found'
+    assert results == {'a': [], 'b': [None]}
+
+    search.invalidate('a')
+    assert region.get(search.__module__ + ':search|a') is NO_VALUE
+
+
+def test_tiered_cache_region_refresh(now):
+    region = TieredCacheRegion()
+    region.configure('dogpile.cache.memory')
+    region.configure_refresh(max_workers=1)
+    values = [1, 2]
+
+    @region.cache_on_arguments(expiration_time=100, stale_while_revalidate=True, max_stale_time=1000)
+    def compute():
+        return values.pop(0)
+
+    assert compute() == 1
+    now[0] += 200
+    assert compute() == 1
+    region.refresher.shutdown(wait=True)
+    assert values == []
+    assert compute() == 2
+    assert not region.refreshing
+
+
+def test_tiered_cache_region_refresh_max_stale_time(now):
+    region = TieredCacheRegion()
+    region.configure('dogpile.cache.memory')
+    region.configure_refresh(max_workers=1)
+    values = [1, 2]
+
+    @region.cache_on_arguments(expiration_time=100, stale_while_revalidate=True, max_stale_time=1000)
+    def compute():
+        return values.pop(0)
+
+    assert compute() == 1
+    now[0] += 2000
+    assert compute() == 2
+    assert not region.refreshing
+
+
+def test_tiered_cache_region_refresh_opt_in(now):
+    region = TieredCacheRegion()
+    region.configure('dogpile.cache.memory')
+    region.configure_refresh(max_workers=1)
+    values = [1, 2]
+
+    @region.cache_on_arguments(expiration_time=100)
+    def compute():
+        return values.pop(0)
+
+    assert compute() == 1
+    now[0] += 200
+    assert compute() == 2
+    assert not region.refreshing
+
+
+def test_tiered_cache_region_refresh_requires_expiration_time():
+    region = TieredCacheRegion()
+    with pytest.raises(ValueError):
+        region.cache_on_arguments(stale_while_revalidate=True)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+
+from click.testing import CliRunner
+import pytest
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+from subliminal import core, provider_manager
+from subliminal.cache import region
+from subliminal.cli import Config, subliminal
+from subliminal.index import hash_index
+
+
+@pytest.fixture
+def mock_providers(mock_providers, monkeypatch):
+    # the providers find no subtitles
+    for provider in provider_manager:
+        monkeypatch.setattr(provider.plugin, 'list_subtitles', Mock(return_value=[]))
+
+
+@pytest.fixture
+def run(tmpdir):
+    def run(*args):
+        return CliRunner().invoke(subliminal, ['--cache-dir', str(tmpdir.join('cache')),
+                                               '--config', str(tmpdir.join('config.ini'))] + list(args))
+    yield run
+    hash_index.close()
+
+
+def test_cache_backend_default(run, tmpdir):
+    assert Config(str(tmpdir.join('config.ini'))).cache_backend == 'sqlite'
+    result = run('cache')
+    assert result.exit_code == 0, result.output
+    assert region.configure.call_args[0][0] == 'subliminal.sqlite'
+
+
+@pytest.mark.parametrize('command', ['compact', 'stats'])
+def test_cache_dbm_unsupported(run, command):
+    result = run('--cache-backend', 'dbm', 'cache', command)
+    assert result.exit_code == 2
+    assert 'requires the sqlite cache backend' in result.output
+    assert region.configure.call_args[0][0] == 'dogpile.cache.dbm'
+
+
+def test_download_unreadable_video(run, movies, mock_providers, tmpdir, monkeypatch):
+    for movie in movies.values():
+        tmpdir.ensure('movies', os.path.split(movie.name)[1])
+    unreadable = str(tmpdir.join('movies', os.path.split(movies['enders_game'].name)[1]))
+
+    hash_video = core.hash_video
+
+    def failing_hash_video(video):
+        if video.name == unreadable:
+            raise OSError(13, 'Permission denied')
+        hash_video(video)
+    monkeypatch.setattr(core, 'hash_video', failing_hash_video)
+
+    result = run('download', '-l', 'en', '-p', 'podnapisi', '-r', 'metadata', '-Z', '-v', str(tmpdir.join('movies')))
+    assert result.exit_code == 0, result.output
+    assert '1 video collected' in result.output
+
+
+def test_download_incremental(run, movies, mock_providers, tmpdir, monkeypatch):
+    for movie in movies.values():
+        tmpdir.ensure('movies', os.path.split(movie.name)[1])
+    enders_game = str(tmpdir.join('movies', os.path.split(movies['enders_game'].name)[1]))
+    man_of_steel = str(tmpdir.join('movies', os.path.split(movies['man_of_steel'].name)[1]))
+    args = ('download', '-l', 'en', '-p', 'podnapisi', '-r', 'metadata', '-Z', '-i', str(tmpdir.join('movies')))
+
+    hash_video = core.hash_video
+
+    def failing_hash_video(video):
+        if video.name == enders_game:
+            raise OSError(13, 'Permission denied')
+        hash_video(video)
+    monkeypatch.setattr(core, 'hash_video', failing_hash_video)
+    assert '1 video collected / 0 video ignored' in run(*args).output
+
+    # videos that failed to scan or have no subtitles are retried
+    monkeypatch.setattr(core, 'hash_video', hash_video)
+    assert '2 videos collected / 0 video ignored' in run(*args).output
+
+    # videos with all the subtitles are not scanned again
+    tmpdir.ensure('movies', os.path.splitext(os.path.split(man_of_steel)[1])[0] + '.en.srt')
+    assert '1 video collected / 1 video ignored' in run(*args).output
+    assert '1 video collected / 0 video ignored' in run(*args).output
+
+
+def test_download_pool_size(run, mock_providers, tmpdir, monkeypatch):
+    configure = Mock()
+    monkeypatch.setattr('subliminal.cli.session_factory.configure', configure)
+    result = run('download', '-l', 'en', '-p', 'podnapisi', '-r', 'metadata', '-w', '16',
+                 str(tmpdir.ensure_dir('movies')))
+    assert result.exit_code == 0, result.output
+    configure.assert_called_once_with(pool_maxsize=16)
+
+
+def test_watch_error(run, movies, mock_providers, tmpdir, monkeypatch):
+    video = str(tmpdir.ensure('movies', os.path.split(movies['man_of_steel'].name)[1]))
+    deleted = str(tmpdir.join('movies', os.path.split(movies['enders_game'].name)[1]))
+    watcher = Mock()
+    watcher.__iter__ = Mock(return_value=iter([(video, 0), (deleted, 0), (video, 1)]))
+    monkeypatch.setattr('subliminal.cli.VideoWatcher', Mock(return_value=watcher))
+    monkeypatch.setattr('subliminal.cli.save_subtitles', Mock(side_effect=[OSError(30, 'Read-only file system'), []]))
+
+    result = run('watch', '-l', 'en', '-p', 'podnapisi', '-r', 'metadata', str(tmpdir.join('movies')))
+    assert result.exit_code == 0, result.output
+    assert watcher.retry.call_args_list == [((video, 0),), ((video, 1),)]
+    assert watcher.close.called
@@ -2,6 +2,8 @@
 from datetime import datetime, timedelta
 import io
 import os
+import threading
+import time
 
 from babelfish import Language
 import pytest
@@ -10,18 +12,21 @@ try:
     from unittest.mock import Mock
 except ImportError:
     from mock import Mock
+from rarfile import RAR_M0
 from vcr import VCR
 
-from subliminal.core import (AsyncProviderPool, ProviderPool, check_video, download_best_subtitles, download_subtitles,
-                             list_subtitles, refine, save_subtitles, scan_archive, scan_video, scan_videos,
-                             search_external_subtitles)
+from subliminal.core import (AsyncProviderPool, DirectoryIndex, ProviderPool, check_video, download_best_subtitles,
+                             download_subtitles, iter_videos, list_subtitles, refine, save_subtitles, scan_archive,
+                             scan_video, scan_videos, search_external_subtitles, walk_videos)
 from subliminal.extensions import provider_manager
+from subliminal.index import ScanJournal
 from subliminal.providers.addic7ed import Addic7edSubtitle
 from subliminal.providers.thesubdb import TheSubDBSubtitle
 from subliminal.providers.tvsubtitles import TVsubtitlesSubtitle
 from subliminal.score import episode_scores
 from subliminal.subtitle import Subtitle
-from subliminal.utils import timestamp
+from subliminal.throttle import CircuitBreaker
+from subliminal.utils import compute_hashes, timestamp
 from subliminal.video import Movie
 
 
@@ -31,15 +36,6 @@ vcr = VCR(path_transformer=lambda path: path + '.yaml',
           cassette_library_dir=os.path.realpath(os.path.join('tests', 'cassettes', 'core')))
 
 
-@pytest.fixture
-def mock_providers(monkeypatch):
-    for provider in provider_manager:
-        monkeypatch.setattr(provider.plugin, 'initialize', Mock())
-        monkeypatch.setattr(provider.plugin, 'list_subtitles', Mock(return_value=[provider.name]))
-        monkeypatch.setattr(provider.plugin, 'download_subtitle', Mock())
-        monkeypatch.setattr(provider.plugin, 'terminate', Mock())
-
-
 def test_provider_pool_get_keyerror():
     pool = ProviderPool()
     with pytest.raises(KeyError):
@@ -95,6 +91,322 @@ def test_async_provider_pool_list_subtitles(episodes, mock_providers):
         assert provider_manager[provider].plugin.list_subtitles.called
 
 
+def test_async_provider_pool_executor(episodes, mock_providers):
+    with AsyncProviderPool() as pool:
+        assert pool.executor is None
+        pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})
+        executor = pool.executor
+        assert executor is not None
+        pool.list_subtitles(episodes['got_s03e10'], {Language('eng')})
+        assert pool.executor is executor
+    assert pool.executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(int)
+
+
+@pytest.fixture
+def slow_tvsubtitles(mock_providers, monkeypatch):
+    event = threading.Event()
+    calls = []
+
+    def list_subtitles(self, video, languages):
+        calls.append(video)
+        event.wait(5)
+        return ['tvsubtitles']
+
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'list_subtitles', list_subtitles)
+    yield event, calls
+    event.set()
+
+
+def test_async_provider_pool_deadline(episodes, slow_tvsubtitles):
+    event, calls = slow_tvsubtitles
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], deadline=0.1) as pool:
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed']
+        assert pool.late_futures == {}
+        event.set()
+
+
+def test_async_provider_pool_deadline_merge_late(episodes, slow_tvsubtitles):
+    event, calls = slow_tvsubtitles
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], deadline=0.1, merge_late=True) as pool:
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed']
+        assert pool.late_futures[episodes['bbt_s07e05'].name][0] == {Language('eng')}
+        assert list(pool.late_futures[episodes['bbt_s07e05'].name][1]) == ['tvsubtitles']
+        event.set()
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed', 'tvsubtitles']
+        assert len(calls) == 1
+        assert pool.late_futures == {}
+
+
+def test_async_provider_pool_deadline_merge_late_languages(episodes, slow_tvsubtitles):
+    event, calls = slow_tvsubtitles
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], deadline=0.1, merge_late=True) as pool:
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed']
+        event.set()
+        pool.late_calls['tvsubtitles'].result()
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('fra')}) == ['addic7ed', 'tvsubtitles']
+        assert len(calls) == 2
+        assert pool.late_futures == {}
+
+
+def test_async_provider_pool_deadline_late_provider(episodes, slow_tvsubtitles):
+    event, calls = slow_tvsubtitles
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], deadline=0.1) as pool:
+        for video in ('bbt_s07e05', 'got_s03e10', 'dallas_s01e03'):
+            assert pool.list_subtitles(episodes[video], {Language('eng')}) == ['addic7ed']
+        assert len(calls) == 1
+        event.set()
+
+
+def test_async_provider_pool_deadline_cancel(episodes, slow_tvsubtitles):
+    event, calls = slow_tvsubtitles
+    with AsyncProviderPool(max_workers=1, providers=['tvsubtitles', 'addic7ed'], deadline=0.1) as pool:
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == []
+        assert not provider_manager['addic7ed'].plugin.list_subtitles.called
+        assert list(pool.late_calls) == ['tvsubtitles']
+        event.set()
+
+
+def test_async_provider_pool_early_exit(episodes, slow_tvsubtitles, monkeypatch):
+    event, calls = slow_tvsubtitles
+    subtitle = Mock(language=Language('eng'), get_matches=Mock(return_value={'hash', 'title'}))
+    monkeypatch.setattr(provider_manager['addic7ed'].plugin, 'list_subtitles', Mock(return_value=[subtitle]))
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], early_exit=True) as pool:
+        assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == [subtitle]
+        event.set()
+
+
+def test_async_provider_pool_speculative_downloads(episodes, mock_providers, monkeypatch):
+    event = threading.Event()
+
+    def download_subtitle(self, subtitle):
+        assert event.wait(1)
+
+    monkeypatch.setattr(provider_manager['addic7ed'].plugin, 'download_subtitle', download_subtitle)
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'download_subtitle',
+                        Mock(side_effect=lambda subtitle: event.set()))
+    subtitles = [Mock(provider_name='tvsubtitles', language=Language('eng'), score=10),
+                 Mock(provider_name='addic7ed', language=Language('eng'), score=20)]
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], speculative_downloads=2) as pool:
+        downloaded_subtitles = pool.download_best_subtitles(subtitles, episodes['bbt_s07e05'], {Language('eng')},
+                                                            compute_score=lambda s, v, hearing_impaired: s.score)
+    assert downloaded_subtitles == [subtitles[1]]
+
+
+def test_async_provider_pool_speculative_downloads_fallback(episodes, mock_providers):
+    subtitles = [Mock(provider_name='addic7ed', language=Language('eng'), score=s) for s in (40, 30, 20, 10)]
+    subtitles += [Mock(provider_name='addic7ed', language=Language('fra'), score=s) for s in (35, 25)]
+    for subtitle in subtitles[:2] + subtitles[4:]:
+        subtitle.is_valid.return_value = False
+    with AsyncProviderPool(providers=['addic7ed'], speculative_downloads=2) as pool:
+        downloaded_subtitles = pool.download_best_subtitles(subtitles, episodes['bbt_s07e05'],
+                                                            {Language('eng'), Language('fra')}, min_score=15,
+                                                            compute_score=lambda s, v, hearing_impaired: s.score)
+    assert downloaded_subtitles == [subtitles[2]]
+    assert not subtitles[3].is_valid.called
+
+
+def test_async_provider_pool_speculative_downloads_losers(episodes, mock_providers):
+    subtitles = [Mock(provider_name='tvsubtitles', language=Language('eng'), score=10),
+                 Mock(provider_name='addic7ed', language=Language('eng'), score=20)]
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], speculative_downloads=2) as pool:
+        pool.provider_semaphores['tvsubtitles'].acquire()
+        try:
+            downloaded_subtitles = pool.download_best_subtitles(subtitles, episodes['bbt_s07e05'],
+                                                                {Language('eng')},
+                                                                compute_score=lambda s, v, hearing_impaired: s.score)
+        finally:
+            pool.provider_semaphores['tvsubtitles'].release()
+    assert downloaded_subtitles == [subtitles[1]]
+    assert not provider_manager['tvsubtitles'].plugin.download_subtitle.called
+
+
+def test_async_provider_pool_speculative_downloads_provider_max_workers(episodes, mock_providers):
+    subtitles = [Mock(provider_name='addic7ed', language=Language('eng'), score=30),
+                 Mock(provider_name='addic7ed', language=Language('eng'), score=20),
+                 Mock(provider_name='tvsubtitles', language=Language('eng'), score=10)]
+    with AsyncProviderPool(providers=['addic7ed', 'tvsubtitles'], speculative_downloads=3) as pool:
+        downloaded_subtitles = pool.download_best_subtitles(subtitles, episodes['bbt_s07e05'], {Language('eng')},
+                                                            compute_score=lambda s, v, hearing_impaired: s.score)
+    assert downloaded_subtitles == [subtitles[0]]
+    assert provider_manager['addic7ed'].plugin.download_subtitle.call_count == 1
+    assert not provider_manager['tvsubtitles'].plugin.download_subtitle.called
+
+
+def test_async_provider_pool_speculative_downloads_same_provider(episodes, mock_providers, monkeypatch):
+    started = []
+    event = threading.Event()
+
+    def download_subtitle(subtitle):
+        started.append(subtitle)
+        if len(started) == 2:
+            event.set()
+        assert event.wait(1)
+
+    monkeypatch.setattr(provider_manager['addic7ed'].plugin, 'download_subtitle', Mock(side_effect=download_subtitle))
+    subtitles = [Mock(provider_name='addic7ed', language=Language('eng'), score=s) for s in (30, 20, 10)]
+    with AsyncProviderPool(providers=['addic7ed'], provider_max_workers=2, speculative_downloads=3) as pool:
+        downloaded_subtitles = pool.download_best_subtitles(subtitles, episodes['bbt_s07e05'], {Language('eng')},
+                                                            compute_score=lambda s, v, hearing_impaired: s.score)
+    assert downloaded_subtitles == [subtitles[0]]
+    assert [c[0][0] for c in provider_manager['addic7ed'].plugin.download_subtitle.call_args_list] == subtitles[:2]
+
+
+def test_provider_pool_throttle(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'rate_limit', (1000, 1))
+    pool = ProviderPool(rate_limits={'addic7ed': (1000, 2), 'podnapisi': None})
+    assert pool.get_bucket('tvsubtitles').rate == 1000
+    assert pool.get_bucket('addic7ed').burst == 2
+    assert pool.get_bucket('podnapisi') is None
+    assert pool.get_bucket('shooter') is None
+
+    pool.list_subtitles_provider('tvsubtitles', episodes['bbt_s07e05'], {Language('eng')})
+    pool.list_subtitles_provider('tvsubtitles', episodes['bbt_s07e05'], {Language('eng')})
+    assert pool.get_bucket('tvsubtitles').tokens < 0.1
+
+
+def test_provider_pool_circuit_breaker(episodes, mock_providers, monkeypatch):
+    clock = Mock(return_value=0)
+    monkeypatch.setattr('subliminal.throttle.clock', clock)
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'list_subtitles', Mock(side_effect=Exception))
+    pool = ProviderPool(providers=['addic7ed', 'tvsubtitles'], breaker_config={'min_calls': 2, 'cooldown': 60})
+    pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})
+    assert pool.discarded_providers == set()
+    pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})
+    assert pool.discarded_providers == {'tvsubtitles'}
+    pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')})
+    assert provider_manager['tvsubtitles'].plugin.list_subtitles.call_count == 2
+
+    # provider recovers after the cooldown
+    provider_manager['tvsubtitles'].plugin.list_subtitles.side_effect = None
+    provider_manager['tvsubtitles'].plugin.list_subtitles.return_value = ['tvsubtitles']
+    clock.return_value = 60
+    assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed', 'tvsubtitles']
+    assert pool.get_breaker('tvsubtitles').state == CircuitBreaker.CLOSED
+
+
+def test_provider_pool_discard(episodes, mock_providers):
+    pool = ProviderPool(providers=['addic7ed', 'tvsubtitles'])
+    pool.discard('tvsubtitles')
+    assert pool.discarded_providers == {'tvsubtitles'}
+    assert pool.list_subtitles(episodes['bbt_s07e05'], {Language('eng')}) == ['addic7ed']
+    assert not provider_manager['tvsubtitles'].plugin.list_subtitles.called
+
+
+def test_provider_pool_list_subtitles_batch(episodes, mock_providers, monkeypatch):
+    list_subtitles_batch = Mock(side_effect=lambda videos, languages: [[v.name] for v in videos])
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'list_subtitles_batch', list_subtitles_batch)
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'batch_size', 2)
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10'], episodes['dallas_s01e03']]
+    pool = ProviderPool(providers=['opensubtitles', 'tvsubtitles'])
+    subtitles = pool.list_subtitles_batch(videos, {Language('eng')})
+    assert subtitles == [[v.name, 'tvsubtitles'] for v in videos]
+    assert [len(c[0][0]) for c in list_subtitles_batch.call_args_list] == [2, 1]
+
+
+def test_provider_pool_list_subtitles_batch_error(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'list_subtitles_batch',
+                        Mock(side_effect=[Exception, [['opensubtitles']]]))
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'batch_size', 2)
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10'], episodes['dallas_s01e03']]
+    pool = ProviderPool(providers=['opensubtitles'])
+    assert pool.list_subtitles_batch_provider('opensubtitles', videos, {Language('eng')}) == [None, None,
+                                                                                              ['opensubtitles']]
+
+
+def test_async_provider_pool_list_subtitles_batch(episodes, mock_providers):
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10'], episodes['dallas_s01e03']]
+    expected = ProviderPool().list_subtitles_batch(videos, {Language('eng')})
+    with AsyncProviderPool() as pool:
+        assert pool.list_subtitles_batch(videos, {Language('eng')}) == expected
+
+
+def test_provider_pool_download_subtitles_batch(mock_providers, monkeypatch):
+    download_subtitles_batch = Mock()
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'download_subtitles_batch', download_subtitles_batch)
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'batch_size', 2)
+    subtitles = [Mock(provider_name='opensubtitles'), Mock(provider_name='tvsubtitles'),
+                 Mock(provider_name='opensubtitles'), Mock(provider_name='opensubtitles')]
+    subtitles[2].is_valid.return_value = False
+    pool = ProviderPool()
+    assert pool.download_subtitles_batch(subtitles) == [True, True, False, True]
+    calls = download_subtitles_batch.call_args_list
+    assert [c[0][0] for c in calls] == [[subtitles[0], subtitles[2]], [subtitles[3]]]
+    provider_manager['tvsubtitles'].plugin.download_subtitle.assert_called_once_with(subtitles[1])
+
+
+def test_async_provider_pool_download_subtitles_batch(mock_providers, monkeypatch):
+    monkeypatch.setattr(provider_manager['opensubtitles'].plugin, 'download_subtitles_batch',
+                        Mock(side_effect=Exception))
+    subtitles = [Mock(provider_name='opensubtitles'), Mock(provider_name='tvsubtitles'), Mock(provider_name='unknown')]
+    with AsyncProviderPool() as pool:
+        assert pool.download_subtitles_batch(subtitles) == [False, True, False]
+
+
+def test_provider_pool_download_best_subtitles_batch(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(ProviderPool, '_download_best_subtitles_chunk', lambda self, c, *args: [s for _, s in c])
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10']]
+    pool = ProviderPool()
+    results = list(pool.download_best_subtitles_batch(videos, {Language('eng')}))
+    assert [v for v, _ in results] == videos
+    assert results[0][1] == pool.list_subtitles(videos[0], {Language('eng')})
+
+
+def test_provider_pool_download_best_subtitles_batch_best_at_once(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'batch_size', 2)
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'download_subtitles_batch', Mock())
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10']]
+    subtitles = {v.name: [Mock(provider_name='tvsubtitles', language=Language('eng'), score=s) for s in (30, 20)]
+                 for v in videos}
+    subtitles[videos[1].name][0].is_valid.return_value = False
+    pool = ProviderPool(providers=['tvsubtitles'])
+    monkeypatch.setattr(pool, '_list_subtitles_video', lambda video, languages: subtitles[video.name])
+    results = list(pool.download_best_subtitles_batch(videos, {Language('eng')},
+                                                      compute_score=lambda s, v, hearing_impaired: s.score))
+    assert results == [(videos[0], [subtitles[videos[0].name][0]]), (videos[1], [subtitles[videos[1].name][1]])]
+    download_subtitles_batch = provider_manager['tvsubtitles'].plugin.download_subtitles_batch
+    assert download_subtitles_batch.call_count == 1
+    assert download_subtitles_batch.call_args[0][0] == [subtitles[v.name][0] for v in videos]
+    assert provider_manager['tvsubtitles'].plugin.download_subtitle.call_count == 1
+    assert provider_manager['tvsubtitles'].plugin.download_subtitle.call_args[0][0] is subtitles[videos[1].name][1]
+
+
+def test_async_provider_pool_download_best_subtitles_batch(episodes, mock_providers, monkeypatch):
+    monkeypatch.setattr(ProviderPool, '_download_best_subtitles_chunk', lambda self, c, *args: [s for _, s in c])
+    videos = [episodes['bbt_s07e05'], episodes['got_s03e10'], episodes['dallas_s01e03']] * 5
+    expected = list(ProviderPool().download_best_subtitles_batch(videos, {Language('eng')}))
+    pool = AsyncProviderPool(max_workers=4)
+    assert list(pool.download_best_subtitles_batch(videos, {Language('eng')})) == expected
+
+
+def test_async_provider_pool_provider_max_workers(episodes, mock_providers, monkeypatch):
+    lock = threading.Lock()
+    calls = {'current': 0, 'max': 0}
+
+    def list_subtitles(self, video, languages):
+        with lock:
+            calls['current'] += 1
+            calls['max'] = max(calls['max'], calls['current'])
+        time.sleep(0.01)
+        with lock:
+            calls['current'] -= 1
+        return ['tvsubtitles']
+
+    monkeypatch.setattr(provider_manager['tvsubtitles'].plugin, 'list_subtitles', list_subtitles)
+    monkeypatch.setattr(ProviderPool, '_download_best_subtitles_chunk', lambda self, c, *args: [s for _, s in c])
+    videos = [episodes['bbt_s07e05']] * 8
+
+    pool = AsyncProviderPool(max_workers=4, providers=['tvsubtitles'])
+    assert [s for _, s in pool.download_best_subtitles_batch(videos, {Language('eng')})] == [['tvsubtitles']] * 8
+    assert calls['max'] == 1
+
+    calls['max'] = 0
+    pool = AsyncProviderPool(max_workers=4, providers=['tvsubtitles'], provider_max_workers={'tvsubtitles': 4})
+    assert [s for _, s in pool.download_best_subtitles_batch(videos, {Language('eng')})] == [['tvsubtitles']] * 8
+    assert calls['max'] > 1
+
+
 def test_check_video_languages(movies):
     video = movies['man_of_steel']
     languages = {Language('fra'), Language('eng')}
@@ -191,6 +503,36 @@ def test_search_external_subtitles_in_directory(episodes, tmpdir):
     assert subtitles == expected_subtitles
 
 
+def test_search_external_subtitles_index(episodes, tmpdir, monkeypatch):
+    video_name = os.path.split(episodes['bbt_s07e05'].name)[1]
+    video_root = os.path.splitext(video_name)[0]
+    other_name = os.path.split(episodes['got_s03e10'].name)[1]
+    tmpdir.ensure(video_name)
+    tmpdir.ensure(video_root + '.en.srt')
+    tmpdir.ensure(video_root + '.nfo')
+    tmpdir.ensure(other_name + '.fr.srt')
+    mock_listdir = Mock(side_effect=os.listdir)
+    monkeypatch.setattr('os.listdir', mock_listdir)
+    index = DirectoryIndex()
+    subtitles = search_external_subtitles(str(tmpdir.join(video_name)), index=index)
+    assert subtitles == {video_root + '.en.srt': Language('eng')}
+    subtitles = search_external_subtitles(str(tmpdir.join(other_name)), index=index)
+    assert subtitles == {other_name + '.fr.srt': Language('fra')}
+    assert mock_listdir.call_count == 1
+
+
+def test_search_external_subtitles_index_walk(episodes, tmpdir, monkeypatch):
+    video_name = os.path.split(episodes['bbt_s07e05'].name)[1]
+    tmpdir.ensure('tvshows', video_name)
+    tmpdir.ensure('tvshows', video_name + '.fra.srt')
+    monkeypatch.chdir(str(tmpdir))
+    index = DirectoryIndex()
+    assert list(walk_videos('tvshows', index=index)) == [os.path.join('tvshows', video_name)]
+    monkeypatch.setattr('os.listdir', Mock(side_effect=OSError))
+    subtitles = search_external_subtitles(os.path.join('tvshows', video_name), index=index)
+    assert subtitles == {video_name + '.fra.srt': Language('fra')}
+
+
 def test_scan_video_movie(movies, tmpdir, monkeypatch):
     video = movies['man_of_steel']
     monkeypatch.chdir(str(tmpdir))
@@ -318,6 +660,40 @@ def test_scan_archive(movies, tmpdir, monkeypatch):
     assert scanned_video.year == 2013
 
 
+def test_scan_archive_hashes(movies, tmpdir, monkeypatch):
+    video = movies['enders_game']
+    enders_game = tmpdir.ensure(os.path.splitext(video.name)[0] + '.rar')
+    data = bytes(bytearray(range(256))) * 45000
+    tmpdir.join('video.mkv').write_binary(data)
+
+    monkeypatch.setattr('rarfile.RarFile._parse', Mock())
+    monkeypatch.setattr('rarfile.RarFile.namelist', Mock(return_value=[video.name]))
+    rar_info = Mock(file_size=len(data), compress_type=RAR_M0, needs_password=Mock(return_value=False))
+    monkeypatch.setattr('rarfile.RarFile.getinfo', Mock(return_value=rar_info))
+    monkeypatch.setattr('rarfile.RarFile.open', Mock(return_value=io.BytesIO(data)))
+
+    scanned_video = scan_archive(str(enders_game))
+    assert scanned_video.size == len(data)
+    assert scanned_video.hashes == compute_hashes(str(tmpdir.join('video.mkv')))
+
+
+def test_scan_archive_compressed(movies, tmpdir, monkeypatch):
+    video = movies['enders_game']
+    enders_game = tmpdir.ensure(os.path.splitext(video.name)[0] + '.rar')
+
+    monkeypatch.setattr('rarfile.RarFile._parse', Mock())
+    monkeypatch.setattr('rarfile.RarFile.namelist', Mock(return_value=[video.name]))
+    rar_info = Mock(file_size=20000000, compress_type=RAR_M0 + 3, needs_password=Mock(return_value=False))
+    monkeypatch.setattr('rarfile.RarFile.getinfo', Mock(return_value=rar_info))
+    mock_open = Mock()
+    monkeypatch.setattr('rarfile.RarFile.open', mock_open)
+
+    scanned_video = scan_archive(str(enders_game))
+    assert scanned_video.size == 20000000
+    assert scanned_video.hashes == {}
+    assert not mock_open.called
+
+
 def test_scan_archive_invalid_extension(movies, tmpdir, monkeypatch):
     monkeypatch.chdir(str(tmpdir))
     movie_name = os.path.splitext(movies['interstellar'].name)[0] + '.mp3'
@@ -401,6 +777,109 @@ def test_scan_videos_age(movies, tmpdir, monkeypatch):
     mock_scan_video.assert_has_calls(scan_video_calls, any_order=True)
 
 
+def test_scan_videos_max_workers(movies, episodes, tmpdir, monkeypatch):
+    names = sorted(os.path.split(v.name)[1] for v in [movies['man_of_steel'], movies['enders_game'],
+                                                      episodes['bbt_s07e05'], episodes['got_s03e10']])
+    for name in names:
+        tmpdir.ensure('videos', name)
+    tmpdir.ensure('videos', 'sub', 'a.mkv')
+
+    # mock scan_video with the path as name
+    monkeypatch.setattr('subliminal.core.scan_video', lambda p: Mock(name=p, path=p))
+    monkeypatch.chdir(str(tmpdir))
+    videos = scan_videos('videos', max_workers=3)
+
+    # videos are in walk order
+    expected_paths = [os.path.join('videos', n) for n in names] + [os.path.join('videos', 'sub', 'a.mkv')]
+    assert [v.path for v in videos] == expected_paths
+
+
+def test_scan_videos_max_processes(episodes, tmpdir, monkeypatch):
+    path = os.path.join('videos', os.path.split(episodes['bbt_s07e05'].name)[1])
+    tmpdir.ensure(path)
+    monkeypatch.chdir(str(tmpdir))
+    videos = scan_videos('videos', max_processes=1)
+
+    assert len(videos) == 1
+    assert videos[0].name == path
+    assert vars(videos[0]) == vars(scan_video(path))
+
+
+def test_iter_videos(movies, tmpdir, monkeypatch):
+    tmpdir.ensure('movies', movies['man_of_steel'].name)
+    tmpdir.ensure('movies', movies['enders_game'].name)
+
+    # mock scan_video with the path as name
+    mock_scan_video = Mock(side_effect=lambda p: Mock(name=p, path=p))
+    monkeypatch.setattr('subliminal.core.scan_video', mock_scan_video)
+    monkeypatch.chdir(str(tmpdir))
+    videos = iter_videos('movies')
+
+    # videos are scanned as they are consumed
+    assert mock_scan_video.call_count == 0
+    assert next(videos).path == os.path.join('movies', movies['enders_game'].name)
+    assert mock_scan_video.call_count == 1
+    assert next(videos).path == os.path.join('movies', movies['man_of_steel'].name)
+    with pytest.raises(StopIteration):
+        next(videos)
+
+
+def test_iter_videos_path_does_not_exist(movies):
+    with pytest.raises(ValueError) as excinfo:
+        iter_videos(movies['man_of_steel'].name)
+    assert str(excinfo.value) == 'Path does not exist'
+
+
+def test_walk_videos(movies, tmpdir, monkeypatch):
+    man_of_steel = tmpdir.ensure('movies', movies['man_of_steel'].name)
+    tmpdir.ensure('movies', '.private', 'sextape.mkv')
+    tmpdir.ensure('movies', '.hidden_video.mkv')
+    tmpdir.ensure('movies', movies['interstellar'].name)
+    tmpdir.ensure('movies', 'watched', dir=True)
+    tmpdir.join('movies', 'watched', os.path.split(movies['man_of_steel'].name)[1]).mksymlinkto(man_of_steel)
+    tmpdir.join('movies', 'linked').mksymlinkto(tmpdir.join('movies', 'Man of Steel (2013)'))
+    monkeypatch.chdir(str(tmpdir))
+
+    assert list(walk_videos('movies')) == [os.path.join('movies', movies['interstellar'].name),
+                                           os.path.join('movies', movies['man_of_steel'].name)]
+    assert list(walk_videos('movies', archives=False)) == [os.path.join('movies', movies['man_of_steel'].name)]
+
+
+def test_walk_videos_journal(movies, tmpdir, monkeypatch):
+    tmpdir.ensure('movies', movies['man_of_steel'].name)
+    tmpdir.ensure('movies', movies['enders_game'].name)
+    tmpdir.ensure('movies', 'new', dir=True)
+    monkeypatch.chdir(str(tmpdir))
+    man_of_steel = os.path.join('movies', movies['man_of_steel'].name)
+    enders_game = os.path.join('movies', movies['enders_game'].name)
+    journal = ScanJournal(str(tmpdir.join('journal.db')), languages={Language('fra')})
+
+    # first walk yields everything
+    assert list(walk_videos('movies', journal=journal)) == [enders_game, man_of_steel]
+    journal.set_video(man_of_steel, {Language('fra')})
+
+    # unchanged directories are not listed again, videos not processed are walked again
+    mock_scandir = Mock(side_effect=lambda p: [])
+    monkeypatch.setattr('subliminal.core.scandir', mock_scandir)
+    assert list(walk_videos('movies', journal=journal)) == [enders_game]
+    assert mock_scandir.call_count == 0
+    monkeypatch.undo()
+    monkeypatch.chdir(str(tmpdir))
+
+    # processed videos without all the languages are walked again
+    journal.set_video(enders_game, set())
+    assert list(walk_videos('movies', journal=journal)) == [enders_game]
+    journal.set_video(enders_game, {Language('fra')})
+    assert list(walk_videos('movies', journal=journal)) == []
+
+    # only new videos are yielded from changed directories
+    tmpdir.ensure('movies', 'new', movies['interstellar'].name)
+    os.utime(str(tmpdir.join('movies', 'new')), (0, 0))
+    assert list(walk_videos('movies', journal=journal)) == [os.path.join('movies', 'new',
+                                                                         movies['interstellar'].name)]
+    journal.close()
+
+
 def test_list_subtitles_movie(movies, mock_providers):
     video = movies['man_of_steel']
     languages = {Language('eng')}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import os
+
+from babelfish import Language
+import pytest
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+from subliminal.index import HashIndex, ScanJournal
+
+
+@pytest.fixture
+def index(tmpdir):
+    index = HashIndex()
+    index.configure(str(tmpdir.join('hashes.db')))
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def video(tmpdir):
+    path = tmpdir.join('video.mkv')
+    path.write_binary(b'\x00' * 200000)
+    return str(path)
+
+
+def test_hash_index_not_configured(video):
+    index = HashIndex()
+    assert not index.is_configured
+    assert index.compute_hashes(video, os.stat(video))['opensubtitles'] == '0000000000030d40'
+
+
+def test_hash_index_get_set(index, video):
+    stat = os.stat(video)
+    assert index.get(stat) is None
+    index.set(stat, {'opensubtitles': 'abc'})
+    assert index.get(stat) == {'opensubtitles': 'abc'}
+    assert len(index) == 1
+
+
+def test_hash_index_invalidated(index, video):
+    index.set(os.stat(video), {'opensubtitles': 'abc'})
+    os.utime(video, (0, 0))
+    assert index.get(os.stat(video)) is None
+
+
+def test_hash_index_compute_hashes(index, video, monkeypatch):
+    mock_compute_hashes = Mock(return_value={'opensubtitles': 'abc'})
+    monkeypatch.setattr('subliminal.index.compute_hashes', mock_compute_hashes)
+    assert index.compute_hashes(video, os.stat(video)) == {'opensubtitles': 'abc'}
+    assert index.compute_hashes(video, os.stat(video)) == {'opensubtitles': 'abc'}
+    assert mock_compute_hashes.call_count == 1
+
+
+def test_hash_index_compute_hashes_missing(index, video, monkeypatch):
+    index.set(os.stat(video), {'opensubtitles': 'abc'})
+    mock_compute_hashes = Mock(return_value={'thesubdb': 'def'})
+    monkeypatch.setattr('subliminal.index.compute_hashes', mock_compute_hashes)
+    hashes = index.compute_hashes(video, os.stat(video))
+    assert hashes == {'opensubtitles': 'abc', 'thesubdb': 'def'}
+    assert sorted(mock_compute_hashes.call_args[0][1]) == ['napiprojekt', 'shooter', 'thesubdb']
+    assert index.compute_hashes(video, os.stat(video)) == hashes
+    assert mock_compute_hashes.call_count == 1
+
+
+def test_hash_index_compact(tmpdir, video):
+    index = HashIndex()
+    index.configure(str(tmpdir.join('hashes.db')), max_entries=10)
+    stat = os.stat(video)
+    for i in range(20):
+        index.set(Mock(st_dev=stat.st_dev, st_ino=i + 1, st_size=0, st_mtime=0), {})
+    index.close()
+    index.configure(str(tmpdir.join('hashes.db')), max_entries=10)
+    assert len(index) == 9
+    index.close()
+
+
+def test_hash_index_concurrent(tmpdir, video):
+    first, second = HashIndex(), HashIndex()
+    first.configure(str(tmpdir.join('hashes.db')))
+    second.configure(str(tmpdir.join('hashes.db')))
+    first.set(os.stat(video), {'opensubtitles': 'abc'})
+    assert second.get(os.stat(video)) == {'opensubtitles': 'abc'}
+    first.close()
+    second.close()
+
+
+@pytest.fixture
+def journal(tmpdir):
+    journal = ScanJournal(str(tmpdir.join('journal.db')))
+    yield journal
+    journal.close()
+
+
+def test_scan_journal_directory(journal):
+    assert journal.get_directory('movies') is None
+    journal.set_directory('movies', 1.5, ['new'], ['video.mkv'])
+    assert journal.get_directory('movies') == (1.5, ['new'], ['video.mkv'])
+    assert journal.get_directory(os.path.abspath('movies')) == (1.5, ['new'], ['video.mkv'])
+
+
+def test_scan_journal_set_video(journal):
+    assert journal.is_pending('video.mkv', 100, 1.5)
+    assert journal.is_pending('video.mkv', 100, 1.5)
+    journal.set_video('video.mkv', set())
+    assert not journal.is_pending('video.mkv', 100, 1.5)
+    assert journal.is_pending('video.mkv', 200, 1.5)
+    assert journal.is_pending('video.mkv', 200, 2.5)
+
+
+def test_scan_journal_set_video_not_pending(journal):
+    journal.set_video('video.mkv', set())
+    assert journal.is_pending('video.mkv', 100, 1.5)
+
+
+def test_scan_journal_track(journal):
+    assert journal.is_pending('video.rar', 100, 1.5)
+    journal.track('video.rar', 'video.mkv')
+    journal.set_video('video.mkv', set())
+    assert not journal.is_pending('video.rar', 100, 1.5)
+    assert journal.is_pending('video.mkv', 100, 1.5)
+
+
+def test_scan_journal_languages(tmpdir):
+    journal = ScanJournal(str(tmpdir.join('journal.db')), languages={Language('fra'), Language('por', 'BR')})
+    assert journal.is_pending('video.mkv', 100, 1.5)
+    journal.set_video('video.mkv', {Language('fra')})
+    assert journal.is_pending('video.mkv', 100, 1.5)
+    journal.set_video('video.mkv', {Language('fra'), Language('por', 'BR'), Language('eng')})
+    assert not journal.is_pending('video.mkv', 100, 1.5)
+    journal.close()
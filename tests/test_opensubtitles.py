@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import base64
 import os
+import zlib
 
 from babelfish import Language
 import pytest
+
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
 from vcr import VCR
 
 from subliminal.exceptions import ConfigurationError
-from subliminal.providers.opensubtitles import OpenSubtitlesProvider, OpenSubtitlesSubtitle, Unauthorized
+from subliminal.providers.opensubtitles import NoSession, OpenSubtitlesProvider, OpenSubtitlesSubtitle, Unauthorized
 
 
 vcr = VCR(path_transformer=lambda path: path + '.yaml',
@@ -112,6 +119,40 @@ def test_logout():
     assert provider.token is None
 
 
+def test_session_store_restore(store):
+    store.set('opensubtitles', 'python-subliminal', {'token': 'abc'}, 60)
+    provider = OpenSubtitlesProvider('python-subliminal', 'subliminal')
+    provider.server = Mock()
+    provider.initialize()
+    assert provider.token == 'abc'
+    assert not provider.server.LogIn.called
+    provider.terminate()
+    assert not provider.server.LogOut.called
+    assert store.get('opensubtitles', 'python-subliminal') == {'token': 'abc'}
+
+
+def test_session_store_expired_token(store):
+    store.set('opensubtitles', 'python-subliminal', {'token': 'abc'}, 60)
+    provider = OpenSubtitlesProvider('python-subliminal', 'subliminal')
+    provider.server = Mock()
+    provider.server.LogIn.return_value = {'status': '200 OK', 'token': 'def'}
+    provider.server.NoOperation.side_effect = [{'status': '406 No session'}, {'status': '200 OK'}]
+    provider.initialize()
+    provider.no_operation()
+    assert provider.token == 'def'
+    provider.server.NoOperation.assert_called_with('def')
+    assert store.get('opensubtitles', 'python-subliminal') == {'token': 'def'}
+
+
+def test_no_session_not_stored():
+    provider = OpenSubtitlesProvider('python-subliminal', 'subliminal')
+    provider.server = Mock()
+    provider.server.NoOperation.return_value = {'status': '406 No session'}
+    with pytest.raises(NoSession):
+        provider.no_operation()
+    assert not provider.server.LogIn.called
+
+
 @pytest.mark.integration
 @vcr.use_cassette
 def test_no_operation():
@@ -191,6 +232,72 @@ def test_query_hash_size(movies):
     assert {subtitle.language for subtitle in subtitles} == languages
 
 
+def subtitle_item(subtitle_id, hash, query_number=0, matched_by='moviehash', language='eng'):
+    return {'SubLanguageID': language, 'SubHearingImpaired': '0', 'SubtitlesLink': None,
+            'IDSubtitleFile': subtitle_id, 'MatchedBy': matched_by, 'MovieKind': 'movie', 'MovieHash': hash,
+            'MovieName': '', 'MovieReleaseName': '', 'MovieYear': '', 'IDMovieImdb': '', 'SeriesSeason': '',
+            'SeriesEpisode': '', 'SubFileName': '', 'QueryNumber': str(query_number)}
+
+
+def test_list_subtitles_batch(movies, episodes, monkeypatch):
+    videos = [movies['man_of_steel'], episodes['got_s03e10'], episodes['dallas_s01e03'], episodes['bbt_s07e05']]
+    monkeypatch.setattr(OpenSubtitlesProvider, 'batch_size', 2)
+    provider = OpenSubtitlesProvider()
+    provider.server = Mock()
+    provider.server.SearchSubtitles.side_effect = [
+        {'status': '200 OK', 'data': [subtitle_item('1', videos[0].hashes['opensubtitles']),
+                                      subtitle_item('2', videos[0].hashes['opensubtitles']),
+                                      subtitle_item('3', videos[1].hashes['opensubtitles'])]},
+        {'status': '200 OK', 'data': False},
+        {'status': '200 OK', 'data': [subtitle_item('4', '0', 1, 'fulltext'), subtitle_item('5', '0', 3, 'tag')]}]
+    subtitles = provider.list_subtitles_batch(videos, {Language('eng')})
+    assert [[s.id for s in l] for l in subtitles] == [['1', '2'], ['3'], ['4'], ['5']]
+    assert provider.server.SearchSubtitles.call_count == 3
+    criteria = provider.server.SearchSubtitles.call_args[0][1]
+    assert criteria == [{'tag': os.path.basename(videos[2].name), 'sublanguageid': 'eng'},
+                        {'query': 'Dallas', 'season': 1, 'episode': 3, 'sublanguageid': 'eng'},
+                        {'imdbid': '3229392', 'sublanguageid': 'eng'},
+                        {'tag': os.path.basename(videos[3].name), 'sublanguageid': 'eng'},
+                        {'query': 'The Big Bang Theory', 'season': 7, 'episode': 5, 'sublanguageid': 'eng'}]
+
+
+def test_list_subtitles_batch_missing_languages(movies, episodes, monkeypatch):
+    videos = [movies['man_of_steel'], episodes['got_s03e10']]
+    provider = OpenSubtitlesProvider()
+    provider.server = Mock()
+    provider.server.SearchSubtitles.side_effect = [
+        {'status': '200 OK', 'data': [subtitle_item('1', videos[0].hashes['opensubtitles'])]},
+        {'status': '200 OK', 'data': [subtitle_item('2', '0', 0, 'imdbid', 'fre'),
+                                      subtitle_item('3', '0', 3, 'imdbid', 'fre')]}]
+    subtitles = provider.list_subtitles_batch(videos, {Language('eng'), Language('fra')})
+    assert [[s.id for s in l] for l in subtitles] == [['1', '2'], ['3']]
+    assert provider.server.SearchSubtitles.call_count == 2
+    criteria = provider.server.SearchSubtitles.call_args[0][1]
+    assert [c['sublanguageid'] for c in criteria] == ['fre'] * 3 + ['eng,fre'] * 3
+
+
+def test_list_subtitles_batch_single_video(movies, monkeypatch):
+    monkeypatch.setattr(OpenSubtitlesProvider, 'list_subtitles', Mock(return_value=['subtitle']))
+    provider = OpenSubtitlesProvider()
+    provider.server = Mock()
+    assert provider.list_subtitles_batch([movies['man_of_steel']], {Language('eng')}) == [['subtitle']]
+    assert not provider.server.SearchSubtitles.called
+
+
+def test_download_subtitles_batch():
+    content = base64.b64encode(zlib.compress(b'1\r\n00:00:01,000 --> 00:00:02,000\r\nHello\r\n', 9))
+    subtitles = [OpenSubtitlesSubtitle(Language('eng'), False, None, i, 'moviehash', 'movie', None, None, None, None,
+                                       None, None, None, None, None) for i in (1, 2)]
+    provider = OpenSubtitlesProvider()
+    provider.server = Mock()
+    provider.server.DownloadSubtitles.return_value = {'status': '200 OK', 'data': [{'idsubtitlefile': '2',
+                                                                                    'data': content}]}
+    provider.download_subtitles_batch(subtitles)
+    provider.server.DownloadSubtitles.assert_called_once_with(None, ['1', '2'])
+    assert subtitles[0].content is None
+    assert subtitles[1].content == b'1\n00:00:01,000 --> 00:00:02,000\nHello\n'
+
+
 @pytest.mark.integration
 @vcr.use_cassette
 def test_query_wrong_hash_wrong_size():
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 from bs4 import FeatureNotFound
 import pytest
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
 
+from subliminal.exceptions import ProviderError
 from subliminal.providers import ParserBeautifulSoup, Provider
 from subliminal.video import Episode, Movie
 
@@ -49,3 +54,18 @@ def test_check_required_hash(episodes, movies):
     Provider.required_hash = 'opensubtitles'
     assert Provider.check(movies['man_of_steel']) is True
     assert Provider.check(episodes['dallas_s01e03']) is False
+
+
+def test_download_subtitles_batch_error():
+    provider = Provider()
+    provider.download_subtitle = Mock(side_effect=[ProviderError, None])
+    provider.download_subtitles_batch(['error', 'subtitle'])
+    assert provider.download_subtitle.call_count == 2
+
+
+def test_download_subtitles_batch_all_errors():
+    provider = Provider()
+    provider.download_subtitle = Mock(side_effect=[ProviderError, ProviderError])
+    with pytest.raises(ProviderError):
+        provider.download_subtitles_batch(['error', 'error'])
+    assert provider.download_subtitle.call_count == 2
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+from requests import Request, Session
+
+from subliminal.session import SessionFactory, SessionStore, SharedAdapter
+
+
+def test_session_factory_create():
+    factory = SessionFactory()
+    session = factory.create(headers={'User-Agent': 'test'})
+    assert session.headers['User-Agent'] == 'test'
+    assert session.headers['Connection'] == 'keep-alive'
+    assert isinstance(session.get_adapter('http://example.com'), SharedAdapter)
+    assert session.get_adapter('https://example.com') is session.get_adapter('http://example.com')
+
+
+def test_session_factory_configure():
+    factory = SessionFactory()
+    assert factory.adapter._pool_connections == 20
+    factory.configure(pool_maxsize=20, max_retries=5)
+    assert factory.adapter._pool_maxsize == 20
+    assert factory.adapter.max_retries.total == 5
+
+
+def test_session_factory_shared_adapter():
+    factory = SessionFactory()
+    sessions = [factory.create(), factory.create()]
+    factory.adapter = Mock()
+    request = Request('GET', 'http://example.com').prepare()
+    for session in sessions:
+        session.get_adapter(request.url).send(request, timeout=10)
+    assert factory.adapter.send.call_count == 2
+
+    sessions[0].close()
+    assert not factory.adapter.close.called
+    factory.close()
+    assert factory.adapter.close.called
+
+
+def test_session_store_not_configured():
+    store = SessionStore()
+    assert not store.is_configured
+    store.set('opensubtitles', 'subliminal', {'token': 'abc'}, 60)
+    assert store.get('opensubtitles', 'subliminal') is None
+
+
+def test_session_store(store, tmpdir):
+    assert oct(tmpdir.join('sessions.db').stat().mode & 0o777) == oct(0o600)
+    assert oct(tmpdir.join('sessions.db-wal').stat().mode & 0o777) == oct(0o600)
+    assert oct(tmpdir.join('sessions.db-shm').stat().mode & 0o777) == oct(0o600)
+    store.set('opensubtitles', 'subliminal', {'token': 'abc'}, 60)
+    store.set('opensubtitles', None, {'token': 'def'}, 60)
+    assert store.get('opensubtitles', 'subliminal') == {'token': 'abc'}
+    assert store.get('opensubtitles', '') == {'token': 'def'}
+    assert store.get('addic7ed', 'subliminal') is None
+    store.delete('opensubtitles', 'subliminal')
+    assert store.get('opensubtitles', 'subliminal') is None
+
+
+def test_session_store_permissions(tmpdir):
+    filename = str(tmpdir.join('sessions.db'))
+    store = SessionStore()
+    store.configure(filename)
+    store.close()
+    for suffix in ('-wal', '-shm'):
+        tmpdir.join('sessions.db' + suffix).write('', ensure=True)
+        os.chmod(filename + suffix, 0o644)
+    store.configure(filename)
+    try:
+        for suffix in ('-wal', '-shm'):
+            assert oct(tmpdir.join('sessions.db' + suffix).stat().mode & 0o777) == oct(0o600)
+    finally:
+        store.close()
+
+
+def test_session_store_expired(store, monkeypatch):
+    store.set('opensubtitles', 'subliminal', {'token': 'abc'}, 60)
+    monkeypatch.setattr('subliminal.session.time.time', Mock(return_value=time.time() + 61))
+    assert store.get('opensubtitles', 'subliminal') is None
+
+
+def test_session_store_keep_expiration(store, monkeypatch):
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'abc'}}, 60)
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'def'}}, None)
+    assert store.get('addic7ed', 'subliminal') == {'cookies': {'PHPSESSID': 'def'}}
+    monkeypatch.setattr('subliminal.session.time.time', Mock(return_value=time.time() + 61))
+    assert store.get('addic7ed', 'subliminal') is None
+
+
+def test_session_store_keep_expiration_deleted(store):
+    store.set('addic7ed', 'subliminal', {'cookies': {'PHPSESSID': 'abc'}}, None)
+    assert store.get('addic7ed', 'subliminal') is None
+
+
+def test_session_store_cookies(store):
+    session = Session()
+    session.cookies.set('PHPSESSID', 'abc')
+    store.save_cookies('addic7ed', 'subliminal', session, 60)
+    session = Session()
+    assert store.restore_cookies('addic7ed', 'subliminal', session)
+    assert session.cookies['PHPSESSID'] == 'abc'
+    assert not store.restore_cookies('addic7ed', 'lanimilbus', Session())
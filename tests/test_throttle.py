@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+from subliminal.throttle import CircuitBreaker, TokenBucket
+
+
+def test_token_bucket_reserve(monkeypatch):
+    monkeypatch.setattr('subliminal.throttle.clock', Mock(return_value=0))
+    bucket = TokenBucket(2, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1
+
+
+def test_token_bucket_refill(monkeypatch):
+    clock = Mock(return_value=0)
+    monkeypatch.setattr('subliminal.throttle.clock', clock)
+    bucket = TokenBucket(2, burst=2)
+    assert bucket.reserve(2) == 0
+    clock.return_value = 0.5
+    assert bucket.reserve() == 0
+    clock.return_value = 100
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve() == 0.5
+
+
+def test_token_bucket_acquire(monkeypatch):
+    monkeypatch.setattr('subliminal.throttle.clock', Mock(return_value=0))
+    mock_sleep = Mock()
+    monkeypatch.setattr('subliminal.throttle.time.sleep', mock_sleep)
+    bucket = TokenBucket(4)
+    assert bucket.acquire() == 0
+    assert not mock_sleep.called
+    assert bucket.acquire() == 0.25
+    mock_sleep.assert_called_once_with(0.25)
+
+
+def test_circuit_breaker_open(monkeypatch):
+    monkeypatch.setattr('subliminal.throttle.clock', Mock(return_value=0))
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=3)
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_force_open(monkeypatch):
+    clock = Mock(return_value=0)
+    monkeypatch.setattr('subliminal.throttle.clock', clock)
+    breaker = CircuitBreaker(cooldown=10)
+    breaker.open(20)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.return_value = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_window(monkeypatch):
+    monkeypatch.setattr('subliminal.throttle.clock', Mock(return_value=0))
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=3)
+    for _ in range(3):
+        breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_half_open(monkeypatch):
+    clock = Mock(return_value=0)
+    monkeypatch.setattr('subliminal.throttle.clock', clock)
+    breaker = CircuitBreaker(min_calls=1, cooldown=10, max_cooldown=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.return_value = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # failed trial call doubles the cooldown
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.return_value = 29
+    assert not breaker.allow()
+    clock.return_value = 30
+    assert breaker.allow()
+    breaker.record_failure()
+    clock.return_value = 59
+    assert not breaker.allow()
+    clock.return_value = 60
+    assert breaker.allow()
+
+    # successful trial call closes the breaker
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.current_cooldown == 10
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 from six import text_type as str
 
-from subliminal.utils import hash_opensubtitles, hash_thesubdb, sanitize
+import pytest
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+from subliminal.utils import (compute_hashes, hash_opensubtitles, hash_thesubdb, merge_ranges, register_hash,
+                              sanitize, sum_uint64, unregister_hash)
 
 
 def test_hash_opensubtitles(mkv):
@@ -22,5 +29,75 @@ def test_hash_thesubdb_too_small(tmpdir):
     assert hash_thesubdb(str(path)) is None
 
 
+def test_compute_hashes(mkv):
+    assert compute_hashes(mkv['test5']) == {
+        'napiprojekt': 'de2e9caa58dd53a6ab9d241e6b252e35',
+        'opensubtitles': '49e2530ea3bd0d18',
+        'shooter': '36f3e2c50566ca01f939bf15d8031432;b6132ab62b8f7d4aaabe9d6344b90d90;'
+                   'bea6074cef7f1de85794f3941530ba8b;18db05758d5d0d96f246249e4e4b5d79',
+        'thesubdb': '64a8b87f12daa4f31895616e6c3fd39e'}
+
+
+def test_compute_hashes_names(mkv):
+    assert compute_hashes(mkv['test5'], ['thesubdb']) == {'thesubdb': '64a8b87f12daa4f31895616e6c3fd39e'}
+
+
+def test_compute_hashes_too_small(tmpdir):
+    path = tmpdir.ensure('test_too_small.mkv')
+    assert compute_hashes(str(path)) == {'napiprojekt': 'd41d8cd98f00b204e9800998ecf8427e'}
+
+
+def test_compute_hashes_buffered(tmpdir, monkeypatch):
+    path = tmpdir.join('test.mkv')
+    path.write_binary(bytes(bytearray(range(256))) * 1000)
+    hashes = compute_hashes(str(path))
+    monkeypatch.setattr('subliminal.utils.mmap_views', False)
+    assert compute_hashes(str(path)) == hashes
+
+
+def test_compute_hashes_mmap_error(tmpdir, monkeypatch):
+    path = tmpdir.join('test.mkv')
+    path.write_binary(bytes(bytearray(range(256))) * 1000)
+    hashes = compute_hashes(str(path))
+    monkeypatch.setattr('subliminal.utils.mmap.mmap', Mock(side_effect=EnvironmentError))
+    assert compute_hashes(str(path)) == hashes
+
+
+def test_merge_ranges():
+    assert merge_ranges([(100, 50), (0, 64), (64, 10), (120, 10), (30, 4)]) == [(0, 74), (100, 50)]
+
+
+def test_register_hash(tmpdir):
+    path = tmpdir.join('test.mkv')
+    path.write_binary(b'0123456789')
+    register_hash('test', lambda filesize: [(2, 3), (filesize - 2, 4)],
+                  lambda filesize, *data: b'-'.join(d.tobytes() for d in data))
+    try:
+        assert compute_hashes(str(path), ['test']) == {'test': b'234-89'}
+    finally:
+        unregister_hash('test')
+    assert 'test' not in compute_hashes(str(path))
+
+
+def test_register_hash_already_registered():
+    with pytest.raises(ValueError):
+        register_hash('opensubtitles', None, None)
+
+
+def test_unregister_hash_not_registered():
+    with pytest.raises(ValueError):
+        unregister_hash('test')
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_sum_uint64(use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr('subliminal.utils.numpy', None)
+    data = b'\xff' * 16 + b'\x03' + b'\x00' * 7 + b'\x01\x02'
+    assert sum_uint64(data) == 1
+    assert sum_uint64(memoryview(data)[16:]) == 3
+    assert sum_uint64(b'') == 0
+
+
 def test_sanitize():
     assert sanitize('Marvel\'s Agents of S.H.I.E.L.D.') == 'marvels agents of s h i e l d'
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+from subliminal.watch import IN_CLOSE_WRITE, IN_IGNORED, IN_ISDIR, IN_MOVED_TO, Scheduler, VideoWatcher
+
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+
+
+@pytest.fixture
+def watcher(tmpdir):
+    tmpdir.ensure('movies', dir=True)
+    watcher = VideoWatcher([str(tmpdir.join('movies'))], debounce=10)
+    yield watcher
+    watcher.close()
+
+
+def test_scheduler_schedule():
+    scheduler = Scheduler()
+    scheduler.schedule('a.mkv', 10, now=0)
+    scheduler.schedule('b.mkv', 5, now=0)
+    assert len(scheduler) == 2
+    assert scheduler.timeout(now=0) == 5
+    assert scheduler.pop_due(now=4) == []
+    assert scheduler.pop_due(now=10) == [('b.mkv', 0), ('a.mkv', 0)]
+    assert len(scheduler) == 0
+    assert scheduler.timeout(now=10) is None
+
+
+def test_scheduler_debounce():
+    scheduler = Scheduler()
+    scheduler.schedule('a.mkv', 10, now=0)
+    scheduler.schedule('a.mkv', 10, now=8)
+    assert scheduler.timeout(now=8) == 10
+    assert scheduler.pop_due(now=10) == []
+    assert scheduler.pop_due(now=18) == [('a.mkv', 0)]
+    assert len(scheduler) == 0
+
+
+def test_scheduler_retry():
+    scheduler = Scheduler(retry_delay=10, max_retry_delay=30, max_retries=3)
+    assert scheduler.retry('a.mkv', 0, now=0)
+    assert scheduler.pop_due(now=10) == [('a.mkv', 1)]
+    assert scheduler.retry('a.mkv', 1, now=10)
+    assert scheduler.pop_due(now=29) == []
+    assert scheduler.pop_due(now=30) == [('a.mkv', 2)]
+    assert scheduler.retry('a.mkv', 2, now=30)
+    assert scheduler.timeout(now=30) == 30
+    assert scheduler.pop_due(now=60) == [('a.mkv', 3)]
+    assert not scheduler.retry('a.mkv', 3, now=60)
+    assert 'a.mkv' not in scheduler
+
+
+def test_scheduler_cancel():
+    scheduler = Scheduler()
+    scheduler.schedule('a.mkv', 10, now=0)
+    scheduler.cancel('a.mkv')
+    scheduler.cancel('b.mkv')
+    assert scheduler.timeout(now=0) is None
+    assert scheduler.pop_due(now=10) == []
+
+
+@linux_only
+def test_video_watcher_process_events(watcher, movies, tmpdir):
+    wd = next(iter(watcher.directories))
+    man_of_steel = os.path.split(movies['man_of_steel'].name)[1]
+    enders_game = os.path.split(movies['enders_game'].name)[1]
+    tmpdir.ensure('movies', 'new', enders_game)
+    watcher.process_events([(wd, IN_CLOSE_WRITE, 0, man_of_steel),
+                            (wd, IN_MOVED_TO, 0, 'subtitle.srt'),
+                            (wd, IN_CLOSE_WRITE, 0, '.hidden.mkv'),
+                            (wd, IN_MOVED_TO | IN_ISDIR, 0, 'new')], now=0)
+    assert len(watcher.directories) == 2
+    assert sorted(watcher.scheduler.pop_due(now=10)) == [(str(tmpdir.join('movies', man_of_steel)), 0),
+                                                         (str(tmpdir.join('movies', 'new', enders_game)), 0)]
+
+    watcher.process_events([(wd, IN_IGNORED, 0, '')])
+    assert len(watcher.directories) == 1
+
+
+@linux_only
+def test_video_watcher_poll(watcher, movies, tmpdir):
+    watcher.debounce = 0
+    man_of_steel = os.path.split(movies['man_of_steel'].name)[1]
+    enders_game = os.path.split(movies['enders_game'].name)[1]
+    interstellar = os.path.split(movies['interstellar'].name)[1]
+    tmpdir.ensure('movies', 'new', dir=True)
+    tmpdir.join('movies', 'new', man_of_steel).write('video')
+    tmpdir.join('movies', 'new', 'subtitle.srt').write('subtitle')
+    tmpdir.join('movies', enders_game).write('video')
+    os.rename(str(tmpdir.join('movies', enders_game)), str(tmpdir.join('movies', interstellar)))
+
+    due = []
+    for _ in range(5):
+        due.extend(watcher.poll(timeout=0.1))
+    assert sorted(due) == [(str(tmpdir.join('movies', interstellar)), 0),
+                           (str(tmpdir.join('movies', 'new', man_of_steel)), 0)]